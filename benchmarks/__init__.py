@@ -0,0 +1,17 @@
+"""
+Offline benchmarks of the forecast models, metrics, and GIS tools.
+
+The benchmarks run on synthetic data (benchmarks.synthetic) and report wall
+time, throughput, and peak memory of each scenario (benchmarks.run), with a
+comparison against a stored baseline:
+
+    python -m benchmarks.run --size small --save-baseline
+    python -m benchmarks.run --size small --compare
+
+File name: benchmarks/__init__.py
+Date revised: 10/18/2026
+"""
+__version__ = "1.0"
+__author__ = "Donghoon Lee"
+__maintainer__ = "Donghoon Lee"
+__email__ = "dlee@geog.ucsb.edu"
@@ -0,0 +1,322 @@
+"""
+This script runs timed benchmark scenarios on synthetic data and compares the
+results with a stored baseline.
+
+Each scenario prepares its data once, then the wall time of the best of
+"repeat" runs is reported with the throughput (items per second) and the peak
+memory traced by tracemalloc in a separate run. Scenarios whose dependencies
+are not installed (e.g., GIS packages) are skipped.
+
+The stored baselines (benchmarks/baseline_small.json and baseline_medium.json)
+are recorded on the code before the optimizations (see their "code" field).
+Scenarios of new code paths (e.g., pcyf_batch) are compared with the
+baselines of the scenarios they replace.
+
+Usage:
+    python -m benchmarks.run [--size small|medium|large] [--scenarios ...]
+                             [--repeat 3] [--save-baseline] [--compare]
+                             [--baseline benchmarks/baseline_<size>.json]
+
+File name: benchmarks/run.py
+Date revised: 10/18/2026
+"""
+__version__ = "1.0"
+__author__ = "Donghoon Lee"
+__maintainer__ = "Donghoon Lee"
+__email__ = "dlee@geog.ucsb.edu"
+
+
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import warnings
+import tracemalloc
+import contextlib
+from collections import OrderedDict
+import numpy as np
+
+# Modules of the repository are imported from its root directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from benchmarks import synthetic
+
+
+# Sizes of synthetic data
+SIZES = {
+    'small': {'ndist': 10, 'nyear': 30, 'npoint': 1, 'nseries': 1000, 'ncell': 100, 'npoly': 20},
+    'medium': {'ndist': 70, 'nyear': 35, 'npoint': 4, 'nseries': 10000, 'ncell': 300, 'npoly': 70},
+    'large': {'ndist': 300, 'nyear': 40, 'npoint': 10, 'nseries': 100000, 'ncell': 800, 'npoly': 300},
+}
+
+
+# Scenarios ------------------------------------------------------------------ #
+# Each scenario prepares data with (size, tmpdir) and returns (func, nitems, unit)
+
+def _PredOfDistrict(pred, pid):
+    '''Returns predictors of a district (months x variables)
+    '''
+    import pandas as pd
+    return pd.concat([pred[v][pid] for v in pred], axis=1, keys=list(pred.keys()))
+
+
+def _ScenarioPCYF(cfg, tmpdir, **kwargs):
+    from pcyf import PCYF
+    crop, pred = synthetic.YieldPanel(cfg['ndist'], cfg['nyear'])
+    inputs = [(crop[pid], _PredOfDistrict(pred, pid), pid) for pid in crop.columns]
+
+    def func():
+        for dfCrop, dfPred, pid in inputs:
+            PCYF(dfCrop, dfPred, targmon=2, leadmat=[4,3,2,1], pid=pid, **kwargs)
+    return func, len(inputs), 'districts'
+
+
+def _ScenarioPCYFIncremental(cfg, tmpdir):
+    return _ScenarioPCYF(cfg, tmpdir, incremental=True)
+
+
+def _ScenarioPCYFBatch(cfg, tmpdir):
+    from pcyf import PCYFBatch
+    crop, pred = synthetic.YieldPanel(cfg['ndist'], cfg['nyear'])
+
+    def func():
+        PCYFBatch(crop, pred, targmon=2, leadmat=[4,3,2,1])
+    return func, crop.shape[1], 'districts'
+
+
+def _ScenarioSSPRED(cfg, tmpdir, **kwargs):
+    from sspred import SSPRED
+    dfFlow, dfPred, leadMat = synthetic.FlowRecords(cfg['npoint'], cfg['nyear'])
+
+    def func():
+        for pid in dfFlow.columns:
+            SSPRED(dfFlow[pid], dfPred, leadMat, pid, targMonth=13, **kwargs)
+    return func, dfFlow.shape[1]*12, 'point-months'
+
+
+def _ScenarioSSPREDBnB(cfg, tmpdir):
+    return _ScenarioSSPRED(cfg, tmpdir, search='bnb')
+
+
+def _ScenarioMetrics(cfg, tmpdir):
+    import metrics as mt
+    obs, sim, clm = synthetic.Forecasts(cfg['nseries']//10, cfg['nyear'])
+
+    def func():
+        for i in range(obs.shape[0]):
+            table = mt.makeMultiContTable(obs[i], sim[i], clm=clm[i], thrsd=[1/3, 2/3])
+            mct = mt.MulticlassContingencyTable(table, n_classes=3)
+            mct.gerrity_skill_score()
+            mct.heidke_skill_score()
+    return func, obs.shape[0], 'tables'
+
+
+def _ScenarioMetricsBatch(cfg, tmpdir):
+    import metrics as mt
+    obs, sim, clm = synthetic.Forecasts(cfg['nseries'], cfg['nyear'])
+
+    def func():
+        table = mt.makeMultiContTableBatch(obs, sim, clm=clm, thrsd=[1/3, 2/3])
+        mct = mt.MulticlassContingencyTableBatch(table, n_classes=3)
+        mct.gerrity_skill_score()
+        mct.heidke_skill_score()
+    return func, obs.shape[0], 'tables'
+
+
+def _ScenarioGridSubextent(cfg, tmpdir):
+    from tools import CreateGridBox_subextent
+    extent, dx, dy, sub_extent = synthetic.GridSpec(cfg['ncell'], cfg['ncell'])
+    filn = os.path.join(tmpdir, 'grid_sub.shp')
+
+    def func():
+        CreateGridBox_subextent(filn, extent, dx, dy, sub_extent, set_print=False)
+    return func, cfg['ncell']**2, 'cells'
+
+
+def _ScenarioIntersectShapefiles(cfg, tmpdir):
+    from tools import CreateGridBox_subextent, IntersectShapefiles
+    extent, dx, dy, sub_extent = synthetic.GridSpec(cfg['ncell']//4, cfg['ncell']//4, dx=0.2, dy=0.2)
+    grid = os.path.join(tmpdir, 'grid_ref.shp')
+    adm = os.path.join(tmpdir, 'adm.shp')
+    CreateGridBox_subextent(grid, extent, dx, dy, sub_extent, set_print=False)
+    synthetic.AdminPolygons(cfg['npoly'], sub_extent, filn=adm)
+    out = os.path.join(tmpdir, 'grid_adm.shp')
+
+    def func():
+        IntersectShapefiles(grid, adm, out, set_print=False)
+    return func, (cfg['ncell']//4)**2, 'cells'
+
+
+def _ScenarioIntersectGrid(cfg, tmpdir):
+    from tools import IntersectGrid
+    extent, dx, dy, sub_extent = synthetic.GridSpec(cfg['ncell']//4, cfg['ncell']//4, dx=0.2, dy=0.2)
+    adm = synthetic.AdminPolygons(cfg['npoly'], sub_extent)
+
+    def func():
+        IntersectGrid(adm, extent, dx, dy)
+    return func, (cfg['ncell']//4)**2, 'cells'
+
+
+SCENARIOS = OrderedDict([
+    ('pcyf', _ScenarioPCYF),
+    ('pcyf_incremental', _ScenarioPCYFIncremental),
+    ('pcyf_batch', _ScenarioPCYFBatch),
+    ('sspred', _ScenarioSSPRED),
+    ('sspred_bnb', _ScenarioSSPREDBnB),
+    ('metrics', _ScenarioMetrics),
+    ('metrics_batch', _ScenarioMetricsBatch),
+    ('grid_subextent', _ScenarioGridSubextent),
+    ('intersect_shapefiles', _ScenarioIntersectShapefiles),
+    ('intersect_grid', _ScenarioIntersectGrid),
+])
+
+
+# Scenarios of new code paths and the scenarios they replace (compared with the
+# baseline of the latter when the baseline code does not have the path)
+REFERENCE = {
+    'pcyf_incremental': 'pcyf',
+    'pcyf_batch': 'pcyf',
+    'sspred_bnb': 'sspred',
+    'metrics_batch': 'metrics',
+    'intersect_grid': 'intersect_shapefiles',
+}
+
+
+# Runner --------------------------------------------------------------------- #
+
+def RunScenario(name, size='small', repeat=3):
+    '''Runs a scenario and returns its result
+
+    Returns
+    -------
+    result: dict
+        'status' ('ok', 'skipped', or 'error'), 'time' (best wall time in
+        seconds), 'items', 'unit', 'throughput' (items per second), and
+        'peak_mb' (peak traced memory in MB)
+    '''
+    cfg = SIZES[size]
+    tmpdir = tempfile.mkdtemp(prefix='bench_')
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            try:
+                func, nitems, unit = SCENARIOS[name](cfg, tmpdir)
+            except ImportError as err:
+                return {'status': 'skipped', 'message': str(err)}
+            # Outputs of the models (e.g., progress prints) are discarded
+            with contextlib.redirect_stdout(io.StringIO()):
+                times = []
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    func()
+                    times.append(time.perf_counter() - t0)
+                tracemalloc.start()
+                func()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+    except Exception as err:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return {'status': 'error', 'message': '%s: %s' % (type(err).__name__, err)}
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    best = min(times)
+    return {'status': 'ok', 'time': best, 'median': float(np.median(times)), 'items': nitems,
+            'unit': unit, 'throughput': nitems/best if best > 0 else np.inf, 'peak_mb': peak/2**20}
+
+
+def RunBenchmarks(names=None, size='small', repeat=3, verbose=True):
+    '''Runs scenarios and returns the report (see RunScenario)
+    '''
+    if names is None:
+        names = list(SCENARIOS.keys())
+    report = {'size': size, 'repeat': repeat, 'python': platform.python_version(),
+              'numpy': np.__version__, 'machine': platform.machine(),
+              'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': OrderedDict()}
+    for name in names:
+        result = RunScenario(name, size, repeat)
+        report['results'][name] = result
+        if verbose:
+            print(_FormatResult(name, result))
+    return report
+
+
+def CompareBaseline(report, baseline, tolerance=0.1):
+    '''Returns speed-up ratios (current throughput / baseline throughput) of the scenarios
+
+    A scenario which did not run in the baseline is compared with the baseline
+    of the scenario it replaces (see REFERENCE). Ratios below 1-tolerance are
+    marked as regressions.
+    '''
+    compare = OrderedDict()
+    for name, result in report['results'].items():
+        ref = name
+        base = baseline['results'].get(name)
+        if ((base is None) or (base.get('status') != 'ok')) and (name in REFERENCE):
+            ref = REFERENCE[name]
+            base = baseline['results'].get(ref)
+        if (result['status'] != 'ok') or (base is None) or (base.get('status') != 'ok'):
+            continue
+        ratio = result['throughput']/base['throughput']
+        compare[name] = {'speedup': ratio, 'memory': result['peak_mb']/max(base['peak_mb'], 1e-9),
+                         'reference': ref, 'regression': ratio < 1 - tolerance}
+    return compare
+
+
+def _FormatResult(name, result):
+    if result['status'] != 'ok':
+        return '%-22s %s (%s)' % (name, result['status'], result.get('message', ''))
+    return '%-22s %9.4f s %12.1f %s/s %9.1f MB' % (name, result['time'], result['throughput'],
+                                                  result['unit'], result['peak_mb'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs benchmarks on synthetic data.')
+    parser.add_argument('--size', default='small', choices=list(SIZES.keys()))
+    parser.add_argument('--scenarios', nargs='+', default=None, choices=list(SCENARIOS.keys()))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=None,
+                        help='baseline JSON (default is benchmarks/baseline_<size>.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='saves results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='compares results with the baseline')
+    parser.add_argument('--output', default=None, help='saves results as JSON')
+    args = parser.parse_args(argv)
+
+    baseline = args.baseline
+    if baseline is None:
+        baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_%s.json' % args.size)
+    report = RunBenchmarks(args.scenarios, args.size, args.repeat)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.compare:
+        if not os.path.exists(baseline):
+            print('Baseline %s does not exist.' % baseline)
+        else:
+            with open(baseline, 'r') as f:
+                base = json.load(f)
+            print('\nComparison with %s (%s)' % (baseline, base.get('code', base['date'])))
+            for name, comp in CompareBaseline(report, base).items():
+                ref = '' if comp['reference'] == name else ' (vs %s)' % comp['reference']
+                print('%-22s %6.2fx speed %6.2fx memory%s%s' % (name, comp['speedup'], comp['memory'], ref,
+                                                               '  REGRESSION' if comp['regression'] else ''))
+    if args.save_baseline:
+        if os.path.exists(baseline):
+            # Results of scenarios which are not run are kept
+            with open(baseline, 'r') as f:
+                base = json.load(f)
+            base['results'].update(report['results'])
+            report = dict(report, results=base['results'])
+        with open(baseline, 'w') as f:
+            json.dump(report, f, indent=1)
+        print('%s is saved.' % baseline)
+
+
+if __name__ == "__main__":
+    main()
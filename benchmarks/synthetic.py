@@ -0,0 +1,155 @@
+"""
+This script generates synthetic data for the benchmarks: crop yield panels of
+districts with monthly predictors (prcp, smos, etos, ndvi), monthly streamflow
+with climate indices, categorical forecasts, and regular grids with
+administrative polygons of configurable size.
+
+File name: benchmarks/synthetic.py
+Date revised: 10/18/2026
+"""
+__version__ = "1.0"
+__author__ = "Donghoon Lee"
+__maintainer__ = "Donghoon Lee"
+__email__ = "dlee@geog.ucsb.edu"
+
+
+import os
+import numpy as np
+import pandas as pd
+
+
+def YieldPanel(ndist=10, nyear=30, start=1985, seed=0):
+    '''Returns synthetic crop yields and monthly predictors of districts
+
+    Yields of February and August are linear responses to lagged precipitation
+    and soil moisture with noise and a weak trend.
+
+    Parameters
+    ----------
+    ndist: int
+        number of districts
+    nyear: int
+        number of years of crop records
+    start: int
+        first year of crop records (predictors start one year earlier)
+    seed: int
+        seed of the random generator
+
+    Returns
+    -------
+    crop: DataFrame (PeriodIndex, districts)
+        crop records of districts
+    pred: dict
+        {'prcp', 'smos', 'etos', 'ndvi': DataFrame (PeriodIndex, districts)}
+    '''
+    rng = np.random.default_rng(seed)
+    dist = ['SO%04d' % i for i in range(ndist)]
+    midx = pd.period_range('%d-01' % (start-1), '%d-12' % (start+nyear), freq='M')
+    cidx = pd.period_range('%d-01' % start, '%d-12' % (start+nyear-1), freq='M')
+    cidx = cidx[cidx.month.isin([2,8])]
+    nt = len(midx)
+    pred = {'prcp': pd.DataFrame(rng.gamma(2, 30, (nt, ndist)), index=midx, columns=dist),
+            'smos': pd.DataFrame(rng.normal(0.2, 0.05, (nt, ndist)), index=midx, columns=dist),
+            'etos': pd.DataFrame(rng.normal(150, 10, (nt, ndist)), index=midx, columns=dist),
+            'ndvi': pd.DataFrame(rng.normal(0.4, 0.1, (nt, ndist)), index=midx, columns=dist)}
+    # Lagged responses of yields
+    pos = midx.get_indexer(cidx)
+    prcp, smos = pred['prcp'].values, pred['smos'].values
+    trend = 0.005*(cidx.year.values - start)[:,None]
+    crop = (1.0 + 0.004*prcp[pos-1] + 0.003*prcp[pos-3] + 2*smos[pos-2] + trend +
+            rng.normal(0, 0.1, (len(cidx), ndist)))
+    crop = pd.DataFrame(crop, index=cidx, columns=dist)
+    crop.columns.name = 'FNID'
+    return crop, pred
+
+
+def FlowRecords(npoint=2, nyear=40, start=1960, seed=0):
+    '''Returns synthetic monthly streamflow of points and climate indices
+
+    Returns
+    -------
+    dfFlow: DataFrame (DateTimeIndex, points)
+        monthly streamflow of points (starting one year after the indices)
+    dfPred: DataFrame (DateTimeIndex, indices)
+        monthly climate indices ('nino', 'pdo', 'amo')
+    leadMat: ndarray
+        2 x 3 array of start and end months of the predictors
+    '''
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range('%d-01-31' % start, periods=12*nyear, freq=pd.offsets.MonthEnd())
+    dfPred = pd.DataFrame(rng.normal(size=(len(idx), 3)), index=idx, columns=['nino', 'pdo', 'amo'])
+    dfPred = dfPred.rolling(2, min_periods=1).mean()
+    flow = dict()
+    for k in range(npoint):
+        flow[k+1] = np.exp(1 + 0.3*dfPred['nino'].shift(3).fillna(0) + 0.2*dfPred['pdo'].shift(5).fillna(0) +
+                           rng.normal(0, 0.3, len(idx)) + 0.002*np.arange(len(idx)))
+    dfFlow = pd.DataFrame(flow, index=idx)
+    dfFlow = dfFlow[dfFlow.index.year > start]
+    leadMat = np.array([[6,7,4],[1,3,2]])
+    return dfFlow, dfPred, leadMat
+
+
+def Forecasts(nseries=100, nyear=30, seed=0):
+    '''Returns synthetic observations, forecasts, and climatology
+
+    Returns
+    -------
+    obs, sim: ndarray
+        nseries x nyear observations and forecasts (correlated)
+    clm: ndarray
+        nseries x (2*nyear) climatological records
+    '''
+    rng = np.random.default_rng(seed)
+    obs = rng.normal(size=(nseries, nyear))
+    sim = 0.6*obs + 0.8*rng.normal(size=(nseries, nyear))
+    clm = rng.normal(size=(nseries, 2*nyear))
+    return obs, sim, clm
+
+
+def GridSpec(ncol=200, nrow=200, dx=0.05, dy=0.05, minx=40.0, miny=-2.0):
+    '''Returns extent of a regular base grid and a sub-extent of its center
+
+    Returns
+    -------
+    extent: list
+        [minx,maxx,miny,maxy] of the base grid (twice the sub-extent)
+    dx, dy: value
+        degrees of x and y
+    sub_extent: list
+        [minx,maxx,miny,maxy] of ncol x nrow cells in the center of the grid
+    '''
+    sub_extent = [minx, minx+ncol*dx, miny, miny+nrow*dy]
+    extent = [minx-ncol*dx/2, minx+ncol*dx*1.5, miny-nrow*dy/2, miny+nrow*dy*1.5]
+    return extent, dx, dy, sub_extent
+
+
+def AdminPolygons(npoly=30, sub_extent=(40.0, 50.0, -2.0, 8.0), seed=0, filn=None):
+    '''Returns synthetic administrative polygons (Voronoi cells) in sub_extent
+
+    Parameters
+    ----------
+    npoly: int
+        number of polygons
+    sub_extent: list
+        [minx,maxx,miny,maxy] of the polygons
+    filn: str
+        filename of the shapefile to be saved (optional)
+
+    Returns
+    -------
+    adm: GeoDataFrame
+        polygons with "FNID" attribute (EPSG:4326)
+    '''
+    import shapely
+    import geopandas as gpd
+    rng = np.random.default_rng(seed)
+    minx, maxx, miny, maxy = sub_extent
+    pts = shapely.multipoints(np.c_[rng.uniform(minx, maxx, npoly), rng.uniform(miny, maxy, npoly)])
+    cells = shapely.get_parts(shapely.voronoi_polygons(pts))
+    cells = shapely.intersection(cells, shapely.box(minx, miny, maxx, maxy))
+    adm = gpd.GeoDataFrame({'FNID': ['SO%04d' % i for i in range(len(cells))]},
+                           geometry=cells, crs='EPSG:4326')
+    if filn is not None:
+        os.makedirs(os.path.dirname(filn) or '.', exist_ok=True)
+        adm.to_file(filn)
+    return adm
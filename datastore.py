@@ -0,0 +1,176 @@
+"""
+This script presents a columnar, memory-mapped store of the crop panel and the
+predictor cube of districts.
+
+The store is a directory of uncompressed NumPy arrays (.npy) with a JSON
+index sidecar:
+    crop.npy   - [district, time] crop records
+    pred.npy   - [district, variable, month] monthly predictors
+    index.json - districts, variables, and time indices of both arrays
+The arrays are opened with memory mapping, so that opening the store costs
+no reading of data and slicing a district or a variable is O(1) without any
+decompression. Slices are returned as Series/DataFrame views of the arrays,
+which can be passed to PCYF directly.
+
+File name: datastore.py
+Date revised: 10/18/2026
+"""
+__version__ = "1.0"
+__author__ = "Donghoon Lee"
+__maintainer__ = "Donghoon Lee"
+__email__ = "dlee@geog.ucsb.edu"
+
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+
+def _IndexToJSON(index):
+    '''Returns JSON-serializable description of a time index
+    '''
+    if isinstance(index, pd.PeriodIndex):
+        return {'kind': 'period', 'freq': index.freqstr, 'values': [str(p) for p in index]}
+    if isinstance(index, pd.DatetimeIndex):
+        return {'kind': 'datetime', 'values': [t.isoformat() for t in index]}
+    return {'kind': 'other', 'values': list(index)}
+
+
+def _IndexFromJSON(desc):
+    '''Returns a time index from its description (see _IndexToJSON)
+    '''
+    if desc['kind'] == 'period':
+        return pd.PeriodIndex(desc['values'], freq=desc['freq'])
+    if desc['kind'] == 'datetime':
+        return pd.DatetimeIndex(desc['values'])
+    return pd.Index(desc['values'])
+
+
+def CreateDataStore(path, crop, pred, dtype='float64'):
+    '''Creates a data store of the crop panel and predictors
+
+    Parameters
+    ----------
+    path: str
+        directory of the store
+    crop: DataFrame (PeriodIndex or DateTimeIndex, districts)
+        crop records of districts
+    pred: dict of DataFrames or DataFrame with (district, variable) MultiIndex columns
+        monthly predictors of districts (e.g., {'prcp': prcp, 'etos': etos, ...})
+    dtype: str
+        data type of the arrays (default is 'float64')
+
+    Returns
+    -------
+    store: DataStore
+        store opened in read-only mode
+    '''
+    dist = list(crop.columns)
+    if isinstance(pred, dict):
+        varList = list(pred.keys())
+        ptime = pred[varList[0]].index
+        cube = np.stack([pred[v].reindex(index=ptime, columns=dist).values.astype(dtype)
+                         for v in varList], axis=1).transpose([2,1,0])
+    else:
+        varList = list(pred.columns.get_level_values(1).unique())
+        ptime = pred.index
+        cube = np.stack([pred.xs(v, axis=1, level=1).reindex(columns=dist).values.astype(dtype)
+                         for v in varList], axis=1).transpose([2,1,0])
+    os.makedirs(path, exist_ok=True)
+    # Arrays of the store
+    arr = np.lib.format.open_memmap(os.path.join(path, 'crop.npy'), mode='w+', dtype=dtype,
+                                    shape=(len(dist), len(crop.index)))
+    arr[:] = crop.values.T
+    arr.flush()
+    del arr
+    arr = np.lib.format.open_memmap(os.path.join(path, 'pred.npy'), mode='w+', dtype=dtype,
+                                    shape=cube.shape)
+    arr[:] = cube
+    arr.flush()
+    del arr
+    # Index sidecar
+    # Integer IDs are kept as integers (other IDs as strings)
+    dist = [int(d) if isinstance(d, (int, np.integer)) else str(d) for d in dist]
+    index = {'version': 1, 'districts': dist, 'variables': varList,
+             'crop_index': _IndexToJSON(crop.index), 'pred_index': _IndexToJSON(ptime),
+             'crop_name': crop.columns.name}
+    filn = os.path.join(path, 'index.json')
+    with open(filn + '.part', 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(filn + '.part', filn)
+    return DataStore(path)
+
+
+class DataStore:
+    '''
+    Memory-mapped store of the crop panel and predictors (see CreateDataStore).
+
+    Parameters
+    ----------
+    path: str
+        directory of the store
+    mode: str
+        'r' for read-only (default) or 'r+' to modify values in place
+    '''
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        with open(os.path.join(path, 'index.json'), 'r') as f:
+            index = json.load(f)
+        self.districts = pd.Index(index['districts'], name=index.get('crop_name'))
+        self.variables = pd.Index(index['variables'])
+        self.crop_index = _IndexFromJSON(index['crop_index'])
+        self.pred_index = _IndexFromJSON(index['pred_index'])
+        self.crop_array = np.load(os.path.join(path, 'crop.npy'), mmap_mode=mode)
+        self.pred_array = np.load(os.path.join(path, 'pred.npy'), mmap_mode=mode)
+
+    def _Loc(self, pid):
+        i = self.districts.get_loc(pid)
+        if not isinstance(i, (int, np.integer)):
+            raise KeyError('District %s is not unique' % pid)
+        return i
+
+    def crop(self, pid):
+        '''Returns crop records of a district (Series view of the store)
+        '''
+        return pd.Series(self.crop_array[self._Loc(pid)], index=self.crop_index, name=pid, copy=False)
+
+    def pred(self, pid, variables=None):
+        '''Returns monthly predictors of a district (DataFrame view of the store)
+        '''
+        arr = self.pred_array[self._Loc(pid)]
+        if variables is None:
+            return pd.DataFrame(arr.T, index=self.pred_index, columns=self.variables, copy=False)
+        iv = self.variables.get_indexer(variables)
+        return pd.DataFrame(arr[iv].T, index=self.pred_index, columns=variables)
+
+    def variable(self, var, pids=None):
+        '''Returns a predictor of all districts (time x districts)
+        '''
+        iv = self.variables.get_loc(var)
+        if pids is None:
+            return pd.DataFrame(self.pred_array[:,iv,:].T, index=self.pred_index, columns=self.districts,
+                                copy=False)
+        idx = self.districts.get_indexer(pids)
+        return pd.DataFrame(self.pred_array[idx,iv,:].T, index=self.pred_index, columns=pids)
+
+    def crop_panel(self, pids=None):
+        '''Returns crop records of all districts (time x districts)
+        '''
+        if pids is None:
+            return pd.DataFrame(self.crop_array.T, index=self.crop_index, columns=self.districts,
+                                copy=False)
+        idx = self.districts.get_indexer(pids)
+        return pd.DataFrame(self.crop_array[idx].T, index=self.crop_index, columns=pids)
+
+    def pred_frame(self, pids=None):
+        '''Returns predictors with (district, variable) MultiIndex columns
+        (e.g., for scheduler.RunPCYF and pcyf.PCYFBatch)
+        '''
+        if pids is None:
+            pids = list(self.districts)
+        idx = self.districts.get_indexer(pids)
+        data = self.pred_array[idx].reshape([len(pids)*len(self.variables), -1]).T
+        columns = pd.MultiIndex.from_product([pids, self.variables], names=['pid', ''])
+        return pd.DataFrame(data, index=self.pred_index, columns=columns)
@@ -0,0 +1,122 @@
+"""
+This script presents a NaN-aware linear detrending shared by PCYF and SSPRED.
+
+Many series are detrended at once by grouping columns with the same missing
+value pattern and applying a precomputed least-squares projection. As in
+scipy.signal.detrend applied to the valid values only, the trend is fitted
+over the consecutive positions of the valid values.
+
+File name: detrend.py
+Date revised: 10/18/2026
+"""
+__version__ = "1.0"
+__author__ = "Donghoon Lee"
+__maintainer__ = "Donghoon Lee"
+__email__ = "dlee@geog.ucsb.edu"
+
+
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+
+@lru_cache(maxsize=256)
+def _Projection(n):
+    '''Returns n x n residual-maker matrix of the least-squares linear trend
+    '''
+    A = np.vstack((np.arange(n, dtype=float), np.ones(n))).T
+    M = np.eye(n) - A.dot(np.linalg.pinv(A))
+    M.setflags(write=False)
+    return M
+
+
+def Detrend2D(arr):
+    '''detrends columns of 2D array
+
+    *this function deals with missing values.
+
+    Parameters
+    ----------
+    arr: 2d ndarray
+        n x k array; k time-series to be detrended
+
+    Returns
+    -------
+    arr_detrend: 2d ndarray
+        n x k array; detrended values (NaN values remain NaN)
+    '''
+    arr = np.asarray(arr, dtype=float)
+    if arr.ndim == 1:
+        return Detrend2D(arr[:,None])[:,0]
+    arr_detrend = np.full(arr.shape, np.nan)
+    nni = ~np.isnan(arr)
+    # Group columns with the same missing value pattern
+    pattern, group = np.unique(nni.T, axis=0, return_inverse=True)
+    for ig in range(len(pattern)):
+        rows = np.where(pattern[ig])[0]
+        if len(rows) == 0:
+            continue
+        cols = np.where(group.ravel() == ig)[0]
+        M = _Projection(len(rows))
+        arr_detrend[np.ix_(rows, cols)] = M.dot(arr[np.ix_(rows, cols)])
+    return arr_detrend
+
+
+def DetrendSeries(sr):
+    '''detrends 1D Series
+
+    *this function deals with missing values.
+
+    Parameters
+    ----------
+    sr: Series
+        time-series to be detrended
+
+    Returns
+    -------
+    sr: Series
+        detrended values of the time-series
+    '''
+    return pd.Series(Detrend2D(sr.values.astype(float)), index=sr.index, name=sr.name)
+
+
+class DetrendCache:
+    '''
+    Detrends series and memorizes the results, so that identical series
+    (e.g., a lagged predictor at the same lead month used in several stages)
+    are never detrended twice.
+
+    Parameters
+    ----------
+    maxsize: int
+        maximum number of series to be memorized (default is 10000)
+    '''
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.cache = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def detrend(self, arr):
+        '''detrends columns of 2D array (or 1D array) using the memorized results
+        '''
+        arr = np.asarray(arr, dtype=float)
+        if arr.ndim == 1:
+            return self.detrend(arr[:,None])[:,0]
+        keys = [arr[:,j].tobytes() for j in range(arr.shape[1])]
+        todo = [j for j, key in enumerate(keys) if key not in self.cache]
+        self.hits += len(keys) - len(todo)
+        self.misses += len(todo)
+        if len(todo) > 0:
+            res = Detrend2D(arr[:,todo])
+            if len(self.cache) + len(todo) > self.maxsize:
+                self.cache.clear()
+            for k, j in enumerate(todo):
+                self.cache[keys[j]] = res[:,k]
+        return np.vstack([self.cache[key] for key in keys]).T
+
+    def detrend_series(self, sr):
+        '''detrends 1D Series using the memorized results
+        '''
+        return pd.Series(self.detrend(sr.values), index=sr.index, name=sr.name)
@@ -0,0 +1,214 @@
+"""
+This script presents an opt-in instrumentation of the forecast models.
+
+A Recorder measures the wall time of named stages (e.g., lagged sums,
+correlation, regression, scoring), counts events (e.g., folds, fits, lead
+combinations evaluated), and optionally traces memory allocations with
+tracemalloc. The summary is stored in the outbox of a model and can be
+exported as JSON or Chrome trace format (chrome://tracing or Perfetto).
+When instrumentation is disabled, the models use NULL_RECORDER whose stages
+and counters do nothing.
+
+File name: instrument.py
+Date revised: 10/18/2026
+"""
+__version__ = "1.0"
+__author__ = "Donghoon Lee"
+__maintainer__ = "Donghoon Lee"
+__email__ = "dlee@geog.ucsb.edu"
+
+
+import os
+import json
+import time
+import threading
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+
+class Recorder:
+    '''
+    Records wall time, calls, and allocations of stages and counters of events.
+
+    Parameters
+    ----------
+    name: str
+        name of the recorder (e.g., model and district)
+    memory: bool
+        True to trace memory allocations of stages with tracemalloc
+
+    Usage
+    -----
+    rec = Recorder('PCYF SO2001')
+    with rec.stage('regression'):
+        ...
+    rec.count('fits')
+    rec.summary()
+    '''
+    enabled = True
+
+    def __init__(self, name='', memory=False):
+        self.name = name
+        self.memory = memory
+        self.stages = OrderedDict()
+        self.counters = OrderedDict()
+        self.events = []
+        self._tracing = False
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        # Absolute time origin (microseconds) to merge traces of processes
+        self._origin = time.time()*1e6 - time.perf_counter()*1e6
+
+    @contextmanager
+    def stage(self, name):
+        '''Measures a stage (context manager)
+        '''
+        if self.memory:
+            tracemalloc.reset_peak()
+            mem0 = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            t1 = time.perf_counter()
+            stat = self.stages.get(name)
+            if stat is None:
+                stat = self.stages[name] = {'time': 0.0, 'calls': 0}
+                if self.memory:
+                    stat.update({'alloc_mb': 0.0, 'peak_mb': 0.0})
+            stat['time'] += t1 - t0
+            stat['calls'] += 1
+            event = {'name': name, 'ph': 'X', 'ts': self._origin + t0*1e6, 'dur': (t1 - t0)*1e6,
+                     'pid': os.getpid(), 'tid': threading.get_ident(), 'cat': self.name}
+            if self.memory:
+                mem1, peak = tracemalloc.get_traced_memory()
+                stat['alloc_mb'] += (mem1 - mem0)/2**20
+                stat['peak_mb'] = max(stat['peak_mb'], (peak - mem0)/2**20)
+                event['args'] = {'alloc_mb': (mem1 - mem0)/2**20}
+            self.events.append(event)
+
+    def count(self, name, n=1):
+        '''Adds n to the counter
+        '''
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def close(self):
+        '''Stops tracemalloc if it is started by the recorder
+        '''
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def summary(self, events=True):
+        '''Returns a dict of 'name', 'stages' ({stage: time, calls, ...}),
+        'counters', 'total' (sum of stage times), and 'events' (trace events)
+        '''
+        self.close()
+        out = {'name': self.name, 'stages': {k: dict(v) for k, v in self.stages.items()},
+               'counters': dict(self.counters),
+               'total': sum(v['time'] for v in self.stages.values())}
+        if events:
+            out['events'] = list(self.events)
+        return out
+
+
+class NullRecorder:
+    '''
+    Recorder which does nothing (instrumentation is disabled).
+    '''
+    enabled = False
+    _context = nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+    def count(self, name, n=1):
+        pass
+
+    def close(self):
+        pass
+
+    def summary(self, events=True):
+        return None
+
+
+NULL_RECORDER = NullRecorder()
+
+
+def GetRecorder(instrument, name=''):
+    '''Returns a recorder from the "instrument" option of the models
+
+    Parameters
+    ----------
+    instrument: bool, str, or Recorder
+        False/None (disabled), True (time and counters), 'memory' (with
+        allocations), or a Recorder to be shared
+    '''
+    if isinstance(instrument, Recorder):
+        return instrument
+    if instrument:
+        return Recorder(name, memory=(instrument == 'memory'))
+    return NULL_RECORDER
+
+
+def CollectProfiles(outbox):
+    '''Returns all profiles in (nested) outboxes (e.g., results of scheduler)
+    '''
+    profiles = []
+    if isinstance(outbox, dict):
+        if ('stages' in outbox) and ('counters' in outbox):
+            return [outbox]
+        if isinstance(outbox.get('profile'), dict):
+            profiles.append(outbox['profile'])
+        for key, value in outbox.items():
+            if key != 'profile':
+                profiles.extend(CollectProfiles(value))
+    elif isinstance(outbox, (list, tuple)):
+        for value in outbox:
+            profiles.extend(CollectProfiles(value))
+    return profiles
+
+
+def MergeProfiles(profiles):
+    '''Returns total time and calls of stages and counters of profiles
+    '''
+    stages, counters = OrderedDict(), OrderedDict()
+    for prof in profiles:
+        for name, stat in prof['stages'].items():
+            total = stages.setdefault(name, {})
+            for key, value in stat.items():
+                if key == 'peak_mb':
+                    total[key] = max(total.get(key, 0), value)
+                else:
+                    total[key] = total.get(key, 0) + value
+        for name, value in prof['counters'].items():
+            counters[name] = counters.get(name, 0) + value
+    return {'stages': dict(stages), 'counters': dict(counters),
+            'total': sum(v['time'] for v in stages.values())}
+
+
+def SaveTrace(filn, outbox, format='chrome'):
+    '''Saves profiles of outboxes as Chrome trace or JSON summary
+
+    Parameters
+    ----------
+    filn: str
+        filename of the trace
+    outbox: dict or list
+        outbox(es) of models, or profiles
+    format: str
+        'chrome' (trace events) or 'json' (merged and per-model summaries)
+    '''
+    profiles = CollectProfiles(outbox)
+    if format == 'chrome':
+        events = [event for prof in profiles for event in prof.get('events', [])]
+        data = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    elif format == 'json':
+        data = {'merged': MergeProfiles(profiles),
+                'profiles': [{k: v for k, v in prof.items() if k != 'events'} for prof in profiles]}
+    else:
+        raise ValueError('format should be "chrome" or "json"')
+    with open(filn, 'w') as f:
+        json.dump(data, f)
@@ -0,0 +1,266 @@
+"""
+This script presents a persistent memoization of per-district forecasts of
+PCYF and SSPRED across runs.
+
+The key of a forecast is a SHA-1 hash of the input slices (only the columns
+and months which can affect the forecast), the model parameters, and the code
+version (content of the model sources). Outboxes are pickled in a cache
+directory, and the least recently used files are evicted when the total size
+exceeds the limit.
+
+File name: memo.py
+Date revised: 10/18/2026
+"""
+__version__ = "1.0"
+__author__ = "Donghoon Lee"
+__maintainer__ = "Donghoon Lee"
+__email__ = "dlee@geog.ucsb.edu"
+
+
+import os
+import json
+import time
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+# Sources of which content defines the code version
+_SOURCES = ['pcyf.py', 'sspred.py', 'metrics.py', 'detrend.py']
+_CODE_VERSION = None
+
+
+def CodeVersion():
+    '''Returns SHA-1 hash of the sources of the models
+    '''
+    global _CODE_VERSION
+    if _CODE_VERSION is None:
+        sha = hashlib.sha1()
+        root = os.path.dirname(os.path.abspath(__file__))
+        for filn in _SOURCES:
+            with open(os.path.join(root, filn), 'rb') as f:
+                sha.update(f.read())
+        _CODE_VERSION = sha.hexdigest()
+    return _CODE_VERSION
+
+
+def _UpdateHash(sha, obj):
+    '''Updates hash with a pandas object, array, or JSON-serializable value
+    '''
+    if isinstance(obj, (pd.Series, pd.DataFrame)):
+        labels = list(obj.columns) if isinstance(obj, pd.DataFrame) else [obj.name]
+        sha.update(type(obj).__name__.encode())
+        sha.update(json.dumps([str(c) for c in labels]).encode())
+        sha.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+    elif isinstance(obj, np.ndarray):
+        sha.update(str(obj.dtype).encode() + str(obj.shape).encode())
+        sha.update(np.ascontiguousarray(obj).tobytes())
+    else:
+        sha.update(json.dumps(obj, sort_keys=True, default=str).encode())
+
+
+def HashKey(*objs):
+    '''Returns SHA-1 hash of the objects and the code version
+    '''
+    sha = hashlib.sha1(CodeVersion().encode())
+    for obj in objs:
+        _UpdateHash(sha, obj)
+    return sha.hexdigest()
+
+
+class ForecastCache:
+    '''
+    On-disk cache of outboxes with size-bounded LRU eviction.
+
+    The total size of the cached files is scanned once and kept as a running
+    total, so that the directory is listed again only when a put exceeds the
+    limit (files written by other processes are counted at that scan). Files
+    are then evicted down to 90% of the limit.
+
+    Parameters
+    ----------
+    path: str
+        cache directory
+    maxsize_mb: float
+        maximum total size of the cached files in MB (default is 1024)
+    '''
+
+    def __init__(self, path='./data/cache', maxsize_mb=1024):
+        self.path = path
+        self.maxsize = maxsize_mb*2**20
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+        self.size = sum(size for _, size, _ in self._Files())
+
+    def _Filename(self, key):
+        return os.path.join(self.path, '%s.pkl' % key)
+
+    def _Files(self):
+        '''Returns (mtime, size, name) of the cached files
+        '''
+        files = []
+        for name in os.listdir(self.path):
+            if name.endswith('.pkl'):
+                try:
+                    stat = os.stat(os.path.join(self.path, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+        return files
+
+    def _Size(self, filn):
+        try:
+            return os.path.getsize(filn)
+        except OSError:
+            return 0
+
+    def get(self, key):
+        '''Returns the cached outbox (None if not cached)
+        '''
+        filn = self._Filename(key)
+        try:
+            with open(filn, 'rb') as f:
+                outbox = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        # Access time for LRU eviction
+        now = time.time()
+        try:
+            os.utime(filn, (now, now))
+        except OSError:
+            pass
+        self.hits += 1
+        return outbox
+
+    def put(self, key, outbox):
+        '''Caches the outbox and evicts the least recently used files if the
+        total size exceeds the limit
+        '''
+        filn = self._Filename(key)
+        temp = '%s.%d.part' % (filn, os.getpid())
+        with open(temp, 'wb') as f:
+            pickle.dump(outbox, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.size += os.path.getsize(temp) - self._Size(filn)
+        os.replace(temp, filn)
+        if self.size > self.maxsize:
+            # Evicted below the limit so that the next puts do not scan again
+            self.evict(0.9)
+
+    def evict(self, fraction=1.0):
+        '''Removes the least recently used files until the total size is within
+        the fraction of the limit
+        '''
+        files = self._Files()
+        total = sum(f[1] for f in files)
+        for _, size, name in sorted(files):
+            if total <= fraction*self.maxsize:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            total -= size
+        self.size = total
+
+    def invalidate(self, key):
+        '''Removes a cached outbox
+        '''
+        filn = self._Filename(key)
+        size = self._Size(filn)
+        try:
+            os.remove(filn)
+        except FileNotFoundError:
+            return
+        self.size = max(self.size - size, 0)
+
+    def clear(self):
+        '''Removes all cached outboxes
+        '''
+        for name in os.listdir(self.path):
+            if name.endswith('.pkl'):
+                os.remove(os.path.join(self.path, name))
+        self.size = 0
+
+
+def _GetCache(cache):
+    return ForecastCache(cache) if isinstance(cache, str) else cache
+
+
+def PCYFKey(dfCrop, dfPred, targmon, leadmat, pid=None, **kwargs):
+    '''Returns the key of a PCYF forecast
+
+    Only the predictors used by PCYF ('prcp', 'smos', 'etos') until the last
+    crop record are hashed, so that newly appended months of predictors do not
+    change the key unless a new crop record is added.
+    '''
+    dfPred = dfPred[['prcp', 'smos', 'etos']]
+    dfPred = dfPred[dfPred.index <= dfCrop.index.max()]
+    return HashKey('PCYF', dfCrop, dfPred, {'targmon': targmon, 'leadmat': list(leadmat),
+                                              'pid': pid, 'kwargs': kwargs})
+
+
+def SSPREDKey(dfFlow, dfPred, leadMat, point_no, **kwargs):
+    '''Returns the key of a SSPRED forecast (predictors until the last flow record)
+    '''
+    dfPred = dfPred[dfPred.index <= dfFlow.index.max()]
+    return HashKey('SSPRED', dfFlow, dfPred, np.asarray(leadMat),
+                   {'point_no': point_no, 'kwargs': kwargs})
+
+
+def CachedPCYF(dfCrop, dfPred, targmon, leadmat, pid=None, cache='./data/cache', store=None,
+               **kwargs):
+    '''Returns the outbox of PCYF from the cache or runs PCYF
+
+    Parameters
+    ----------
+    cache: str or ForecastCache
+        cache directory or cache (None or instrumented runs are not cached)
+    store: results.ResultStore
+        compact store into which the results are written (optional)
+    **kwargs:
+        keyword arguments passed to PCYF (e.g., incremental)
+    '''
+    from pcyf import PCYF
+    if kwargs.get('instrument'):
+        # Profiles are not cached
+        cache = None
+    cache = _GetCache(cache)
+    key = PCYFKey(dfCrop, dfPred, targmon, leadmat, pid, **kwargs) if cache is not None else None
+    outbox = cache.get(key) if cache is not None else None
+    if outbox is None:
+        outbox = PCYF(dfCrop, dfPred, targmon, leadmat, pid=pid, **kwargs).outbox
+        if cache is not None:
+            cache.put(key, outbox)
+    if store is not None:
+        store.write(pid, outbox)
+    return outbox
+
+
+def CachedSSPRED(dfFlow, dfPred, leadMat, point_no, cache='./data/cache', store=None, **kwargs):
+    '''Returns the outbox of SSPRED from the cache or runs SSPRED
+
+    Parameters
+    ----------
+    cache: str or ForecastCache
+        cache directory or cache (None or instrumented runs are not cached)
+    store: results.ResultStore
+        compact store into which the results are written (optional)
+    **kwargs:
+        keyword arguments passed to SSPRED (e.g., targMonth, search)
+    '''
+    from sspred import SSPRED
+    if kwargs.get('instrument'):
+        cache = None
+    cache = _GetCache(cache)
+    key = SSPREDKey(dfFlow, dfPred, leadMat, point_no, **kwargs) if cache is not None else None
+    outbox = cache.get(key) if cache is not None else None
+    if outbox is None:
+        outbox = SSPRED(dfFlow, dfPred, leadMat, point_no, **kwargs).outbox
+        if cache is not None:
+            cache.put(key, outbox)
+    if store is not None:
+        store.write(point_no, outbox)
+    return outbox
@@ -36,6 +36,8 @@ import scipy.stats
 from scipy.stats import gmean, rankdata
 from sklearn.metrics import mean_squared_error
 import warnings
+import hashlib
+from collections import OrderedDict
 
 
 # References for hydrometeological Skill scores and Performace indicators
@@ -87,6 +89,96 @@ def matlab_percentile(in_data, percentiles):
     return perc
 
 
+def matlab_percentile_2d(in_data, percentiles):
+    """
+    Calculate percentiles of each row in the way IDL and Matlab do it.
+
+    This is a row-wise version of matlab_percentile for many climatologies
+    at once. NaN values are ignored, so rows may have different numbers of
+    valid values (e.g., NaN-padded training periods).
+
+    Parameters
+    ----------
+    in_data: numpy.ndarray
+        n_series x n_samples input data
+    percentiles: numpy.ndarray
+        percentiles at which to calculate the values
+
+    Returns
+    -------
+    perc: numpy.ndarray
+        n_series x n_percentiles values of the percentiles (NaN if a row has
+        no valid values)
+    """
+    data = np.sort(np.atleast_2d(np.asarray(in_data, dtype=float)), axis=1)   # NaN at the end
+    n = (~np.isnan(data)).sum(1)
+    nmax = np.maximum(n - 1, 0)[:,None]
+    percentiles = np.atleast_1d(np.asarray(percentiles, dtype=float))
+    # Fractional ranks of the percentiles (p_rank = 100*(rank+0.5)/n)
+    rank = percentiles[None,:] * n[:,None] / 100.0 - 0.5
+    rank = np.minimum(np.maximum(rank, 0), nmax)
+    lo = np.floor(rank).astype(int)
+    hi = np.minimum(lo + 1, nmax)
+    vlo = np.take_along_axis(data, lo, axis=1)
+    vhi = np.take_along_axis(data, hi, axis=1)
+    perc = vlo + (rank - lo) * (vhi - vlo)
+    perc[n == 0] = np.nan
+    return perc
+
+
+class ThresholdCache(object):
+    """
+    Memorizes percentile thresholds of climatologies by training period, so
+    that walk-forward evaluation does not sort the same climatology again.
+    Keys include a fingerprint of the climatology (shape and SHA-1 of its
+    values), so that different climatologies of the same period are not
+    mixed up, unless the caller supplies a key of the climatology. The least
+    recently used thresholds are dropped beyond maxsize entries.
+
+    Parameters
+    ----------
+    maxsize: int
+        maximum number of memorized thresholds (default is 128)
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+
+    def thresholds(self, clm, percentiles, period, key=None):
+        """
+        Returns matlab_percentile_2d(clm, percentiles) of the training period.
+
+        Parameters
+        ----------
+        clm: numpy.ndarray
+            n_series x n_samples climatological data of the training period
+        percentiles: numpy.ndarray
+            percentiles at which to calculate the values
+        period: hashable
+            key of the training period (e.g., (first year, last year)) or None
+        key: hashable
+            key of clm supplied by the caller (optional). The fingerprint of
+            clm is not computed, so the same key must always refer to the
+            same climatology.
+        """
+        if key is None:
+            clm = np.ascontiguousarray(clm, dtype=float)
+            key = (clm.shape, hashlib.sha1(clm.tobytes()).hexdigest())
+        key = (period, tuple(np.atleast_1d(percentiles)), key)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        terc = matlab_percentile_2d(clm, percentiles)
+        self.cache[key] = terc
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return terc
+
+    def clear(self):
+        self.cache.clear()
+
+
 def makeBinaryContTable(obs, sim, clm=None, thrsd=0.5):
     """
     Initializes a binary contingency table with thrsd in percentage.
@@ -183,6 +275,69 @@ def makeMultiContTable(obs, sim, clm=None, thrsd=[1/3, 2/3]):
     return table
 
 
+def makeMultiContTableBatch(obs, sim, clm=None, thrsd=[1/3, 2/3], cache=None, period=None,
+                            key=None):
+    """
+    Initializes multiclass contingency tables of many series at once. Each
+    series is classified with its own thresholds, and all tables are filled
+    with a single counting pass (np.bincount).
+    
+    Parameters
+    ----------
+    obs: 2d ndarray
+        n_series x n_samples array of observed data (NaN is ignored)
+    sim: 2d ndarray
+        n_series x n_samples array of forecast data (NaN is ignored)
+    clm: 2d ndarray
+        n_series x n_clm array of climatological data (usually observation 
+        data in training period) to define ranges of contingency tables. NaN
+        can be used to pad series of different lengths.
+    thrsd: float or list
+        thresholds in percentages. Default is terciles (e.g. [1/3, 2/3]).
+        A single threshold (e.g. 0.5) makes binary (2x2) tables.
+    cache: ThresholdCache
+        cache of thresholds (optional)
+    period: hashable
+        key of the training period of clm in the cache (optional, as the key
+        includes a fingerprint of clm)
+    key: hashable
+        key of clm in the cache supplied by the caller (optional); it skips
+        the fingerprint of clm
+        
+    Returns
+    -------
+    table: 3d ndarray
+        n_series x k x k contingency tables, where k = len(thrsd)+1. Rows
+        correspond to forecast and columns to observed categories.
+    """
+
+    obs = np.atleast_2d(np.asarray(obs, dtype=float))
+    sim = np.atleast_2d(np.asarray(sim, dtype=float))
+    assert obs.shape == sim.shape, 'Shapes of arrays are different.'
+    thrsd = np.atleast_1d(thrsd)
+    nser = obs.shape[0]
+    k = len(thrsd) + 1
+    if clm is None:
+        # Use obs to make terciles
+        clm = obs
+    clm = np.atleast_2d(np.asarray(clm, dtype=float))
+
+    # Define boundaries of each series
+    if cache is not None:
+        terc = cache.thresholds(clm, thrsd*100, period, key)
+    else:
+        terc = matlab_percentile_2d(clm, thrsd*100)
+
+    # Classify data (i.e., the number of boundaries below each value)
+    iobs = (obs[:,:,None] > terc[:,None,:]).sum(2)
+    isim = (sim[:,:,None] > terc[:,None,:]).sum(2)
+    valid = ~(np.isnan(obs) | np.isnan(sim))
+    # Count all tables at once
+    code = (np.arange(nser)[:,None]*k + isim)*k + iobs
+    table = np.bincount(code[valid], minlength=nser*k*k).reshape([nser, k, k])
+    return table.astype(float)
+
+
 class ContingencyTable(object):
     """
     Initializes a binary contingency table and generates many skill scores.
@@ -454,5 +609,77 @@ class MulticlassContingencyTable(object):
         return gmss
 
 
+class MulticlassContingencyTableBatch(object):
+    """
+    This class is a container for a stack of multiclass contingency tables
+    (e.g., n_series x 3 x 3) and computes skill scores of all tables at once.
+    Rows of each table correspond to forecast categories and columns to
+    observation categories, as in MulticlassContingencyTable.
+    
+    Currently, the following scores are available:
+        - Heidke Skill Score (hss)
+        - Peirce Skill Score (pss)
+        - Gerrity Skill Score (gss)
+    """
 
+    def __init__(self, table, n_classes=None):
+        self.table = np.asarray(table, dtype=float)
+        if self.table.ndim == 2:
+            self.table = self.table[None,:,:]
+        self.n_classes = self.table.shape[1] if n_classes is None else n_classes
 
+    def heidke_skill_score(self):
+        """Compute Heidke Skill Score (HSS) of all tables
+        """
+        n = self.table.sum(axis=(1,2))
+        nf = self.table.sum(axis=2)
+        no = self.table.sum(axis=1)
+        correct = np.trace(self.table, axis1=1, axis2=2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            chance = (nf * no).sum(1) / n ** 2
+            return (correct / n - chance) / (1 - chance)
+
+    def peirce_skill_score(self):
+        """Compute Peirce Skill Score (PSS) of all tables
+        """
+        n = self.table.sum(axis=(1,2))
+        nf = self.table.sum(axis=2)
+        no = self.table.sum(axis=1)
+        correct = np.trace(self.table, axis1=1, axis2=2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (correct / n - (nf * no).sum(1) / n ** 2) / (1 - (no * no).sum(1) / n ** 2)
+
+    def gerrity_skill_score(self):
+        """Compute the Gerrity Skill Score (GSS) of all tables
+        
+        The Gerrity (1992) scoring matrices of all tables are built at once
+        from the cumulative sums of the odds ratios.
+        
+        Returns
+        -------
+        1d ndarray
+            The Gerrity Skill Score (GSS) values.
+        """
+        nser, k = self.table.shape[:2]
+        n = self.table.sum(axis=(1,2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            p_o = self.table.sum(axis=1) / n[:,None]    # Marginal distribution
+        # Control of marginal distribution when a category has all zero counts
+        zero = (p_o == 0)
+        nzero = zero.sum(1)
+        p_o[zero] = 0.001
+        imax = np.argmax(p_o, axis=1)
+        p_o[np.arange(nser), imax] -= 0.001*nzero
+        # J-1 odds ratio
+        p_sum = np.cumsum(p_o, axis=1)[:,:-1]
+        a = (1.0 - p_sum) / p_sum
+        # Gerrity(1992) scoring weights
+        # s[i,j] = (sum(1/a[0:i]) - (j-i) + sum(a[j:k-1]))/(k-1) for i <= j
+        inva = np.hstack((np.zeros([nser,1]), np.cumsum(1.0 / a, axis=1)))
+        suma = np.hstack((np.cumsum(a[:,::-1], axis=1)[:,::-1], np.zeros([nser,1])))
+        i, j = np.indices((k, k))
+        lo, hi = np.minimum(i, j), np.maximum(i, j)
+        s = (inva[:,lo] - (hi - lo) + suma[:,hi]) / (k - 1.0)
+        # Gandin-Murphy Skill Scores (GMSS)
+        gmss = np.sum(self.table / n[:,None,None] * s, axis=(1,2))
+        return gmss
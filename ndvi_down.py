@@ -1,5 +1,13 @@
 import os
+import json
+import time
+import argparse
+import hashlib
+import threading
+import http.client
+import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from bs4 import BeautifulSoup
 import numpy as np
 
@@ -21,64 +29,497 @@ def LinkFromURL(url):
     return links
 
 
-def DownloadFromURL(fullURL, fullDIR, showLog = False):
+class _ConnectionPool(threading.local):
+    '''
+    Keep-alive HTTP(S) connections of the current thread (one per host).
+    '''
+
+    def __init__(self):
+        self.conns = dict()
+
+    def get(self, scheme, netloc, timeout):
+        key = (scheme, netloc)
+        if key not in self.conns:
+            if scheme == 'https':
+                self.conns[key] = http.client.HTTPSConnection(netloc, timeout=timeout)
+            else:
+                self.conns[key] = http.client.HTTPConnection(netloc, timeout=timeout)
+        return self.conns[key]
+
+    def drop(self, scheme, netloc):
+        conn = self.conns.pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+
+_POOL = _ConnectionPool()
+
+
+def _Request(url, method='GET', headers=None, timeout=60, maxredirect=5):
+    '''
+    Sends a request with the keep-alive connection of the current thread and
+    returns (response, final URL). Redirects are followed.
+    '''
+    for _ in range(maxredirect+1):
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        conn = _POOL.get(parts.scheme, parts.netloc, timeout)
+        try:
+            conn.request(method, path, headers=headers or {})
+            resp = conn.getresponse()
+        except (OSError, http.client.HTTPException):
+            # Stale keep-alive connection is reopened once
+            _POOL.drop(parts.scheme, parts.netloc)
+            conn = _POOL.get(parts.scheme, parts.netloc, timeout)
+            conn.request(method, path, headers=headers or {})
+            resp = conn.getresponse()
+        if resp.status in (301, 302, 303, 307, 308):
+            resp.read()
+            url = urllib.parse.urljoin(url, resp.getheader('Location'))
+            continue
+        return resp, url
+    raise IOError('Too many redirects: %s' % url)
+
+
+def _CheckFile(filn, size=None, checksum=None):
+    '''
+    Verifies the size and checksum ('algorithm:hexdigest', e.g., 'md5:...') of a file.
+    '''
+    if (size is not None) and (os.path.getsize(filn) != size):
+        raise IOError('Size mismatch: %s (%d != %d bytes)' % (filn, os.path.getsize(filn), size))
+    if checksum is not None:
+        algo, digest = checksum.split(':', 1)
+        h = hashlib.new(algo)
+        with open(filn, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                h.update(block)
+        if h.hexdigest().lower() != digest.lower():
+            raise IOError('Checksum mismatch: %s' % filn)
+
+
+def _RangeValidator(resp):
+    '''
+    Returns the validator of a response usable in If-Range (strong ETag, or
+    Last-Modified if there is no strong ETag).
+    '''
+    etag = resp.getheader('ETag')
+    if (etag is not None) and not etag.startswith('W/'):
+        return etag
+    return resp.getheader('Last-Modified')
+
+
+def _RemovePart(part):
+    for filn in [part, part + '.validator']:
+        if os.path.exists(filn):
+            os.remove(filn)
+
+
+def DownloadFile(file_url, file_dir, size=None, checksum=None, retries=5, backoff=1, timeout=60):
+    '''
+    Downloads a file to a temporary ".part" file and renames it when it is complete.
+
+    Partial downloads are resumed with HTTP Range requests. The validator (strong
+    ETag or Last-Modified) of the response which started the ".part" file is
+    kept in ".part.validator" and sent as If-Range, so that the server sends the
+    whole file again (HTTP 200) if it has been replaced. A ".part" file without
+    a validator, or a 206 response which does not continue it, is restarted.
+    Failed transfers are retried with exponential backoff. The size
+    (Content-Length or "size") and "checksum" of the file are verified before
+    the rename, so that incomplete files never appear as "file_dir".
+    '''
+    part = file_dir + '.part'
+    parts = urllib.parse.urlsplit(file_url)
+    for attempt in range(retries+1):
+        fatal = False
+        try:
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            validator = None
+            if os.path.exists(part + '.validator'):
+                with open(part + '.validator', 'r') as f:
+                    validator = f.read().strip() or None
+            if (offset > 0) and (validator is None):
+                # Partial file which cannot be matched to the remote file
+                _RemovePart(part)
+                offset = 0
+            headers = {'Range': 'bytes=%d-' % offset, 'If-Range': validator} if offset > 0 else {}
+            resp, _ = _Request(file_url, headers=headers, timeout=timeout)
+            if resp.status == 416:
+                # Range is not satisfiable: the partial file may be complete
+                resp.read()
+                total = resp.getheader('Content-Range', '').rpartition('/')[2]
+                total = int(total) if total.isdigit() else size
+                if (total is None) or (total != offset):
+                    _RemovePart(part)
+                    raise IOError('Invalid partial file: %s' % part)
+            elif resp.status in (200, 206):
+                if resp.status == 206:
+                    start = resp.getheader('Content-Range', '').partition(' ')[2].partition('-')[0]
+                    if (offset == 0) or (start != str(offset)) or \
+                       (_RangeValidator(resp) not in (None, validator)):
+                        # Range of another file or another offset
+                        resp.read()
+                        _RemovePart(part)
+                        raise IOError('Unexpected range of %s' % file_url)
+                else:
+                    # Whole file (new, replaced, or the range is ignored)
+                    offset = 0
+                    with open(part + '.validator', 'w') as f:
+                        f.write(_RangeValidator(resp) or '')
+                length = resp.getheader('Content-Length')
+                total = offset + int(length) if length is not None else size
+                with open(part, 'ab' if resp.status == 206 else 'wb') as f:
+                    for block in iter(lambda: resp.read(2**20), b''):
+                        f.write(block)
+            else:
+                resp.read()
+                if (400 <= resp.status < 500) and (resp.status not in (408, 429)):
+                    # Client errors (e.g., 404) are not retried
+                    fatal = True
+                raise IOError('HTTP %d %s: %s' % (resp.status, resp.reason, file_url))
+            try:
+                _CheckFile(part, size if size is not None else total, checksum)
+            except IOError:
+                _RemovePart(part)
+                raise
+            os.replace(part, file_dir)
+            _RemovePart(part)
+            return
+        except (OSError, http.client.HTTPException) as err:
+            _POOL.drop(parts.scheme, parts.netloc)
+            if fatal or (attempt == retries):
+                raise IOError('%s (after %d attempts)' % (err, attempt+1))
+            time.sleep(backoff*2**attempt)
+
+
+def DownloadFromURL(fullURL, fullDIR, showLog = False, nworkers=8, sizes=None, checksums=None,
+                    retries=5, backoff=1, callback=None):
     '''
     Downloads the inserted hyperlinks (URLs) to the inserted files n the disk
+
+    Files are downloaded by a pool of "nworkers" concurrent transfers (see
+    DownloadFile). Existing files are skipped; incomplete downloads remain as
+    ".part" files and are resumed in the next run. "sizes" and "checksums" are
+    optional lists of expected sizes (bytes) and checksums of the files.
+    "callback" is called with the filename of each downloaded file in the
+    calling thread (e.g., MonthlyComposite.add of ndvi_ingest).
+
+    Returns the number of files that exist, are downloaded, and failed.
     '''
+    if type(fullDIR) == str:
+        fullURL, fullDIR = [fullURL], [fullDIR]
+    if sizes is None:
+        sizes = [None]*len(fullDIR)
+    if checksums is None:
+        checksums = [None]*len(fullDIR)
     # Make parent directories if they do not exist
-    if type(fullDIR) == list:
-        parentDIRS = list(np.unique([os.path.dirname(DIR) for DIR in fullDIR]))
-        for parentDIR in parentDIRS:
+    parentDIRS = list(np.unique([os.path.dirname(DIR) for DIR in fullDIR]))
+    for parentDIR in parentDIRS:
+        if parentDIR != '':
             os.makedirs(parentDIR, exist_ok=True)
-        # Download all files
-        nError = 0
-        nExist = 0
-        nDown = 0
-        for file_url, file_dir in zip(fullURL, fullDIR):
-            if not os.path.exists(file_dir):
+    # Download all files
+    nError = 0
+    nExist = 0
+    nDown = 0
+    tasks = []
+    for file_url, file_dir, size, checksum in zip(fullURL, fullDIR, sizes, checksums):
+        if not os.path.exists(file_dir):
+            tasks.append((file_url, file_dir, size, checksum))
+        else:
+            nExist += 1
+    if len(tasks) > 0:
+        with ThreadPoolExecutor(max_workers=max(1, min(nworkers, len(tasks)))) as executor:
+            futures = {executor.submit(DownloadFile, file_url, file_dir, size, checksum,
+                                       retries, backoff): file_dir
+                       for file_url, file_dir, size, checksum in tasks}
+            for future in as_completed(futures):
                 try:
-                    urllib.request.urlretrieve(file_url, file_dir)
+                    future.result()
                     nDown += 1
-                    print(file_dir, 'is saved.')
-                except:
+                    print(futures[future], 'is saved.')
+                    if callback is not None:
+                        callback(futures[future])
+                except (OSError, http.client.HTTPException) as err:
                     nError += 1
-                    pass
-            else:
-                nExist += 1
-        if showLog:
-            print('%d files are tried: %d exist, %d downloads, %d errors' % (len(fullURL),nExist,nDown,nError))
-            
-    elif type(fullDIR) == str:
-        parentDIRS = os.path.dirname(fullDIR)
-        # Download all files
-        nError = 0
-        nExist = 0
-        nDown = 0
-        if not os.path.exists(fullDIR):
-                try:
-                    urllib.request.urlretrieve(fullURL, fullDIR)
-                    nDown += 1
-                    print(fullDIR, 'is saved.')
-                except:
-                    nError += 1
-                    pass
-                else:
-                    nExist += 1
-        if showLog:
-            print('%d files are tried: %d exist, %d downloads, %d errors' % (len(fullURL),nExist,nDown,nError))
-    return
-
-
-def main():
-    url = 'https://www.ncei.noaa.gov/data/avhrr-land-normalized-difference-vegetation-index/access/'
-    path = '/Users/dlee/data/repo/CropYieldForecast/ndvi/'
-    year = 1981
-    links = LinkFromURL(url+str(year))
-    links = [link for link in links if link.startswith('AVHRR')]
-    fullDIR = [os.path.join(path, link) for link in links]
-    fullURL = [os.path.join(url, str(year), link) for link in links]
-    DownloadFromURL(fullURL, fullDIR, True)
-    
-    
+                    print('%s is failed: %s' % (futures[future], err))
+    if showLog:
+        print('%d files are tried: %d exist, %d downloads, %d errors' % (len(fullURL),nExist,nDown,nError))
+    return nExist, nDown, nError
+
+
+# EO archives to be synchronized (the listing of each year is at url/year/)
+SOURCES = {
+    'noaa': {'url': 'https://www.ncei.noaa.gov/data/avhrr-land-normalized-difference-vegetation-index/access/',
+             'prefix': 'AVHRR',
+             'path': '/Users/dlee/data/repo/CropYieldForecast/ndvi/'},
+    'chc': {'url': 'https://www.ncei.noaa.gov/data/avhrr-land-normalized-difference-vegetation-index/access/',
+            'prefix': 'AVHRR',
+            'path': '/home/dlee/ndvi/'},
+}
+
+
+def LoadManifest(filn):
+    '''
+    Returns the manifest of a product and year (empty if it does not exist).
+    '''
+    if os.path.exists(filn):
+        with open(filn, 'r') as f:
+            return json.load(f)
+    return {'etag': None, 'last_modified': None, 'files': {}}
+
+
+def SaveManifest(filn, manifest):
+    '''
+    Saves the manifest atomically.
+    '''
+    os.makedirs(os.path.dirname(filn) or '.', exist_ok=True)
+    with open(filn + '.part', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(filn + '.part', filn)
+
+
+def _ListingInfo(link):
+    '''
+    Returns the text next to a link in a listing (e.g., last-modified and size
+    columns of an autoindex page), or None if the listing shows only names.
+    '''
+    row = link.find_parent('tr')
+    if row is not None:
+        # Table listing (e.g., NCEI): cells of the row other than the link
+        text = ' '.join(td.get_text(' ', strip=True) for td in row.find_all('td')
+                        if td.find('a') is None)
+    else:
+        # Preformatted listing (e.g., Apache): text after the link in its line
+        text = link.next_sibling
+        text = text.split('\n')[0] if isinstance(text, str) else ''
+    return ' '.join(text.split()) or None
+
+
+def ListingFromURL(url, prefix='', etag=None, last_modified=None):
+    '''
+    Returns (links, etag, last_modified) of the listing in the URL.
+
+    links is a dict of {filename: text of the listing next to the link (e.g.,
+    date and size), or None}. The listing is requested conditionally with the
+    validators of the previous request, and links is None if the listing is not
+    modified (HTTP 304).
+    '''
+    headers = {}
+    if etag is not None:
+        headers['If-None-Match'] = etag
+    if last_modified is not None:
+        headers['If-Modified-Since'] = last_modified
+    resp, _ = _Request(url, headers=headers)
+    html_doc = resp.read()
+    if resp.status == 304:
+        return None, etag, last_modified
+    if resp.status != 200:
+        raise IOError('HTTP %d %s: %s' % (resp.status, resp.reason, url))
+    soup = BeautifulSoup(html_doc.decode('utf-8'), 'html.parser')
+    links = {}
+    for link in soup.find_all('a'):
+        href = link.get('href')
+        if (href is not None) and href.startswith(prefix):
+            links[href] = _ListingInfo(link)
+    return links, resp.getheader('ETag'), resp.getheader('Last-Modified')
+
+
+def HeadFromURL(url):
+    '''
+    Returns (size, last-modified, ETag) of the file in the URL.
+    '''
+    resp, _ = _Request(url, method='HEAD')
+    resp.read()
+    if resp.status != 200:
+        raise IOError('HTTP %d %s: %s' % (resp.status, resp.reason, url))
+    size = resp.getheader('Content-Length')
+    size = int(size) if size is not None else None
+    return size, resp.getheader('Last-Modified'), resp.getheader('ETag')
+
+
+def _SyncListing(url, year, prefix, manifest):
+    '''
+    Updates the manifest of a year with its listing and returns {filename:
+    listing text} of the files to be checked with HEAD requests (None if the
+    listing is not modified).
+
+    Only the files which are new or whose listing text (e.g., date and size)
+    has changed since the last HEAD request are checked.
+    '''
+    links, etag, last_modified = ListingFromURL(url + '%d/' % year, prefix,
+                                                manifest['etag'], manifest['last_modified'])
+    if links is None:
+        return None
+    manifest['etag'], manifest['last_modified'] = etag, last_modified
+    files = manifest['files']
+    for name in list(files.keys()):
+        if name not in links:
+            files.pop(name)
+    heads = {}
+    for name, info in links.items():
+        entry = files.setdefault(name, {'size': None, 'last_modified': None, 'etag': None})
+        if ('listing' not in entry) or (entry['listing'] != info):
+            heads[name] = info
+    return heads
+
+
+def _Validator(entry):
+    '''
+    Returns the validator of a remote file (ETag, or Last-Modified if no ETag).
+    '''
+    return entry.get('etag') or entry.get('last_modified')
+
+
+def SyncProduct(source='noaa', years=None, path=None, nworkers=8, ingest=None, showLog=True):
+    '''
+    Synchronizes the local archive of a product with its remote listings.
+
+    A manifest (filename, size, last-modified, ETag, and listing text) is kept
+    per product and year in path/manifest/. Listings of the years are fetched
+    concurrently and conditionally. In a modified listing (or a listing without
+    validators), only the files which are new or whose listing text (e.g., date
+    and size columns) has changed are checked with HEAD requests, sent
+    concurrently through the same keep-alive connections. Files replaced in
+    place on a server whose listing shows neither dates nor sizes are not
+    detected. The
+    validator (ETag or Last-Modified) of each downloaded copy is kept in the
+    manifest ("synced"), and only the files missing in the local archive or
+    whose remote validator differs from that of the local copy are downloaded.
+    Local copies without a validator (e.g., downloaded before the manifest) are
+    compared by size.
+
+    If "ingest" is given, each downloaded file is accumulated into the monthly
+    composites of the sub-extent and removed (streaming ingest), and the files
+    already accumulated are not downloaded again.
+
+    Parameters
+    ----------
+    source: str or dict
+        name of SOURCES or a dict with 'url', 'prefix', and 'path'
+    years: list
+        years to be synchronized (default is 1981 to the current year)
+    path: str
+        local directory of the archive (default is the path of the source)
+    nworkers: int
+        number of concurrent requests
+    ingest: ndvi_ingest.MonthlyComposite
+        monthly composites into which downloaded files are accumulated
+
+    Returns
+    -------
+    nExist, nDown, nError: int
+        numbers of files that exist, are downloaded, and failed
+    '''
+    name = source if isinstance(source, str) else 'custom'
+    if isinstance(source, str):
+        source = SOURCES[source]
+    if years is None:
+        years = list(range(1981, time.localtime().tm_year+1))
+    if path is None:
+        path = source['path']
+    url = source['url']
+    manifests = {}
+    for year in years:
+        filn = os.path.join(path, 'manifest', '%s_%d.json' % (name, year))
+        manifests[year] = (filn, LoadManifest(filn))
+    modified = set()
+    with ThreadPoolExecutor(max_workers=max(1, nworkers)) as executor:
+        # Fetch listings concurrently
+        futures = {executor.submit(_SyncListing, url, year, source['prefix'], manifests[year][1]): year
+                   for year in years}
+        heads = []
+        for future in as_completed(futures):
+            year = futures[future]
+            try:
+                links = future.result()
+            except (OSError, http.client.HTTPException) as err:
+                print('Listing of %d is failed: %s' % (year, err))
+                continue
+            if links is not None:
+                modified.add(year)
+                heads.extend([(year, fname, info) for fname, info in links.items()])
+        # Size and validators of the new or changed files of modified listings
+        futures = {executor.submit(HeadFromURL, url + '%d/%s' % (year, fname)): (year, fname, info)
+                   for year, fname, info in heads}
+        for future in as_completed(futures):
+            year, fname, info = futures[future]
+            try:
+                size, mtime, ftag = future.result()
+            except (OSError, http.client.HTTPException) as err:
+                print('HEAD of %s is failed: %s' % (fname, err))
+                continue
+            manifests[year][1]['files'][fname].update({'size': size, 'last_modified': mtime,
+                                                       'etag': ftag, 'listing': info})
+    # Delta to be downloaded
+    fullURL, fullDIR, sizes = [], [], []
+    entries = {}
+    nTotal = 0
+    for year in years:
+        files = manifests[year][1]['files']
+        nTotal += len(files)
+        for fname in sorted(files):
+            file_dir = os.path.join(path, fname)
+            entry = files[fname]
+            if (ingest is not None) and (fname in ingest.ingested):
+                continue
+            if os.path.exists(file_dir):
+                if ingest is not None:
+                    # Downloaded file which was not accumulated
+                    ingest.add(file_dir)
+                    continue
+                if entry.get('synced') is None:
+                    # Local copy without a validator is compared by size
+                    if (entry['size'] is None) or (os.path.getsize(file_dir) == entry['size']):
+                        entry['synced'] = _Validator(entry)
+                        modified.add(year)
+                        continue
+                elif entry['synced'] == _Validator(entry):
+                    continue
+                # Remote file has been modified
+                os.remove(file_dir)
+            fullURL.append(url + '%d/%s' % (year, fname))
+            fullDIR.append(file_dir)
+            sizes.append(entry['size'])
+            entries[file_dir] = (year, entry)
+
+    def callback(file_dir):
+        # Validator of the downloaded copy
+        year, entry = entries[file_dir]
+        entry['synced'] = _Validator(entry)
+        modified.add(year)
+        if ingest is not None:
+            ingest.add(file_dir)
+
+    nExist, nDown, nError = DownloadFromURL(fullURL, fullDIR, False, nworkers=nworkers, sizes=sizes,
+                                            callback=callback)
+    for year in sorted(modified):
+        SaveManifest(*manifests[year])
+    if showLog:
+        print('%s: %d files in %d years, %d downloads, %d errors' % (name, nTotal, len(years), nDown, nError))
+    return nTotal - nDown - nError, nDown, nError
+
+
+def main(argv=None, source='noaa'):
+    parser = argparse.ArgumentParser(description='Synchronizes AVHRR NDVI archives.')
+    parser.add_argument('--source', default=source, choices=sorted(SOURCES.keys()))
+    parser.add_argument('--years', type=int, nargs='+', default=None,
+                        help='years to be synchronized (default is 1981 to the current year)')
+    parser.add_argument('--path', default=None, help='local directory of the archive')
+    parser.add_argument('--nworkers', type=int, default=8, help='number of concurrent requests')
+    parser.add_argument('--ingest', default=None,
+                        help='directory of monthly composites (streaming ingest without raw files)')
+    parser.add_argument('--extent', type=float, nargs=4, default=None,
+                        help='[minx,maxx,miny,maxy] of the composites')
+    args = parser.parse_args(argv)
+    ingest = None
+    if args.ingest is not None:
+        from ndvi_ingest import MonthlyComposite
+        if args.extent is None:
+            parser.error('--extent is required with --ingest')
+        ingest = MonthlyComposite(args.ingest, args.extent)
+    SyncProduct(args.source, args.years, args.path, args.nworkers, ingest)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,233 @@
+"""
+This script presents a streaming ingest of daily global EO files (e.g., AVHRR
+NDVI) into monthly composites of a sub-extent.
+
+Each downloaded file is cropped to the extent, accumulated into the running
+sum, maximum, and valid count of its month, and can be removed right away.
+The running composites are saved per month (.npz) after each file, so that an
+interrupted ingest is continued without double counting of files. Only the
+composite of the month being ingested is kept in memory.
+
+File name: ndvi_ingest.py
+Date revised: 10/18/2026
+"""
+__version__ = "1.0"
+__author__ = "Donghoon Lee"
+__maintainer__ = "Donghoon Lee"
+__email__ = "dlee@geog.ucsb.edu"
+
+
+import os
+import re
+import numpy as np
+import pandas as pd
+
+
+def DateFromFilename(filn):
+    '''Returns the date (Timestamp) in the filename of a daily file
+    (e.g., AVHRR-Land_v005_AVH13C1_NOAA-07_19810624_c20170610041337.nc)
+    '''
+    match = re.search(r'_((?:19|20)\d{6})_', os.path.basename(filn))
+    if match is None:
+        raise ValueError('Date is not found in %s' % filn)
+    return pd.to_datetime(match.group(1), format='%Y%m%d')
+
+
+def CropWindow(lat, lon, extent):
+    '''Returns row and column slices of the grid cells within the extent
+
+    Parameters
+    ----------
+    lat: ndarray
+        latitudes of the cell centers (ascending or descending)
+    lon: ndarray
+        longitudes of the cell centers
+    extent: list
+        [minx,maxx,miny,maxy] of the target area
+
+    Returns
+    -------
+    row, col: slice
+        slices of the grid cells whose centers are within the extent
+    '''
+    rows = np.where((lat >= extent[2]) & (lat <= extent[3]))[0]
+    cols = np.where((lon >= extent[0]) & (lon <= extent[1]))[0]
+    if (len(rows) == 0) or (len(cols) == 0):
+        raise ValueError('Extent does not overlap the grid')
+    return slice(rows[0], rows[-1]+1), slice(cols[0], cols[-1]+1)
+
+
+class MonthlyComposite:
+    '''
+    Running monthly composites (mean and maximum with valid count) of daily
+    files in a sub-extent.
+
+    Parameters
+    ----------
+    path: str
+        directory of the monthly composites
+    extent: list
+        [minx,maxx,miny,maxy] of the target area
+    varname: str
+        name of the variable (default is 'NDVI')
+    name: str
+        prefix of the composite files (default is 'ndvi')
+    latname: str
+        name of the latitude variable
+    lonname: str
+        name of the longitude variable
+    '''
+
+    def __init__(self, path, extent, varname='NDVI', name='ndvi', latname='latitude',
+                 lonname='longitude'):
+        self.path = path
+        self.extent = extent
+        self.varname = varname
+        self.name = name
+        self.latname = latname
+        self.lonname = lonname
+        self.months = dict()                        # Composite of the month being ingested
+        self.ingested = set()
+        os.makedirs(path, exist_ok=True)
+        # Files already accumulated in the saved composites (only the file lists are read)
+        for filn in sorted(os.listdir(path)):
+            match = re.match(r'%s_(\d{6})\.npz$' % re.escape(name), filn)
+            if match is not None:
+                with np.load(os.path.join(path, filn), allow_pickle=False) as f:
+                    self.ingested.update(f['files'].tolist())
+
+    def _Filename(self, month):
+        return os.path.join(self.path, '%s_%04d%02d.npz' % (self.name, month.year, month.month))
+
+    def _Load(self, month, keep=True):
+        '''Returns the composite of a month (None if it does not exist)
+
+        If keep is True, the composite replaces the one kept in memory.
+        '''
+        if month in self.months:
+            return self.months[month]
+        filn = self._Filename(month)
+        state = None
+        if os.path.exists(filn):
+            with np.load(filn, allow_pickle=False) as f:
+                state = {key: f[key] for key in f.files}
+            state['files'] = list(state['files'])
+        if keep:
+            self.months = {month: state}
+        return state
+
+    def _Save(self, month):
+        state = self.months[month]
+        filn = self._Filename(month)
+        with open(filn + '.part', 'wb') as f:
+            np.savez(f, sum=state['sum'], max=state['max'], count=state['count'],
+                     lat=state['lat'], lon=state['lon'], files=np.array(state['files'], dtype=str))
+        os.replace(filn + '.part', filn)
+
+    def add(self, filn, remove=True):
+        '''Accumulates a daily file into the composite of its month
+
+        Parameters
+        ----------
+        filn: str
+            filename of the daily NetCDF file
+        remove: bool
+            True to remove the file after it is accumulated
+
+        Returns
+        -------
+        month: Period
+            month of the file (None if the file was already accumulated)
+        '''
+        from netCDF4 import Dataset
+        base = os.path.basename(filn)
+        if base in self.ingested:
+            if remove:
+                os.remove(filn)
+            return None
+        month = DateFromFilename(filn).to_period('M')
+        with Dataset(filn, 'r') as nc:
+            lat = np.array(nc.variables[self.latname][:])
+            lon = np.array(nc.variables[self.lonname][:])
+            row, col = CropWindow(lat, lon, self.extent)
+            var = nc.variables[self.varname]
+            # Values are scaled and masked by netCDF4
+            if var.ndim == 3:
+                data = var[0, row, col]
+            else:
+                data = var[row, col]
+            data = np.ma.filled(data.astype(float), np.nan)
+        valid = ~np.isnan(data)
+        state = self._Load(month)
+        if state is None:
+            state = {'sum': np.zeros(data.shape), 'max': np.full(data.shape, -np.inf),
+                     'count': np.zeros(data.shape, dtype=np.int32),
+                     'lat': lat[row], 'lon': lon[col], 'files': []}
+            self.months[month] = state
+        if state['sum'].shape != data.shape:
+            raise ValueError('Grid of %s is different from the composite' % filn)
+        state['sum'] += np.where(valid, data, 0)
+        state['max'] = np.fmax(state['max'], data)
+        state['count'] += valid
+        state['files'].append(base)
+        self._Save(month)
+        self.ingested.add(base)
+        if remove:
+            os.remove(filn)
+        return month
+
+    def composite(self, month, stat='mean', min_count=1):
+        '''Returns the composite of a month
+
+        Parameters
+        ----------
+        month: Period or str
+            month of the composite (e.g., '2020-01')
+        stat: str
+            'mean', 'max', or 'count'
+        min_count: int
+            minimum number of valid days (cells with less days are NaN)
+
+        Returns
+        -------
+        data: ndarray
+            ny x nx composite
+        '''
+        state = self._Load(pd.Period(month, freq='M'), keep=False)
+        if state is None:
+            raise KeyError('Composite of %s does not exist' % month)
+        count = state['count']
+        if stat == 'count':
+            return count.copy()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if stat == 'mean':
+                data = state['sum']/count
+            elif stat == 'max':
+                data = state['max'].copy()
+            else:
+                raise ValueError('stat should be "mean", "max", or "count"')
+        data[count < max(min_count, 1)] = np.nan
+        return data
+
+    def stack(self, stat='mean', min_count=1):
+        '''Returns the composites of all months
+
+        Returns
+        -------
+        tim: PeriodIndex
+            months of the composites
+        lat, lon: ndarray
+            latitudes and longitudes of the sub-extent
+        data: ndarray
+            t x ny x nx composites
+        '''
+        months = []
+        for filn in sorted(os.listdir(self.path)):
+            match = re.match(r'%s_(\d{6})\.npz$' % re.escape(self.name), filn)
+            if match is not None:
+                months.append(pd.Period(match.group(1), freq='M'))
+        if len(months) == 0:
+            raise KeyError('No composite exists in %s' % self.path)
+        data = np.stack([self.composite(month, stat, min_count) for month in months])
+        state = self._Load(months[0], keep=False)
+        return pd.PeriodIndex(months, freq='M'), state['lat'], state['lon'], data
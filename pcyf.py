@@ -23,6 +23,8 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 from sklearn.metrics import mean_squared_error
 import metrics as mt
+from detrend import DetrendSeries
+from instrument import GetRecorder
 
 
 class PCYF:
@@ -31,8 +33,10 @@ class PCYF:
     Description will be updated.
     '''
     
-    def __init__(self, dfCrop, dfPred, targmon, leadmat, pid=None):
+    def __init__(self, dfCrop, dfPred, targmon, leadmat, pid=None, incremental=False,
+                 instrument=False, store=None):
         # Model parameters
+        rec = GetRecorder(instrument, 'PCYF %s' % pid)
         monmat = self._LeadToMonth(targmon, leadmat)
         dfCrop = dfCrop[dfCrop.index[dfCrop.index.month == targmon]]
         dfCrop = dfCrop.drop(dfCrop[dfCrop.isnull()].index,axis=0)          # Drop missing years
@@ -43,12 +47,16 @@ class PCYF:
             obox['status'] = 110                        # STATUS_CODE
             obox['status_msg'] = 'The number of records is less than 15.'
             self.outbox = obox
+            if store is not None:
+                store.write(pid, obox)
             return
         # STATUS_CODE 120: Monotonic values (possible missing records)
-        if dfCrop.is_monotonic:
+        if dfCrop.is_monotonic_increasing:
             obox['status'] = 120                        # STATUS_CODE
             obox['status_msg'] = 'The records are monotonic.'
             self.outbox = obox
+            if store is not None:
+                store.write(pid, obox)
             return
 
             
@@ -64,88 +72,120 @@ class PCYF:
             # Initialize the monthly box
             mbox = {'lead':lead[i], 'month':monmat[i]}
             result = np.zeros([nt, 1])
-            for j in range(nt):
-                yTran = pd.concat([yTRAN,yTEST.iloc[:j]])
-                yTest = yTEST.iloc[j:j+1]
-                tdx = pd.concat([yTran,yTest]).index
-
-                # Correlations with EO data at all possible lead-time combinations
-                prcp, prcp_monmat = self._AllCombLeadMonth(dfPred['prcp'], tdx, lead)
-                prcp_corr, prcp_sign = self._Corr2D1D(prcp[:-1,:], yTran)
-                smos, smos_monmat = self._AllCombLeadMonth(dfPred['smos'], tdx, lead)
-                smos_corr, smos_sign = self._Corr2D1D(smos[:-1,:], yTran)
-                etos, etos_monmat = self._AllCombLeadMonth(dfPred['etos'], tdx, lead)
-                etos_corr, etos_sign = self._Corr2D1D(etos[:-1,:], yTran)
+            # Lagged sums of EO data at all possible lead-time combinations
+            # *Computed once for all years; each fold slices the leading rows
+            with rec.stage('lag_sums'):
+                prcp_all, prcp_monmat = self._AllCombLeadMonth(dfPred['prcp'], dfCrop.index, lead)
+                smos_all, smos_monmat = self._AllCombLeadMonth(dfPred['smos'], dfCrop.index, lead)
+                etos_all, etos_monmat = self._AllCombLeadMonth(dfPred['etos'], dfCrop.index, lead)
+            if incremental:
+                # Closed-form walk-forward regression with running statistics
+                with rec.stage('regression'):
+                    xall = np.hstack((prcp_all, smos_all, etos_all))
+                    result, coef = self._WalkForwardOLS(xall, dfCrop.values, len(yTRAN), prcp_all.shape[1])
+                rec.count('folds', nt)
+                rec.count('fits', nt)
+                rec.count('combinations', nt*xall.shape[1])
+                obs[:,i] = yTEST.values
+                sim[:,i] = result[:,0]
+                mbox.update({'coef': coef})
+            else:
+                for j in range(nt):
+                    yTran = pd.concat([yTRAN,yTEST.iloc[:j]])
+                    yTest = yTEST.iloc[j:j+1]
+                    tdx = pd.concat([yTran,yTest]).index
+                    nfold = len(tdx)
+                    rec.count('folds')
+
+                    # Correlations with EO data at all possible lead-time combinations
+                    with rec.stage('correlation'):
+                        prcp = prcp_all[:nfold]
+                        prcp_corr, prcp_sign = self._Corr2D1D(prcp[:-1,:], yTran)
+                        smos = smos_all[:nfold]
+                        smos_corr, smos_sign = self._Corr2D1D(smos[:-1,:], yTran)
+                        etos = etos_all[:nfold]
+                        etos_corr, etos_sign = self._Corr2D1D(etos[:-1,:], yTran)
+                    rec.count('combinations', prcp.shape[1] + smos.shape[1] + etos.shape[1])
+
+                    # Select the best combination of leadtimes (SHOULD BE UPDATED)
+                    strPred = ['prcp','smos','etos']
+                    iprcp = prcp_corr.argmax()
+                    ismos = smos_corr.argmax()
+                    ietos = smos_corr.argmin()
+                    pred = np.vstack((prcp[:,iprcp], smos[:,ismos], etos[:,ietos])).T
+                    pred_monmat = [prcp_monmat[iprcp], smos_monmat[ismos], etos_monmat[ietos]]
+                    xTran = pd.DataFrame(index = tdx.year, data=pred, columns = strPred)
+                    xTest = xTran.iloc[-1]
+                    xTran = xTran.iloc[:-1]
+
+                    # Nomalize before prediction
+                    with rec.stage('scaling'):
+                        scale_x = StandardScaler().fit(xTran)
+                        scale_x.scale_ = np.std(xTran.values, axis=0, ddof=1) # Sample STDEV
+                        xTran = scale_x.transform(xTran)
+                        xTest = scale_x.transform(xTest.values[:,None].T)
+                        scale_y = StandardScaler().fit(yTran.values[:,None])
+                        scale_y.scale_ = np.std(yTran, axis=0, ddof=1)        # Sample STDEV
+                        yTran = scale_y.transform(yTran.values[:,None])
+                        yTest = scale_y.transform(yTest.values[:,None])
+
+                    # Multiple Linear Regression (MLR)
+                    with rec.stage('regression'):
+                        regr = LinearRegression()
+                        regr.fit(xTran, yTran)
+                        yTranHat = regr.predict(xTran)
+                        yTestHat = regr.predict(xTest)
+                    rec.count('fits')
+
+                    # Re-scaling
+                    with rec.stage('scaling'):
+                        xTran = scale_x.inverse_transform(xTran)
+                        xTest = scale_x.inverse_transform(xTest)
+                        yTran = scale_y.inverse_transform(yTran)
+                        yTest = scale_y.inverse_transform(yTest)
+                        yTranHat = scale_y.inverse_transform(yTranHat)
+                        yTestHat = scale_y.inverse_transform(yTestHat)
+
+                    # Save results
+                    obs[j,i] = yTest.item()
+                    sim[j,i] = yTestHat.item()
+                    result[j] = yTestHat.item()
 
-                # Select the best combination of leadtimes (SHOULD BE UPDATED)
-                strPred = ['prcp','smos','etos']
-                iprcp = prcp_corr.argmax()
-                ismos = smos_corr.argmax()
-                ietos = smos_corr.argmin()
-                pred = np.vstack((prcp[:,iprcp], smos[:,ismos], etos[:,ietos])).T
-                pred_monmat = [prcp_monmat[iprcp], smos_monmat[ismos], etos_monmat[ietos]]
-                xTran = pd.DataFrame(index = tdx.year, data=pred, columns = strPred)
-                xTest = xTran.iloc[-1]
-                xTran = xTran.iloc[:-1]
-
-                # Nomalize before prediction
-                scale_x = StandardScaler().fit(xTran)
-                scale_x.scale_ = np.std(xTran, axis=0, ddof=1)        # Sample STDEV
-                xTran = scale_x.transform(xTran)
-                xTest = scale_x.transform(xTest.values[:,None].T)
-                scale_y = StandardScaler().fit(yTran.values[:,None])
-                scale_y.scale_ = np.std(yTran, axis=0, ddof=1)        # Sample STDEV
-                yTran = scale_y.transform(yTran.values[:,None])
-                yTest = scale_y.transform(yTest.values[:,None])
-
-                # Multiple Linear Regression (MLR)
-                regr = LinearRegression()
-                regr.fit(xTran, yTran)
-                yTranHat = regr.predict(xTran)
-                yTestHat = regr.predict(xTest)
-
-                # Re-scaling
-                xTran = scale_x.inverse_transform(xTran)
-                xTest = scale_x.inverse_transform(xTest)
-                yTran = scale_y.inverse_transform(yTran)
-                yTest = scale_y.inverse_transform(yTest)
-                yTranHat = scale_y.inverse_transform(yTranHat)
-                yTestHat = scale_y.inverse_transform(yTestHat)
-
-                # Save results
-                obs[j,i] = yTest
-                sim[j,i] = yTestHat
-                result[j] = yTestHat
-                
 
 
             # Evaluating statiscis: gss, msess
-            table = mt.makeMultiContTable(yTEST.values[:,None].T, result.T, clm=yTRAN, thrsd=[1/3, 2/3])
-            mct = mt.MulticlassContingencyTable(table, n_classes=3)
-            gss = mct.gerrity_skill_score()
-            msess = mt.msess(yTEST, result, yTRAN)
+            with rec.stage('scoring'):
+                table = mt.makeMultiContTable(yTEST.values[:,None].T, result.T, clm=yTRAN, thrsd=[1/3, 2/3])
+                mct = mt.MulticlassContingencyTable(table, n_classes=3)
+                gss = mct.gerrity_skill_score()
+                msess = mt.msess(yTEST, result, yTRAN)
 
             # Update monthly box
-            mbox.update({'regr': regr,
-                         'yTran': yTRAN,
+            if not incremental:
+                mbox.update({'regr': regr})
+            mbox.update({'yTran': yTRAN,
                          'yTest': yTEST, 'yTestHat': result,
                          'gss':gss, 'msess':msess
                         })
 
-            # Save lead box
-            obox.update({'m%02d'%(lead[i]): mbox})
+            # Save lead box (written to the store without accumulating the outbox)
+            if store is not None:
+                store.write_month(pid, lead[i], mbox, obox['status'])
+            else:
+                obox.update({'m%02d'%(lead[i]): mbox})
 #             print('%s - m%02d is processed.' % (pid, lead[i]))
 
-    
+        if rec.enabled:
+            obox['profile'] = rec.summary()
         self.outbox = obox
             
             
             
     
-    def _Detrend(self, ssr):
+    def _Detrend(self, sr):
         '''detrends 1D Series
 
-        *this function deals with missing values.
+        *this function deals with missing values (see detrend.py).
 
         Parameters
         ----------
@@ -158,19 +198,7 @@ class PCYF:
             detrended values of the time-series
 
         '''
-        nni = ~sr.isnull()
-        if False:
-            # Considering NaN values
-            x = np.array((sr.index - sr.index[0])/12 + 1, dtype='int')
-            m, b, r_val, p_val, std_err = stats.linregress(x[nni], sr[nni])
-            sr_detrend = sr - (m*x +b)
-        else:
-            # Ignoring NaN values
-            from scipy import signal
-            sr_detrend = sr.copy()
-            sr_detrend[nni] = pd.Series(signal.detrend(sr[nni]), index = sr[nni].index)
-
-        return sr_detrend
+        return DetrendSeries(sr)
 
 
     def _ReduceMonth(self, sr, i):
@@ -205,16 +233,47 @@ class PCYF:
 
 
     def _AllCombLeadMonth(self, sr, time, leadmat):
+        '''Returns summations of monthly data at all combinations of lead months
+
+        Monthly records are placed on an integer month axis once, so that the
+        lagged values of all lead months are gathered with integer offsets
+        instead of label lookups per combination.
+
+        Parameters
+        ----------
+        sr: Series (PeriodIndex or DateTimeIndex, value)
+            monthly records of a predictor
+        time: PeriodIndex or DateTimeIndex
+            n target times (e.g., harvest months of crop records)
+        leadmat: list
+            lead months
+
+        Returns
+        -------
+        data_sum: 2d ndarray
+            n x c array; summations of c combinations of lead months
+        combs: list
+            c combinations of months corresponding to the lead months
+        '''
         # All combinations of lead months
         combs = self._AllCombinations(leadmat)
 
+        # Monthly data on an integer month axis (missing months are NaN)
+        srmon = sr.index.year*12 + sr.index.month - 1
+        data = np.full(srmon.max() - srmon.min() + 1, np.nan)
+        data[srmon - srmon.min()] = sr.values
+        # Lagged data of all lead months (n x lead)
+        tmon = np.asarray(time.year*12 + time.month - 1) - srmon.min()
+        pos = tmon[:,None] - np.array(leadmat)[None,:]
+        valid = (pos >= 0) & (pos < len(data))
+        data_lag = np.full(pos.shape, np.nan)
+        data_lag[valid] = data[pos[valid]]
+
         # Ndarray of summation of data of all combinations of lead months
+        lidx = dict(zip(leadmat, range(len(leadmat))))
         data_sum = np.zeros([len(time), len(combs)])
         for i, comb in enumerate(combs):
-            data_com = np.zeros([len(time), len(comb)])
-            for j, m in enumerate(comb):
-                data_com[:,j] = sr[time - MonthEnd(m)].values
-            data_sum[:,i] = data_com.sum(1)
+            data_sum[:,i] = data_lag[:,[lidx[m] for m in comb]].sum(1)
 
         # Change leadmat to monthmat
         monmat = self._LeadToMonth(time.month.unique()[0], leadmat)
@@ -222,9 +281,556 @@ class PCYF:
 
         return data_sum, combs
 
+    def _WalkForwardOLS(self, xall, yall, ntr, ncomb):
+        '''Walk-forward Multiple Linear Regression with running statistics
+
+        Sums of cross-products of all candidate predictors (X'X, X'y) are
+        updated with a rank-one addition as each test year joins the training
+        set. The best combinations of lead months are selected from the
+        correlations derived from the same statistics, and the forecast is
+        obtained from a 3x3 solve of the centered normal equations. This is
+        identical to standardizing with sample STDEV, fitting LinearRegression,
+        and re-scaling, as the least-squares forecast is invariant to scaling.
+
+        Parameters
+        ----------
+        xall: 2d ndarray
+            n x 3c array; lagged sums of c combinations of prcp, smos, and etos
+        yall: 1d ndarray
+            n records of crop data
+        ntr: int
+            number of records in the initial training period
+        ncomb: int
+            number of combinations of lead months (c)
+
+        Returns
+        -------
+        result: 2d ndarray
+            (n-ntr) x 1 array; forecasts in the testing period
+        coef: 2d ndarray
+            1 x 3 array; standardized regression coefficients of the last fold
+        '''
+        xall = np.asarray(xall, dtype=float)
+        yall = np.asarray(yall, dtype=float)
+        nt = len(yall) - ntr
+        # Shift by the initial training means to avoid cancellation errors
+        xref = xall[:ntr].mean(0)
+        yref = yall[:ntr].mean()
+        xs = xall - xref
+        ys = yall - yref
+        # Running statistics of the initial training period
+        n = ntr
+        sx = xs[:ntr].sum(0)
+        sy = ys[:ntr].sum()
+        sxx = xs[:ntr].T.dot(xs[:ntr])
+        sxy = xs[:ntr].T.dot(ys[:ntr])
+        syy = ys[:ntr].dot(ys[:ntr])
+
+        result = np.zeros([nt, 1])
+        coef = np.full([1, 3], np.nan)
+        for j in range(nt):
+            isel, mxs, my, beta, coef[0] = self._SolveOLS(n, sx, sy, sxx, sxy, syy, ncomb)
+            xTest = xs[ntr+j]
+            result[j] = yref + my + (xTest[isel] - mxs).dot(beta)
+            # Rank-one update with the test year
+            yTest = ys[ntr+j]
+            n += 1
+            sx += xTest
+            sy += yTest
+            sxx += np.outer(xTest, xTest)
+            sxy += xTest*yTest
+            syy += yTest**2
+
+        return result, coef
+
+    def _SolveOLS(self, n, sx, sy, sxx, sxy, syy, ncomb):
+        '''Selects the best combinations of lead months and solves the MLR from running statistics
+
+        Returns
+        -------
+        isel: 1d ndarray
+            indices of the selected columns (prcp, smos, and etos)
+        mxs: 1d ndarray
+            means of the selected columns
+        my: float
+            mean of the crop records
+        beta: 1d ndarray
+            regression coefficients
+        coef: 1d ndarray
+            standardized regression coefficients
+        '''
+        # Centered (co)variances of the current training period
+        mx = sx/n
+        my = sy/n
+        cxy = sxy - n*mx*my
+        cxx = np.diag(sxx) - n*mx**2
+        cyy = syy - n*my**2
+        # Correlations with EO data at all possible lead-time combinations
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = cxy/np.sqrt(cxx*cyy)
+        prcp_corr = corr[:ncomb]
+        smos_corr = corr[ncomb:2*ncomb]
+        # Select the best combination of leadtimes (SHOULD BE UPDATED)
+        isel = np.array([prcp_corr.argmax(), ncomb + smos_corr.argmax(), 2*ncomb + smos_corr.argmin()])
+        # Multiple Linear Regression (MLR) from the normal equations
+        mxs = mx[isel]
+        cxxs = sxx[np.ix_(isel, isel)] - n*np.outer(mxs, mxs)
+        beta = np.linalg.solve(cxxs, cxy[isel])
+        coef = beta*np.sqrt(np.diag(cxxs)/cyy)
+        return isel, mxs, my, beta, coef
+
     def _Corr2D1D(self, arr2d, arr1d):
-        corr = np.zeros(arr2d.shape[1])
-        sign = corr.copy()
-        for i in range(arr2d.shape[1]):
-            corr[i], sign[i] = stats.pearsonr(arr2d[:,i], arr1d)
-        return corr, sign
\ No newline at end of file
+        '''Returns Pearson's correlations between every column of 2D array and 1D array
+
+        All columns are correlated in a single pass (z-scored matrix-vector
+        product) and two-sided p-values are derived from the t-distribution,
+        which is equivalent to calling scipy.stats.pearsonr per column.
+
+        Parameters
+        ----------
+        arr2d: 2d ndarray
+            n x k array; n records of k variables (e.g., lead-month combinations)
+        arr1d: 1d ndarray or Series
+            n records of target variable
+
+        Returns
+        -------
+        corr: 1d ndarray
+            k Pearson's correlation coefficients
+        sign: 1d ndarray
+            k two-sided p-values
+        '''
+        arr2d = np.asarray(arr2d, dtype=float)
+        arr1d = np.asarray(arr1d, dtype=float).ravel()
+        n = len(arr1d)
+        # Z-scores (constant columns return NaN as scipy.stats.pearsonr)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            xm = arr2d - arr2d.mean(0)
+            ym = arr1d - arr1d.mean()
+            xz = xm/np.sqrt((xm**2).sum(0))
+            yz = ym/np.sqrt((ym**2).sum())
+            # Correlation
+            corr = np.clip(yz.dot(xz), -1, 1)
+            # Two-sided T-test
+            tstat = corr*np.sqrt((n-2)/(1-corr**2))
+        sign = 2*stats.t.sf(np.abs(tstat), n-2)
+        return corr, sign
+
+
+class PCYFBatch(PCYF):
+    '''
+    Runs the PCYF model for all districts at once.
+
+    The yield panel and the predictor cube are stacked into arrays and the
+    walk-forward regression of every district is solved with array operations
+    broadcast across districts (masked sums of cross-products and batched 3x3
+    solves), which gives the same forecasts as running PCYF per district.
+
+    Parameters
+    ----------
+    dfCrop: DataFrame (PeriodIndex or DateTimeIndex, districts)
+        n x d array; crop records (e.g., yield) of d districts
+    dfPred: dict of DataFrames or DataFrame with MultiIndex columns
+        m x d arrays of monthly 'prcp', 'smos', and 'etos' keyed by variable,
+        or m x (d x k) DataFrame with (district, variable) columns
+    targmon: int
+        target month of crop records
+    leadmat: list
+        lead months (e.g., [4,3,2,1])
+    prct_test: float
+        proportion of records in the testing period (default is 0.3)
+    instrument: bool or str
+        True to record per-stage wall time and counters in outbox['profile'],
+        'memory' to trace allocations as well (default is False)
+
+    Attributes
+    ----------
+    outbox: Dictionary of 'status', 'yTestHat' (years x districts x leads),
+        'msess', and 'gss' (districts x leads)
+    msess: DataFrame of MSESS (districts x leads)
+    gss: DataFrame of GSS (districts x leads)
+    '''
+
+    def __init__(self, dfCrop, dfPred, targmon, leadmat, prct_test=0.3, instrument=False):
+        # Model parameters
+        rec = GetRecorder(instrument, 'PCYFBatch')
+        strPred = ['prcp','smos','etos']
+        dist = dfCrop.columns
+        monmat = self._LeadToMonth(targmon, leadmat)
+        dfCrop = dfCrop[dfCrop.index.month == targmon]
+        dfCrop = dfCrop[dfCrop.notna().any(axis=1)]
+        time = dfCrop.index
+        yall = dfCrop.values.astype(float)
+        nyear, ndist = yall.shape
+
+        # Stacked predictor cube (months x districts x variables)
+        if isinstance(dfPred, dict):
+            dfPred = pd.concat([dfPred[v].reindex(columns=dist) for v in strPred], axis=1, keys=strPred)
+            dfPred = dfPred.swaplevel(axis=1)
+        cube = np.stack([dfPred.xs(v, axis=1, level=1).reindex(columns=dist).values
+                         for v in strPred], axis=2).astype(float)
+
+        # Valid records and training/testing periods per district
+        valid = ~np.isnan(yall)
+        nrec = valid.sum(0)
+        ntest = np.ceil(nrec*prct_test).astype(int)
+        ntran = nrec - ntest
+        rank = np.cumsum(valid, axis=0) - 1
+        status = np.zeros(ndist, dtype=int)
+        # STATUS_CODE 110: The number of years less than 15
+        status[nrec < 15] = 110
+        # STATUS_CODE 120: Monotonic values (possible missing records)
+        mono = np.array([np.all(np.diff(yall[valid[:,k],k]) >= 0) for k in range(ndist)])
+        status[(status == 0) & mono] = 120
+        alive = status == 0
+        yzero = np.where(valid, yall, 0)
+
+        # Prediction algorithms
+        yTestHat = np.full([nyear, ndist, len(leadmat)], np.nan)
+        msess = np.full([ndist, len(leadmat)], np.nan)
+        gss = msess.copy()
+        tcache = mt.ThresholdCache()                # Terciles of training periods
+        for i in range(len(leadmat)):
+            lead = leadmat[:i+1]
+            # Lagged sums of EO data at all possible lead-time combinations
+            with rec.stage('lag_sums'):
+                xall, ncomb = self._AllCombLeadMonthCube(cube, dfPred.index, time, lead)
+                xall = np.where(valid[:,:,None], xall, 0)
+
+            for j in range(ntest.max()):
+                # Training and testing years of the current fold
+                active = alive & (j < ntest)
+                wtran = valid & (rank < ntran + j) & active
+                itest = np.argmax(valid & (rank == ntran + j), axis=0)
+                n = np.maximum(wtran.sum(0), 1)
+                rec.count('folds')
+                rec.count('fits', active.sum())
+                rec.count('combinations', active.sum()*xall.shape[2])
+
+                # Correlations with EO data at all possible lead-time combinations
+                with rec.stage('correlation'):
+                    mx = np.einsum('nd,ndk->dk', wtran, xall)/n[:,None]
+                    my = (wtran*yzero).sum(0)/n
+                    xc = (xall - mx)*wtran[:,:,None]
+                    yc = (yzero - my)*wtran
+                    cxy = np.einsum('ndk,nd->dk', xc, yc)
+                    cxx = np.einsum('ndk,ndk->dk', xc, xc)
+                    cyy = (yc**2).sum(0)
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        corr = cxy/np.sqrt(cxx*cyy[:,None])
+                    corr[~active] = 0
+
+                # Select the best combination of leadtimes (SHOULD BE UPDATED)
+                with rec.stage('regression'):
+                    ismos = np.argmax(corr[:,ncomb:2*ncomb], axis=1)
+                    isel = np.vstack((np.argmax(corr[:,:ncomb], axis=1), ncomb + ismos,
+                                      2*ncomb + np.argmin(corr[:,ncomb:2*ncomb], axis=1))).T
+
+                    # Multiple Linear Regression (MLR) from the normal equations
+                    xcs = np.take_along_axis(xc, isel[None,:,:], axis=2)
+                    cxxs = np.einsum('ndk,ndl->dkl', xcs, xcs)
+                    cxxs[~active] = np.eye(3)
+                    beta = np.linalg.solve(cxxs, np.take_along_axis(cxy, isel, axis=1)[:,:,None])[:,:,0]
+                    xTest = np.take_along_axis(xall[itest, np.arange(ndist)], isel, axis=1)
+                    mxs = np.take_along_axis(mx, isel, axis=1)
+                    yhat = my + ((xTest - mxs)*beta).sum(1)
+                    yTestHat[itest[active], np.arange(ndist)[active], i] = yhat[active]
+
+            # Evaluating statiscis: gss, msess (all districts at once)
+            with rec.stage('scoring'):
+                mtran = (valid & (rank < ntran) & alive).T
+                mtest = (valid & (rank >= ntran) & alive).T
+                yTran = np.where(mtran, yall.T, np.nan)
+                yTest = np.where(mtest, yall.T, np.nan)
+                result = np.where(mtest, yTestHat[:,:,i].T, np.nan)
+                # Training records are the same at all leads (no fingerprint of yTran)
+                table = mt.makeMultiContTableBatch(yTest, result, clm=yTran, thrsd=[1/3, 2/3],
+                                                   cache=tcache, period=tuple(ntran), key='yTran')
+                mct = mt.MulticlassContingencyTableBatch(table, n_classes=3)
+                gss[alive,i] = mct.gerrity_skill_score()[alive]
+                ntest_d = np.maximum(mtest.sum(1), 1)
+                yClim = np.where(mtran, yall.T, 0).sum(1)/np.maximum(mtran.sum(1), 1)
+                mse_pred = np.where(mtest, (yTest - result)**2, 0).sum(1)/ntest_d
+                mse_clim = np.where(mtest, (yTest - yClim[:,None])**2, 0).sum(1)/ntest_d
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    msess[alive,i] = ((1 - mse_pred/mse_clim)*100)[alive]
+
+        # Skill scores
+        self.msess = pd.DataFrame(index=dist, data=msess, columns=['mse%02d' % m for m in leadmat])
+        self.gss = pd.DataFrame(index=dist, data=gss, columns=['gss%02d' % m for m in leadmat])
+        self.outbox = {'status': pd.Series(index=dist, data=status), 'time': time,
+                       'lead': list(leadmat), 'month': monmat, 'yTestHat': yTestHat,
+                       'msess': self.msess, 'gss': self.gss}
+        if rec.enabled:
+            self.outbox['profile'] = rec.summary()
+
+
+    def _AllCombLeadMonthCube(self, cube, index, time, leadmat):
+        '''Returns summations of the predictor cube at all combinations of lead months
+
+        Parameters
+        ----------
+        cube: 3d ndarray
+            m x d x k array; monthly records of k predictors of d districts
+        index: PeriodIndex or DateTimeIndex
+            m months of the predictor cube
+        time: PeriodIndex or DateTimeIndex
+            n target times
+        leadmat: list
+            lead months
+
+        Returns
+        -------
+        data_sum: 3d ndarray
+            n x d x (k*c) array; summations of c combinations of each predictor
+        ncomb: int
+            number of combinations of lead months (c)
+        '''
+        combs = self._AllCombinations(leadmat)
+
+        # Monthly data on an integer month axis (missing months are NaN)
+        imon = index.year*12 + index.month - 1
+        data = np.full((imon.max() - imon.min() + 1,) + cube.shape[1:], np.nan)
+        data[imon - imon.min()] = cube
+        # Lagged data of all lead months (n x lead x d x k)
+        tmon = np.asarray(time.year*12 + time.month - 1) - imon.min()
+        pos = tmon[:,None] - np.array(leadmat)[None,:]
+        valid = (pos >= 0) & (pos < len(data))
+        data_lag = np.full(pos.shape + cube.shape[1:], np.nan)
+        data_lag[valid] = data[pos[valid]]
+
+        # Summation of data of all combinations of lead months
+        lidx = dict(zip(leadmat, range(len(leadmat))))
+        data_sum = np.stack([data_lag[:,[lidx[m] for m in comb]].sum(1) for comb in combs], axis=3)
+        data_sum = data_sum.reshape(data_sum.shape[:2] + (-1,))
+
+        return data_sum, len(combs)
+
+
+class PCYFNowcast(PCYF):
+    '''
+    Updates the current-season forecast of PCYF as each new month of EO data arrives.
+
+    The running statistics (sums and Gram matrices of all candidate predictors
+    and crop records) of all crop records are computed once per lead, and the
+    selected combinations of lead months and the regression coefficients are
+    derived from them. A new month of predictors then updates only the
+    forecasts of the leads whose months become available, without rerunning
+    the hindcast. When the crop record of the target is observed, add_record()
+    adds it to the running statistics and moves to the next season. The state
+    is exported with to_state() (JSON-serializable) and restored with
+    PCYFNowcast.from_state() in the next production cycle.
+
+    Parameters
+    ----------
+    dfCrop: Series (PeriodIndex or DateTimeIndex)
+        crop records of a district
+    dfPred: DataFrame (PeriodIndex or DateTimeIndex, variables)
+        monthly 'prcp', 'smos', and 'etos' of the district
+    targmon: int
+        target month of crop records
+    leadmat: list
+        lead months (e.g., [4,3,2,1])
+    pid: str
+        district ID
+
+    Attributes
+    ----------
+    fitted: dict
+        {lead: running statistics ('n', 'xref', 'yref', 'sx', 'sy', 'sxx',
+        'sxy', 'syy', 'ncomb', 'month', 'lead') and the fitted model ('combs'
+        (selected lead months of prcp, smos, and etos), 'isel', 'xmean',
+        'ymean', 'beta', 'coef')}
+    target: int
+        month number (year*12 + month - 1) of the current target
+    values: dict
+        {month number: {'prcp', 'smos', 'etos': value}} of the current season
+    forecast: dict
+        {'m%02d' % lead: {'lead', 'month', 'target', 'yHat'}} of the current season
+
+    Usage
+    -----
+    nc = PCYFNowcast(dfCrop, dfPred, targmon=2, leadmat=[4,3,2,1], pid='SO2001')
+    nc.update('2021-11', {'prcp': 52.1, 'smos': 0.21, 'etos': 143.0})
+    state = nc.to_state()
+    nc = PCYFNowcast.from_state(state)
+    nc.update('2021-12', {'prcp': 20.3, 'smos': 0.18, 'etos': 150.2})
+    nc.add_record(2.31)                         # Crop record of 2022-02
+    '''
+    # Running statistics of the state
+    _STATS = ['n', 'xref', 'yref', 'sx', 'sy', 'sxx', 'sxy', 'syy', 'ncomb', 'month', 'lead']
+
+    def __init__(self, dfCrop, dfPred, targmon, leadmat, pid=None):
+        self.pid = pid
+        self.targmon = int(targmon)
+        self.leadmat = [int(m) for m in leadmat]
+        self.status = 0
+        self.target = None
+        self.fitted = dict()
+        self.forecast = dict()
+        self.values = dict()                        # {month number: {variable: value}}
+        dfCrop = dfCrop[dfCrop.index[dfCrop.index.month == targmon]]
+        dfCrop = dfCrop.drop(dfCrop[dfCrop.isnull()].index,axis=0)          # Drop missing years
+        # STATUS_CODE 110 and 120 (see PCYF)
+        if len(dfCrop) < 15:
+            self.status = 110
+            return
+        if dfCrop.is_monotonic_increasing:
+            self.status = 120
+            return
+        # Next target after the last crop record
+        self.target = self._MonthNumber(dfCrop.index[-1]) + 12
+
+        # Running statistics of all crop records
+        monmat = self._LeadToMonth(targmon, self.leadmat)
+        yall = dfCrop.values.astype(float)
+        for i in range(len(self.leadmat)):
+            lead = self.leadmat[:i+1]
+            prcp_all, _ = self._AllCombLeadMonth(dfPred['prcp'], dfCrop.index, lead)
+            smos_all, _ = self._AllCombLeadMonth(dfPred['smos'], dfCrop.index, lead)
+            etos_all, _ = self._AllCombLeadMonth(dfPred['etos'], dfCrop.index, lead)
+            xall = np.hstack((prcp_all, smos_all, etos_all))
+            # Shift by the means to avoid cancellation errors (see _WalkForwardOLS)
+            xref, yref = xall.mean(0), yall.mean()
+            xs, ys = xall - xref, yall - yref
+            stats = {'n': len(ys), 'xref': xref, 'yref': yref, 'sx': xs.sum(0), 'sy': ys.sum(),
+                     'sxx': xs.T.dot(xs), 'sxy': xs.T.dot(ys), 'syy': ys.dot(ys),
+                     'ncomb': prcp_all.shape[1], 'month': int(monmat[i]), 'lead': lead}
+            self.fitted[lead[i]] = self._Fit(stats)
+
+    def _Fit(self, stats):
+        '''Returns the fitted model of a lead from its running statistics
+        '''
+        ncomb = stats['ncomb']
+        isel, mxs, my, beta, coef = self._SolveOLS(stats['n'], stats['sx'], stats['sy'], stats['sxx'],
+                                                   stats['sxy'], stats['syy'], ncomb)
+        combs = self._AllCombinations(list(stats['lead']))
+        fit = dict(stats)
+        fit.update({'combs': [combs[k % ncomb] for k in isel], 'isel': isel,
+                    'xmean': stats['xref'][isel] + mxs, 'ymean': stats['yref'] + my,
+                    'beta': beta, 'coef': coef})
+        return fit
+
+    def _MonthNumber(self, time):
+        time = pd.Period(time, freq='M')
+        return time.year*12 + time.month - 1
+
+    def _Period(self, mnum):
+        return pd.Period(year=mnum//12, month=mnum%12+1, freq='M')
+
+    def to_state(self):
+        '''Returns the state (running statistics, target, months of predictors,
+        and forecasts of the current season) as a JSON-serializable dict
+        '''
+        fitted = {str(lead): {key: np.asarray(fit[key]).tolist() for key in self._STATS}
+                  for lead, fit in self.fitted.items()}
+        forecast = {key: {'lead': int(fc['lead']), 'month': int(fc['month']),
+                          'target': str(fc['target']), 'yHat': float(fc['yHat'])}
+                    for key, fc in self.forecast.items()}
+        return {'version': 1, 'pid': self.pid, 'targmon': self.targmon, 'leadmat': self.leadmat,
+                'status': self.status, 'target': self.target, 'fitted': fitted,
+                'values': {str(m): v for m, v in self.values.items()}, 'forecast': forecast}
+
+    @classmethod
+    def from_state(cls, state):
+        '''Returns a nowcast restored from the state of to_state()
+        '''
+        self = cls.__new__(cls)
+        self.pid = state['pid']
+        self.targmon = state['targmon']
+        self.leadmat = list(state['leadmat'])
+        self.status = state['status']
+        self.target = state['target']
+        self.fitted = dict()
+        for lead, stats in state['fitted'].items():
+            stats = {key: np.asarray(value, dtype=float) if key in ['xref', 'sx', 'sxx', 'sxy'] else value
+                     for key, value in stats.items()}
+            self.fitted[int(lead)] = self._Fit(stats)
+        self.values = {int(m): dict(v) for m, v in state['values'].items()}
+        self.forecast = {key: dict(fc, target=pd.Period(fc['target'], freq='M'))
+                         for key, fc in state['forecast'].items()}
+        return self
+
+    def add_record(self, value):
+        '''Adds the crop record of the current target and moves to the next season
+
+        The lagged sums of all combinations of lead months of the target are
+        added to the running statistics as a rank-one update, and the selected
+        combinations and regression coefficients are derived again, so that the
+        forecasts of the next season are identical to those of a refit with the
+        record. A missing record (NaN) moves to the next season without update.
+
+        Parameters
+        ----------
+        value: float
+            crop record of the current target
+        '''
+        if self.status != 0:
+            return
+        value = float(value)
+        if not np.isnan(value):
+            fitted = dict()
+            for lead, fit in self.fitted.items():
+                combs = self._AllCombinations(list(fit['lead']))
+                try:
+                    x = np.array([sum(self.values[self.target - m][var] for m in comb)
+                                  for var in ['prcp','smos','etos'] for comb in combs])
+                except KeyError:
+                    raise ValueError('Predictors of %s at lead %d are not complete'
+                                     % (self._Period(self.target), lead))
+                xs, ys = x - fit['xref'], value - fit['yref']
+                stats = {key: fit[key] for key in self._STATS}
+                stats.update({'n': fit['n'] + 1, 'sx': fit['sx'] + xs, 'sy': fit['sy'] + ys,
+                              'sxx': fit['sxx'] + np.outer(xs, xs), 'sxy': fit['sxy'] + xs*ys,
+                              'syy': fit['syy'] + ys*ys})
+                fitted[lead] = self._Fit(stats)
+            self.fitted = fitted
+        self.target += 12
+        self.forecast = dict()
+        self.values = {m: v for m, v in self.values.items() if m > self.target - 12}
+
+    def update(self, month, values):
+        '''Adds a new month of predictors and returns the updated forecasts
+
+        A month after the current target raises ValueError, since the forecasts
+        of the next season need the crop record of the target (see add_record).
+
+        Parameters
+        ----------
+        month: str, Period, or Timestamp
+            month of the predictors (e.g., '2021-11')
+        values: dict or Series
+            {'prcp', 'smos', 'etos': value} of the month
+
+        Returns
+        -------
+        forecast: dict
+            {'m%02d' % lead: {'lead', 'month', 'target', 'yHat'}} of the leads
+            which become available (or are revised) with the month
+        '''
+        if self.status != 0:
+            return dict()
+        mnum = self._MonthNumber(month)
+        if mnum >= self.target:
+            # The regressions of the next season need the crop record of the current target
+            raise ValueError('%s is after the target %s: add the crop record with add_record() or refit'
+                             % (pd.Period(month, freq='M'), self._Period(self.target)))
+        self.values[mnum] = {v: float(values[v]) for v in ['prcp','smos','etos']}
+        self.values = {m: v for m, v in self.values.items() if m > self.target - 12}
+
+        updated = dict()
+        for lead, fit in self.fitted.items():
+            key = 'm%02d' % lead
+            months = [[self.target - m for m in comb] for comb in fit['combs']]
+            # Leads which are not available yet or not affected by the month
+            if any(m not in self.values for comb in months for m in comb):
+                continue
+            if (key in self.forecast) and all(mnum not in comb for comb in months):
+                continue
+            # Lagged sums of the selected combinations of lead months
+            xnew = np.array([sum(self.values[m][var] for m in comb)
+                             for var, comb in zip(['prcp','smos','etos'], months)])
+            updated[key] = {'lead': lead, 'month': fit['month'], 'target': self._Period(self.target),
+                            'yHat': fit['ymean'] + (xnew - fit['xmean']).dot(fit['beta'])}
+        self.forecast.update(updated)
+        return updated
@@ -0,0 +1,222 @@
+"""
+This script presents a compact, array-backed store of forecast results of
+PCYF and SSPRED.
+
+Results of all districts (or points) are kept in typed NumPy arrays instead of
+dictionaries of pandas objects and fitted regression objects:
+    skill  - structured array [district, lead] of status, month, msess, gss,
+             and the numbers of training and testing records
+    series - structured array [district, lead, year] of observed and forecast
+             values and the period flag (0: missing, 1: training, 2: testing)
+    coef   - array [district, lead, predictor] of standardized regression
+             coefficients of the last fold
+    xlead  - array [district, lead, predictor] of selected lead months (SSPRED)
+Values are kept in single precision. A store is saved to and loaded from a
+single file (.npz).
+
+File name: results.py
+Date revised: 10/18/2026
+"""
+__version__ = "1.0"
+__author__ = "Donghoon Lee"
+__maintainer__ = "Donghoon Lee"
+__email__ = "dlee@geog.ucsb.edu"
+
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+
+SKILL_DTYPE = np.dtype([('status', 'i2'), ('month', 'i1'), ('msess', 'f4'), ('gss', 'f4'),
+                        ('ntran', 'i2'), ('ntest', 'i2')])
+SERIES_DTYPE = np.dtype([('obs', 'f4'), ('hat', 'f4'), ('period', 'i1')])
+
+
+class ResultStore:
+    '''
+    Compact store of forecast results of districts x leads x years.
+
+    For PCYF, leads are lead months (e.g., [4,3,2,1]). For SSPRED, leads are
+    target months (1-12) and 'm%02d' keys of the outbox refer to the months.
+
+    Parameters
+    ----------
+    pids: list
+        districts (or points)
+    leads: list
+        lead months (PCYF) or target months (SSPRED)
+    years: list
+        years of the records
+    npred: int
+        maximum number of predictors (3 for PCYF)
+    model: str
+        'PCYF' or 'SSPRED'
+    '''
+
+    def __init__(self, pids, leads, years, npred=3, model='PCYF'):
+        self.pids = pd.Index(pids)
+        self.leads = list(leads)
+        self.years = pd.Index(np.asarray(years, dtype=int))
+        self.model = model
+        shape = (len(self.pids), len(self.leads))
+        self.skill = np.zeros(shape, dtype=SKILL_DTYPE)
+        self.skill['status'] = -1                   # Not written
+        self.skill['msess'] = np.nan
+        self.skill['gss'] = np.nan
+        self.series = np.zeros(shape + (len(self.years),), dtype=SERIES_DTYPE)
+        self.series['obs'] = np.nan
+        self.series['hat'] = np.nan
+        self.coef = np.full(shape + (npred,), np.nan, dtype='f4')
+        self.xlead = np.full(shape + (npred,), -1, dtype='i1')
+
+    def _Indexer(self, index, labels, name):
+        '''Returns positions of labels in index (raises KeyError if any is missing)
+        '''
+        idx = index.get_indexer(labels)
+        if (idx < 0).any():
+            missing = np.asarray(labels)[idx < 0]
+            raise KeyError('%s %s are not in the store' % (name, list(np.unique(missing))))
+        return idx
+
+    def _Years(self, index):
+        return self._Indexer(self.years, pd.Index(index).year, 'Years')
+
+    def write(self, pid, outbox):
+        '''Writes the outbox of a district (PCYF or SSPRED) into the store
+        '''
+        i = self.pids.get_loc(pid)
+        for k, lead in enumerate(self.leads):
+            mbox = outbox.get('m%02d' % lead)
+            if mbox is None:
+                # Early return of PCYF (e.g., STATUS_CODE 110)
+                self.skill['status'][i,k] = outbox.get('status', -1)
+                continue
+            self._WriteBox(i, k, mbox, outbox.get('status', 0))
+
+    def write_month(self, pid, lead, mbox, status=0):
+        '''Writes the monthly box of a lead (PCYF) or target month (SSPRED)
+
+        The models write each monthly box as it is completed, so that the
+        outbox is not accumulated. Leads which are not in the store are ignored.
+        '''
+        if lead not in self.leads:
+            return
+        self._WriteBox(self.pids.get_loc(pid), self.leads.index(lead), mbox, status)
+
+    def _WriteBox(self, i, k, mbox, status):
+        if self.model == 'PCYF':
+            self._WritePCYF(i, k, status, mbox)
+        else:
+            self._WriteSSPRED(i, k, mbox)
+
+    def _WritePCYF(self, i, k, status, mbox):
+        row = self.skill[i,k]
+        row['status'] = status
+        row['month'] = mbox['month']
+        row['msess'], row['gss'] = mbox['msess'], mbox['gss']
+        row['ntran'], row['ntest'] = len(mbox['yTran']), len(mbox['yTest'])
+        itran, itest = self._Years(mbox['yTran'].index), self._Years(mbox['yTest'].index)
+        series = self.series[i,k]
+        series['obs'][itran], series['period'][itran] = mbox['yTran'].values, 1
+        series['obs'][itest], series['period'][itest] = mbox['yTest'].values, 2
+        series['hat'][itest] = np.ravel(mbox['yTestHat'])
+        if 'coef' in mbox:
+            coef = np.ravel(mbox['coef'])
+        else:
+            coef = np.ravel(mbox['regr'].coef_)
+        self._WriteCoef(i, k, coef)
+
+    def _WriteSSPRED(self, i, k, mbox):
+        row = self.skill[i,k]
+        row['status'] = mbox['status']
+        row['month'] = mbox['month']
+        if 'msess' not in mbox:
+            return
+        row['msess'], row['gss'] = mbox['msess'], mbox['gss']
+        ntran, ntest = len(mbox['yTran']), len(mbox['yTest'])
+        row['ntran'], row['ntest'] = ntran, ntest
+        iyear = self._Years(mbox['time'])
+        series = self.series[i,k]
+        series['obs'][iyear] = np.r_[mbox['yTran'], mbox['yTest']]
+        series['hat'][iyear] = np.r_[mbox['yTranHat'], mbox['yTestHat']]
+        series['period'][iyear] = np.r_[np.ones(ntran), 2*np.ones(ntest)]
+        self._WriteCoef(i, k, np.ravel(mbox['regr'].coef_))
+        self.xlead[i,k,:len(mbox['xLeadOptm'])] = mbox['xLeadOptm']
+
+    def _WriteCoef(self, i, k, coef):
+        npred = self.coef.shape[2]
+        if len(coef) > npred:
+            raise ValueError('%d predictors of %s at lead %s exceed npred=%d of the store'
+                             % (len(coef), self.pids[i], self.leads[k], npred))
+        self.coef[i,k,:len(coef)] = coef
+
+    def update(self, other):
+        '''Copies written results of another store (e.g., from a worker)
+        '''
+        src, lead = np.where(other.skill['status'] != -1)
+        dst = self._Indexer(self.pids, other.pids[src], 'Districts')
+        klead = self._Indexer(pd.Index(self.leads), np.asarray(other.leads)[lead], 'Leads')
+        iyear = self._Indexer(self.years, other.years, 'Years')
+        self.skill[dst, klead] = other.skill[src, lead]
+        self.coef[dst, klead] = other.coef[src, lead]
+        self.xlead[dst, klead] = other.xlead[src, lead]
+        self.series[dst[:,None], np.array(klead, dtype=int)[:,None], iyear[None,:]] = other.series[src, lead]
+
+    def msess(self):
+        '''Returns MSESS of districts x leads (DataFrame)
+        '''
+        return self._Frame('msess', 'mse')
+
+    def gss(self):
+        '''Returns GSS of districts x leads (DataFrame)
+        '''
+        return self._Frame('gss', 'gss')
+
+    def _Frame(self, field, prefix):
+        data = self.skill[field].astype(float)
+        data[self.skill['status'] != 0] = np.nan
+        return pd.DataFrame(data, index=self.pids, columns=['%s%02d' % (prefix, m) for m in self.leads])
+
+    def forecast(self, pid, lead):
+        '''Returns observed and forecast values of a district and lead (DataFrame)
+        '''
+        i, k = self.pids.get_loc(pid), self.leads.index(lead)
+        series = self.series[i,k]
+        df = pd.DataFrame({'obs': series['obs'], 'hat': series['hat'], 'period': series['period']},
+                          index=self.years)
+        return df[df.period > 0]
+
+    @property
+    def nbytes(self):
+        return self.skill.nbytes + self.series.nbytes + self.coef.nbytes + self.xlead.nbytes
+
+    def save(self, filn):
+        '''Saves the store to a single file (.npz)
+        '''
+        meta = {'model': self.model, 'leads': [int(m) for m in self.leads], 'version': 1}
+        # Integer IDs are kept as integers (other IDs as strings)
+        if pd.api.types.is_integer_dtype(self.pids):
+            pids = np.asarray(self.pids, dtype=np.int64)
+        else:
+            pids = np.asarray(self.pids, dtype=str)
+        with open(filn + '.part', 'wb') as f:
+            np.savez_compressed(f, skill=self.skill, series=self.series, coef=self.coef,
+                                xlead=self.xlead, pids=pids,
+                                years=np.asarray(self.years), meta=json.dumps(meta))
+        os.replace(filn + '.part', filn)
+
+
+def LoadResultStore(filn):
+    '''Loads a store saved by ResultStore.save
+    '''
+    with np.load(filn, allow_pickle=False) as f:
+        meta = json.loads(str(f['meta']))
+        store = ResultStore(f['pids'], meta['leads'], f['years'], npred=f['coef'].shape[2],
+                            model=meta['model'])
+        store.skill[:] = f['skill']
+        store.series[:] = f['series']
+        store.coef[:] = f['coef']
+        store.xlead[:] = f['xlead']
+    return store
@@ -0,0 +1,221 @@
+"""
+This script runs PCYF and SSPRED models in parallel with a process pool.
+
+Work units are districts (or points) by target months. The read-only input
+data is sent to each worker once when the worker starts, so that each task
+only carries its keys (e.g., district ID and target month).
+
+File name: scheduler.py
+Date revised: 10/18/2026
+"""
+__version__ = "1.0"
+__author__ = "Donghoon Lee"
+__maintainer__ = "Donghoon Lee"
+__email__ = "dlee@geog.ucsb.edu"
+
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from pcyf import PCYF
+from sspred import SSPRED
+from results import ResultStore
+from memo import CachedPCYF, CachedSSPRED
+
+
+# Read-only data shared with workers (assigned by _InitWorker)
+_SHARED = {}
+
+
+def _InitWorker(shared):
+    '''Assigns read-only data to the worker process
+    '''
+    _SHARED.clear()
+    _SHARED.update(shared)
+
+
+def _SelectPoint(df, pid):
+    '''Returns data of a district/point from (district, variable) columns
+    '''
+    if isinstance(df.columns, pd.MultiIndex):
+        return df[pid]
+    return df
+
+
+def _CompactStore(pid):
+    '''Returns a store of a district if results are compacted in workers
+    '''
+    spec = _SHARED.get('store')
+    if spec is None:
+        return None
+    return ResultStore([pid], spec['leads'], spec['years'], npred=spec['npred'], model=spec['model'])
+
+
+def _StoreSpec(store):
+    if store is None:
+        return None
+    return {'leads': store.leads, 'years': np.asarray(store.years), 'npred': store.coef.shape[2],
+            'model': store.model}
+
+
+def _RunPCYF(task):
+    pid, targmon = task
+    dfCrop = _SHARED['dfCrop'][pid]
+    dfPred = _SelectPoint(_SHARED['dfPred'], pid)
+    store = _CompactStore(pid)
+    if _SHARED.get('cache') is not None:
+        outbox = CachedPCYF(dfCrop, dfPred, targmon, _SHARED['leadmat'], pid=pid,
+                            cache=_SHARED['cache'], store=store, **_SHARED['kwargs'])
+    else:
+        outbox = PCYF(dfCrop, dfPred, targmon=targmon, leadmat=_SHARED['leadmat'], pid=pid,
+                      store=store, **_SHARED['kwargs']).outbox
+    return outbox if store is None else store
+
+
+def _RunSSPRED(task):
+    pid, targMonth = task
+    dfFlow = _SHARED['dfFlow'][pid]
+    dfPred = _SelectPoint(_SHARED['dfPred'], pid)
+    store = _CompactStore(pid)
+    if _SHARED.get('cache') is not None:
+        outbox = CachedSSPRED(dfFlow, dfPred, _SHARED['leadMat'], pid, cache=_SHARED['cache'],
+                              store=store, targMonth=targMonth, **_SHARED['kwargs'])
+    else:
+        outbox = SSPRED(dfFlow, dfPred, _SHARED['leadMat'], pid, targMonth=targMonth,
+                        store=store, **_SHARED['kwargs']).outbox
+    return outbox if store is None else store
+
+
+def _MapTasks(func, tasks, shared, nworkers, chunksize):
+    '''Maps tasks to a process pool and returns results in the order of tasks
+    '''
+    if nworkers is None:
+        nworkers = os.cpu_count()
+    nworkers = max(1, min(nworkers, len(tasks)))
+    if nworkers == 1:
+        # Serial execution in the current process
+        _InitWorker(shared)
+        return [func(task) for task in tasks]
+    if chunksize is None:
+        chunksize = max(1, int(np.ceil(len(tasks)/(nworkers*4))))
+    with ProcessPoolExecutor(max_workers=nworkers, initializer=_InitWorker,
+                             initargs=(shared,)) as executor:
+        return list(executor.map(func, tasks, chunksize=chunksize))
+
+
+def RunPCYF(dfCrop, dfPred, targmon, leadmat, pids=None, nworkers=None, chunksize=None, store=None,
+            cache=None, **kwargs):
+    '''Runs PCYF of all districts (and target months) with a process pool
+
+    Parameters
+    ----------
+    dfCrop: DataFrame (PeriodIndex or DateTimeIndex, districts)
+        crop records of districts
+    dfPred: DataFrame with (district, variable) MultiIndex columns
+        monthly predictors of districts (e.g., 'prcp', 'smos', 'etos')
+    targmon: int or list
+        target month(s) of crop records
+    leadmat: list
+        lead months (e.g., [4,3,2,1])
+    pids: list
+        districts to be processed (default is all columns of dfCrop)
+    nworkers: int
+        number of worker processes (default is the number of CPUs)
+    chunksize: int
+        number of tasks sent to a worker at once
+    store: results.ResultStore
+        compact store into which results are written (a single target month);
+        workers return compact results instead of outboxes
+    cache: str or memo.ForecastCache
+        cache directory of outboxes; unchanged districts are served from the
+        cache (see memo.CachedPCYF)
+    **kwargs:
+        keyword arguments passed to PCYF
+
+    Returns
+    -------
+    outbox: dict
+        {pid: outbox} if targmon is int, or {targmon: {pid: outbox}} if list
+        (store if store is given)
+    '''
+    if pids is None:
+        pids = list(dfCrop.columns)
+    targlist = [targmon] if np.isscalar(targmon) else list(targmon)
+    tasks = [(pid, tm) for tm in targlist for pid in pids]
+    shared = {'dfCrop': dfCrop, 'dfPred': dfPred, 'leadmat': leadmat, 'kwargs': kwargs,
+              'store': _StoreSpec(store), 'cache': cache}
+    result = _MapTasks(_RunPCYF, tasks, shared, nworkers, chunksize)
+    if store is not None:
+        for sub in result:
+            store.update(sub)
+        return store
+
+    # Collect results in the order of tasks
+    outbox = {tm: {} for tm in targlist}
+    for (pid, tm), obox in zip(tasks, result):
+        outbox[tm][pid] = obox
+    if np.isscalar(targmon):
+        return outbox[targmon]
+    return outbox
+
+
+def RunSSPRED(dfFlow, dfPred, leadMat, targMonth=13, pids=None, nworkers=None, chunksize=None,
+              store=None, cache=None, **kwargs):
+    '''Runs SSPRED of all points and target months with a process pool
+
+    Parameters
+    ----------
+    dfFlow: DataFrame (DateTimeIndex, points)
+        monthly records of streamflow of points
+    dfPred: DataFrame
+        monthly records of predictors shared by all points, or with
+        (point, variable) MultiIndex columns for point-specific predictors
+    leadMat: numpy array
+        2 x k array; start and end months of time window of the predictors
+    targMonth: int
+        target month to be predicted (default is 13 meaning all 12 calendar months)
+    pids: list
+        points to be processed (default is all columns of dfFlow)
+    nworkers: int
+        number of worker processes (default is the number of CPUs)
+    chunksize: int
+        number of tasks sent to a worker at once
+    store: results.ResultStore
+        compact store into which results are written (leads are target months);
+        workers return compact results instead of outboxes
+    cache: str or memo.ForecastCache
+        cache directory of outboxes; unchanged points are served from the
+        cache (see memo.CachedSSPRED)
+    **kwargs:
+        keyword arguments passed to SSPRED
+
+    Returns
+    -------
+    outbox: dict
+        {pid: outbox}; each outbox consists of results of the target months
+        (store if store is given)
+    '''
+    if pids is None:
+        pids = list(dfFlow.columns)
+    if targMonth == 13:
+        targlist = list(range(1,13))
+    else:
+        targlist = [targMonth]
+    tasks = [(pid, tm) for pid in pids for tm in targlist]
+    shared = {'dfFlow': dfFlow, 'dfPred': dfPred, 'leadMat': leadMat, 'kwargs': kwargs,
+              'store': _StoreSpec(store), 'cache': cache}
+    result = _MapTasks(_RunSSPRED, tasks, shared, nworkers, chunksize)
+    if store is not None:
+        for sub in result:
+            store.update(sub)
+        return store
+
+    # Collect monthly boxes of each point in the order of tasks
+    outbox = {pid: {} for pid in pids}
+    for (pid, tm), obox in zip(tasks, result):
+        if 'profile' in obox:
+            # Profiles of target months are kept separately
+            obox['profile_m%02d' % tm] = obox.pop('profile')
+        outbox[pid].update(obox)
+    return outbox
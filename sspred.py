@@ -25,6 +25,12 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 from sklearn.metrics import mean_squared_error
 import metrics as mt
+from detrend import DetrendCache
+from instrument import GetRecorder
+
+# Below this number of lead combinations, the batched LOOCV of all combinations
+# is faster than solving the bounds of the branch-and-bound search
+BNB_MIN_COMB = 256
 
 
 class SSPRED:
@@ -59,6 +65,24 @@ class SSPRED:
             ID number of station or grid
     targMonth: int
             Target month to be predicted (default is 13 meaning all 12 calendar months)
+    search: str
+            Search of optimal lead-months of predictors
+            'exhaustive': LOOCV of all combinations of lead-months (default)
+            'bnb': branch-and-bound search in order of lag-correlations; with
+            less than BNB_MIN_COMB combinations, all combinations are evaluated.
+            The search is exact for LR (one predictor) and a heuristic for PCR
+            (see mbox['search'])
+    budget: int
+            Maximum number of combinations evaluated by LOOCV in 'bnb' search
+            (default is None); at least 1. Least-squares bounds of the search are
+            not counted against the budget (see mbox['nBound'])
+    instrument: bool or str
+            True to record per-stage wall time and counters in outbox['profile'],
+            'memory' to trace allocations as well (default is False)
+    store: results.ResultStore
+            compact store into which the results are written (optional); the
+            monthly boxes are written as they are completed and are not kept in
+            the outbox
 
     Attributes
     ----------
@@ -73,15 +97,20 @@ class SSPRED:
 
     '''
 
-    def __init__(self, dfFlow, dfPred, leadMat, point_no, targMonth=13, prct_test=0.3):
+    def __init__(self, dfFlow, dfPred, leadMat, point_no, targMonth=13, prct_test=0.3,
+                 search='exhaustive', budget=None, instrument=False, store=None):
         # Validate input variable 
         assert dfPred.shape[1] == leadMat.shape[1]
+        if (budget is not None) and (budget < 1):
+            raise ValueError('budget should be at least 1')
 
         # Initial data control
         dfFlow, dfPred = self._InitDataControl(dfFlow, dfPred, leadMat)
         
         # Initialize parameter
         outbox = dict()
+        self._dcache = DetrendCache()               # Detrended series
+        rec = GetRecorder(instrument, 'SSPRED %s' % point_no)
 
         # Target Month
         if targMonth == 13:
@@ -90,6 +119,9 @@ class SSPRED:
             targRange = range(targMonth-1,targMonth)
         
         for i in targRange:
+            if store is not None:
+                # Monthly box of the previous month is written to the store
+                self._FlushStore(store, point_no, outbox)
             # Initialize the monthly box
             mbox = {'point_no': point_no, 'status': 0, 'month': i+1}
             outbox.update({'m%02d'%(i+1): mbox})
@@ -110,7 +142,7 @@ class SSPRED:
                 outbox.update({'m%02d'%(i+1): mbox})
                 continue
             # STATUS_CODE 120: Monotonic values (possible missing records)
-            if y.is_monotonic:
+            if y.is_monotonic_increasing:
                 mbox['status'] = 120                        # STATUS_CODE
                 outbox.update({'m%02d'%(i+1): mbox})
                 continue
@@ -127,7 +159,7 @@ class SSPRED:
             # Missing period control (treats only possible lead-months)
             xPred, leadPred = self._TreatMissPeriod(xPred, leadPred, y.index)
             # Refine predictor data (naming with "drop")
-            nolead = np.in1d(list(map(np.size, leadPred)), 0)
+            nolead = np.isin(list(map(np.size, leadPred)), 0)
             strRemoved = list(compress(strPredOrig, nolead))
             leadPredDrop = list(compress(leadPred, ~nolead))
             xPredDrop = xPred.drop(columns = strRemoved)
@@ -139,16 +171,19 @@ class SSPRED:
             maxLeadPred = list(map(np.max, leadPredDrop))
             corr = np.full([np.max(maxLeadPred), nPredDrop], np.nan)
             sign = corr.copy()
-            for j in range(nPredDrop):
-                # Dataframe of each predictor
-                jPred = xPredDrop[strDrop[j]]
-                jLead = leadPredDrop[j]
-                for k in jLead:
-                    # Dataframe of k lead-month of j predictor
-                    kPred = jPred.reindex(y.index - MonthEnd(k))        # Original
-                    kPred_detrend = self._Detrend(kPred) + kPred.mean(0)     # Detrended
-                    # Correlation and significance
-                    corr[k-1,j], sign[k-1,j] = self._Corr1d1d_nan(kPred_detrend, y)
+            with rec.stage('lag_correlation'):
+                for j in range(nPredDrop):
+                    # Dataframe of each predictor
+                    jPred = xPredDrop[strDrop[j]]
+                    jLead = leadPredDrop[j]
+                    # All lead-months of j predictor (detrended at once)
+                    jLag = np.vstack([jPred.reindex(y.index - MonthEnd(k)).values for k in jLead]).T
+                    jLag_detrend = self._dcache.detrend(jLag) + np.nanmean(jLag, 0)
+                    for ik, k in enumerate(jLead):
+                        # Dataframe of k lead-month of j predictor
+                        kPred_detrend = pd.Series(jLag_detrend[:,ik], index=y.index)
+                        # Correlation and significance
+                        corr[k-1,j], sign[k-1,j] = self._Corr1d1d_nan(kPred_detrend, y)
             lead = np.nanargmax(np.abs(corr), axis=0)
             maxcorr = corr[lead, np.arange(corr.shape[1])]
             maxsign = sign[lead, np.arange(corr.shape[1])].astype('bool')
@@ -165,7 +200,7 @@ class SSPRED:
             leadPred = list(compress(leadPredDrop, maxsign))
             xLeadCorr = maxlead[maxsign]
             # Identify auto- and lead-predictors
-            isAuto = np.in1d(strPredOrig, strPred)
+            isAuto = np.isin(strPredOrig, strPred)
             isAuto = ((leadMat[0,isAuto] - leadMat[1,isAuto]) == 0)
             nAuto = np.sum(isAuto)
             nLead = np.sum(~isAuto)
@@ -200,124 +235,80 @@ class SSPRED:
                 # "ndarray" is converted to "DataFrame"
                 xTemp = pd.DataFrame(data=xTemp, index=y.index, columns=strPred)
 
-                # Split data to train/test time period
-                xTran, xTest, yTran, yTest = train_test_split(xTemp, y, test_size=prct_test,
-                                                              shuffle=False)
-                # Nomalize before prediction
-                scale_x = StandardScaler().fit(xTran)
-                scale_x.scale_ = np.std(xTran.values, axis=0, ddof=1)  # sample STDEV
-                xTran = scale_x.transform(xTran)
-                xTest = scale_x.transform(xTest)
-                scale_y = StandardScaler().fit(yTran[:,None])
-                scale_y.scale_ = np.std(yTran, axis=0, ddof=1)  # sample STDEV
-                yTran = scale_y.transform(yTran[:,None])
-                yTest = scale_y.transform(yTest[:,None])
-
-                # Regression
-                if nPred == 1:
-                    # Single predictor (LR)
-                    regr = LinearRegression()
-                    regr.fit(xTran, yTran)
-                else:
-                    # Multiple predictors (PCR)
-                    # *Currently, only the last PC is truncated
-                    regr = self._PCR(xTran, yTran, xTran.shape[1]-1)
-                yTranHat = regr.predict(xTran)
-                yTestHat = regr.predict(xTest)
+                with rec.stage('regression'):
+                    # Split data to train/test time period
+                    xTran, xTest, yTran, yTest = train_test_split(xTemp, y, test_size=prct_test,
+                                                                  shuffle=False)
+                    # Nomalize before prediction
+                    scale_x = StandardScaler().fit(xTran)
+                    scale_x.scale_ = np.std(xTran.values, axis=0, ddof=1)  # sample STDEV
+                    xTran = scale_x.transform(xTran)
+                    xTest = scale_x.transform(xTest)
+                    scale_y = StandardScaler().fit(np.asarray(yTran)[:,None])
+                    scale_y.scale_ = np.std(yTran, axis=0, ddof=1)  # sample STDEV
+                    yTran = scale_y.transform(np.asarray(yTran)[:,None])
+                    yTest = scale_y.transform(np.asarray(yTest)[:,None])
+
+                    # Regression
+                    if nPred == 1:
+                        # Single predictor (LR)
+                        regr = LinearRegression()
+                        regr.fit(xTran, yTran)
+                    else:
+                        # Multiple predictors (PCR)
+                        # *Currently, only the last PC is truncated
+                        regr = self._PCR(xTran, yTran, xTran.shape[1]-1)
+                    yTranHat = regr.predict(xTran)
+                    yTestHat = regr.predict(xTest)
 
 
             # (B) Multi-leads (LR or PCR with LOOCV)
             if (nPred > 0) & (nPred <= np.sum(nleadPred)):
-                # Define combinations of lead months of predictors
-                comb = list(product(*leadPred))
-                ncomb = len(comb)           # Number of combinations
+                # Number of combinations of lead months of predictors
+                ncomb = np.prod(nleadPred)
 
                 # Find optimal lead-times --------------------------------------- #
-                mse = np.zeros(ncomb)
-                for ic in np.arange(ncomb):
-                    # Load predictors in the current combination
-                    xTemp = np.zeros([len(y), nPred])
-                    for ip in range(nPred):
-                        temp = xPred[strPred[ip]].reindex(y.index - MonthEnd(comb[ic][ip]))
-                        # Detrending
-                        xTemp[:,ip] = self._Detrend(temp) + temp.mean()
-                    # "ndarray" is converted to "DataFrame"
-                    xComb = pd.DataFrame(data=xTemp, index=y.index, columns=strPred)
-
-                    # split training and test data sets
-                    xTran, xTest, yTran, yTest = train_test_split(xComb, y,
-                                                  test_size=prct_test, shuffle=False)
-
-
-                    # # Automatic Cross-Validation -------------------------------- #
-                    # # Nomalize before prediction
-                    # scale_x = StandardScaler().fit(xTran)
-                    # scale_x.scale_ = np.std(xTran.values, axis=0, ddof=1)  # Sample STDEV
-                    # xTran = scale_x.transform(xTran)
-                    # scale_y = StandardScaler().fit(yTran[:,None])
-                    # scale_y.scale_ = np.std(yTran, axis=0, ddof=1)  # Sample STDEV
-                    # yTran = scale_y.transform(yTran[:,None])
-
-                    # # Leave-One-Out Cross Validation (LOOCV)
-                    # lbo = self._LeaveBlockOut(n=len(xTran), bl=1)   # bl = block size
-                    # if nPred == 1:
-                    #     # (B) Single predictor (LR with LOOCV)
-                    #     regr = LinearRegression()
-                    #     regr.fit(xTran, yTran)
-                    # else:
-                    #     # (C) Multiple predictors (PCR with LOOCV)
-                    #     # *Currently, only the last PC is truncated
-                    #     regr = self._PCR(xTran, yTran, xTran.shape[1]-1)
-                    # regr.normalize, regr.fit_intercept = True, True
-                    # yPred = cross_val_predict(regr, xTran, yTran, cv=lbo)
-
-                    # # Evaluating statiscis: MSE
-                    # #TODO: REDUCE THE LENGTH OF yTRAN and yPRED
-                    # yTran = scale_y.inverse_transform(yTran).flatten()
-                    # yPred = scale_y.inverse_transform(yPred).flatten()
-                    # mse[ic] = mean_squared_error(yTran, yPred)  
-
-
-                    # Manual Cross-Validation ----------------------------------- #
-                    nyTran = len(yTran)
-                    bl = 1                                  # Block size (must be odd number)
-                    # Sample index out of block
-                    sampIdx = np.full([nyTran, nyTran-bl+1], False, dtype=bool)
-                    yPred = np.zeros([nyTran-bl+1, 1])
-
-                    for ip in range(nyTran-bl+1):
-                        # Regression for each point (ip) to be cross-validated
-                        sampIdx[:,ip] = ~np.in1d(np.arange(0,nyTran), np.arange(ip,ip+bl))
-
-                        # Nomalize before prediction
-                        yTemp = yTran.loc[sampIdx[:,ip]]
-                        scale_y = StandardScaler().fit(yTemp[:,None])
-                        scale_y.scale_ = np.std(yTemp, axis=0, ddof=1)          # Sample STDEV
-                        yTemp = scale_y.transform(yTemp[:,None])
-                        yTempVald = yTran.iloc[int((bl-1)/2+ip)]
-                        yTempVald = scale_y.transform(np.array(yTempVald).reshape(-1,1))
-                        xTemp = xTran.loc[sampIdx[:,ip]]
-                        scale_x = StandardScaler().fit(xTemp)
-                        scale_x.scale_ = np.std(xTemp.values, axis=0, ddof=1)   # Sample STDEV
-                        xTemp = scale_x.transform(xTemp)
-                        xTempVald = xTran.iloc[int((bl-1)/2+ip)].values
-                        xTempVald = scale_x.transform(xTempVald.reshape(1,-1)).flatten()
-                        if nPred == 1:
-                            # (B) Single predictor (LR with LOOCV)
-                            regr = LinearRegression()
-                            regr.fit(xTemp, yTemp)
-                        else:
-                            # (C) Multiple predictors (PCR with LOOCV)
-                            # *Currently, only the last PC is truncated
-                            regr = self._PCR(xTemp, yTemp, xTemp.shape[1]-1)
-                        yPredTemp = regr.predict(xTempVald.reshape(1,-1))
-                        yPred[ip] = scale_y.inverse_transform(yPredTemp)
-
-                    # # Evaluating statiscis: MSE
-                    # mse[ic] = mean_squared_error(yTran[int((bl-1)/2):int(nyTran-(bl-1)/2)], yPred.flatten())
+                # Load predictors at all lead months (detrended only once)
+                xCand = []
+                for ip in range(nPred):
+                    temp = np.vstack([xPred[strPred[ip]].reindex(y.index - MonthEnd(lead)).values
+                                      for lead in leadPred[ip]]).T
+                    # Detrending
+                    xCand.append(self._dcache.detrend(temp) + np.nanmean(temp, 0))
+
+                # Leave-One-Out Cross Validation (LOOCV)
+                # (B) Single predictor (LR with LOOCV)
+                # (C) Multiple predictors (PCR with LOOCV)
+                # *Currently, only the last PC is truncated
+                nyTran = len(train_test_split(y, test_size=prct_test, shuffle=False)[0])
+                npc = nPred if nPred == 1 else nPred-1
+                with rec.stage('lead_search'):
+                    if search not in ['exhaustive', 'bnb']:
+                        raise ValueError('Check the search')
+                    # Bounds cost more than the batched LOOCV of all combinations of a small space
+                    small = (ncomb < BNB_MIN_COMB) and ((budget is None) or (budget >= ncomb))
+                    if (search == 'exhaustive') or small:
+                        # LOOCV of all combinations
+                        combIdx = np.array(list(product(*[range(len(lead)) for lead in leadPred])))
+                        mse = self._LOOCV(xCand, combIdx, y.values[:nyTran], npc)
+                        optmIdx = combIdx[np.argmin(mse)]
+                        nEval, nBound = ncomb, 0
+                        searched = 'exhaustive'
+                    else:
+                        # Lead months ranked by absolute lag-correlations
+                        jPred = [strDrop.index(sp) for sp in strPred]
+                        order = [np.argsort(-np.abs(corr[leadPred[ip]-1, jPred[ip]]), kind='stable')
+                                 for ip in range(nPred)]
+                        optmIdx, nEval, nBound = self._SearchLead(xCand, order, y.values[:nyTran],
+                                                                  npc, budget)
+                        # The least-squares bound is not a bound of PCR
+                        searched = 'bnb' if npc == nPred else 'bnb_heuristic'
 
                 # Optimal lead-time is decided by the minimum MSE
-                xLeadOptm = comb[np.argmin(mse)]
+                xLeadOptm = tuple(leadPred[ip][optmIdx[ip]] for ip in range(nPred))
+                mbox.update({'nComb': ncomb, 'nEval': nEval, 'nBound': nBound, 'search': searched})
+                rec.count('combinations', nEval)
+                rec.count('bounds', nBound)
 
                 # Regression with optimal lead-time ----------------------------- #
                 # Load predictors in the current combination
@@ -329,30 +320,31 @@ class SSPRED:
                 # "ndarray" is converted to "DataFrame"
                 xComb = pd.DataFrame(data=xTemp, index=y.index, columns=strPred)
 
-                # Split training and test data sets
-                xTran, xTest, yTran, yTest, yTrendTran, yTrendTest = train_test_split(xComb, y, yTrend,
-                                              test_size=prct_test, shuffle=False)
-                # Nomalize before prediction
-                scale_x = StandardScaler().fit(xTran)
-                scale_x.scale_ = np.std(xTran.values, axis=0, ddof=1)   # Sample STDEV
-                xTran = scale_x.transform(xTran)
-                xTest = scale_x.transform(xTest)
-                scale_y = StandardScaler().fit(yTran[:,None])
-                scale_y.scale_ = np.std(yTran, axis=0, ddof=1)          # Sample STDEV
-                yTran = scale_y.transform(yTran[:,None])
-                yTest = scale_y.transform(yTest[:,None])
-
-                # Regression
-                if nPred == 1:
-                    # (B) single climate predictor (LR)
-                    regr = LinearRegression()
-                    regr.fit(xTran, yTran)
-                else:
-                    # (C) multiple predictors (PCR)
-                    # *currently, only the last PC is truncated
-                    regr = self._PCR(xTran, yTran, xTran.shape[1]-1)
-                yTranHat = regr.predict(xTran)
-                yTestHat = regr.predict(xTest)
+                with rec.stage('regression'):
+                    # Split training and test data sets
+                    xTran, xTest, yTran, yTest, yTrendTran, yTrendTest = train_test_split(xComb, y, yTrend,
+                                                  test_size=prct_test, shuffle=False)
+                    # Nomalize before prediction
+                    scale_x = StandardScaler().fit(xTran)
+                    scale_x.scale_ = np.std(xTran.values, axis=0, ddof=1)   # Sample STDEV
+                    xTran = scale_x.transform(xTran)
+                    xTest = scale_x.transform(xTest)
+                    scale_y = StandardScaler().fit(np.asarray(yTran)[:,None])
+                    scale_y.scale_ = np.std(yTran, axis=0, ddof=1)          # Sample STDEV
+                    yTran = scale_y.transform(np.asarray(yTran)[:,None])
+                    yTest = scale_y.transform(np.asarray(yTest)[:,None])
+
+                    # Regression
+                    if nPred == 1:
+                        # (B) single climate predictor (LR)
+                        regr = LinearRegression()
+                        regr.fit(xTran, yTran)
+                    else:
+                        # (C) multiple predictors (PCR)
+                        # *currently, only the last PC is truncated
+                        regr = self._PCR(xTran, yTran, xTran.shape[1]-1)
+                    yTranHat = regr.predict(xTran)
+                    yTestHat = regr.predict(xTest)
 
             # Post-processing
             if nPred > 0:
@@ -361,8 +353,8 @@ class SSPRED:
                 xTest = scale_x.inverse_transform(xTest)
                 yTran = scale_y.inverse_transform(yTran).flatten()
                 yTest = scale_y.inverse_transform(yTest).flatten()
-                yTranHat = scale_y.inverse_transform(yTranHat).flatten()
-                yTestHat = scale_y.inverse_transform(yTestHat).flatten()
+                yTranHat = scale_y.inverse_transform(yTranHat.reshape(-1,1)).flatten()
+                yTestHat = scale_y.inverse_transform(yTestHat.reshape(-1,1)).flatten()
 
                 # Re-trending
                 yTran = yTran + yTrendTran.values
@@ -370,14 +362,16 @@ class SSPRED:
                 yTranHat = yTranHat + yTrendTran.values
                 yTestHat = yTestHat + yTrendTest.values
 
-                # Evaluating statiscis: gss, msess
-                table = mt.makeMultiContTable(yTest, yTestHat, clm=yTran, thrsd=[1/3, 2/3])
-                mct = mt.MulticlassContingencyTable(table, n_classes=3)
-                gss = mct.gerrity_skill_score()
-                msess = mt.msess(yTest, yTestHat, yTran)
+                with rec.stage('scoring'):
+                    # Evaluating statiscis: gss, msess
+                    table = mt.makeMultiContTable(yTest, yTestHat, clm=yTran, thrsd=[1/3, 2/3])
+                    mct = mt.MulticlassContingencyTable(table, n_classes=3)
+                    gss = mct.gerrity_skill_score()
+                    msess = mt.msess(yTest, yTestHat, yTran)
 
                 # Update monthly box
                 mbox.update({
+                       'time': y.index,
                        'xLeadOptm': list(xLeadOptm), 'regr': regr,
                        'xTran': xTran, 'xTest': xTest,
                        'yTran': yTran, 'yTest': yTest,
@@ -387,12 +381,25 @@ class SSPRED:
 
             # Update box
             outbox.update({'m%02d'%(i+1): mbox})
+            rec.count('months')
             print('%d - m%02d is processed.' % (point_no, i+1))
             
+        if store is not None:
+            self._FlushStore(store, point_no, outbox)
+        if rec.enabled:
+            outbox['profile'] = rec.summary()
         self.outbox = outbox
         
         
         
+    def _FlushStore(self, store, point_no, outbox):
+        '''Writes monthly boxes to the compact store (see results.ResultStore)
+        and removes them from the outbox
+        '''
+        for key in [key for key in outbox if key.startswith('m')]:
+            store.write_month(point_no, int(key[1:]), outbox.pop(key))
+
+
     def _InitDataControl(self, dfFlow, dfPred, leadmat):
         # 1) Flow data control
         # 1a) Trim missing years at the front and back of the data to get quick and valid periods
@@ -427,6 +434,7 @@ class SSPRED:
         '''detrends 1D Series
 
         *this function deals with missing values.
+        *detrended series are memorized during the run (see detrend.py).
 
         Parameters
         ----------
@@ -439,19 +447,9 @@ class SSPRED:
             detrended values of the time-series
 
         '''
-        nni = ~sr.isnull()
-        if False:
-            # Considering NaN values
-            x = np.array((sr.index - sr.index[0])/12 + 1, dtype='int')
-            m, b, r_val, p_val, std_err = stats.linregress(x[nni], sr[nni])
-            sr_detrend = sr - (m*x +b)
-        else:
-            # Ignoring NaN values
-            from scipy import signal
-            sr_detrend = sr.copy()
-            sr_detrend[nni] = pd.Series(signal.detrend(sr[nni]), index = sr[nni].index)
-
-        return sr_detrend
+        if not hasattr(self, '_dcache'):
+            self._dcache = DetrendCache()
+        return self._dcache.detrend_series(sr)
 
 
 
@@ -502,7 +500,7 @@ class SSPRED:
                     mlistBool[im] = False
 
                 # Monotonic value control
-                if temp.is_monotonic:
+                if temp.is_monotonic_increasing:
                     mlistBool[im] = False
 
             # Re-assign list of lead-months
@@ -581,6 +579,173 @@ class SSPRED:
 
         return regr
 
+    def _LOOCV(self, xCand, combIdx, yTran, npc, chunk=4096):
+        '''
+        Returns MSE of Leave-one-out Cross Validation (LOOCV) of all
+        combinations of lead months in closed form.
+
+        For each left-out year, the sample means and STDEVs used to normalize
+        predictors and predictand are derived analytically by removing the
+        year from the sums of cross-products. The LR coefficients are then
+        solved from the correlation matrix, and PCR coefficients from its
+        leading eigenvectors, for all combinations and years at once. This is
+        identical to refitting StandardScaler and LinearRegression (or _PCR)
+        for every combination and every left-out year.
+
+        Parameters
+        ----------
+        xCand: list of 2d ndarrays
+            n x l_k arrays of k predictors at their l_k lead months
+        combIdx: 2d ndarray
+            c x k array; indices of lead months of c combinations
+        yTran: 1d ndarray
+            n records of predictand in the training period
+        npc: int
+            number of principal components (npc = k means LR)
+        chunk: int
+            number of combinations evaluated at once (to bound memory)
+
+        Returns
+        -------
+        mse: 1d ndarray
+            c MSEs of LOOCV
+        '''
+        yTran = np.asarray(yTran, dtype=float)
+        n = len(yTran)
+        nPred = combIdx.shape[1]
+        # Shift by the means to avoid cancellation errors
+        xCand = [np.asarray(x[:n], dtype=float) - np.asarray(x[:n], dtype=float).mean(0) for x in xCand]
+        ys = yTran - yTran.mean()
+        m = n - 1                                   # Number of samples in each fold
+
+        mse = np.zeros(len(combIdx))
+        for c0 in range(0, len(combIdx), chunk):
+            cidx = combIdx[c0:c0+chunk]
+            # Predictors of combinations (c x n x k)
+            X = np.stack([xCand[ip][:,cidx[:,ip]].T for ip in range(nPred)], axis=2)
+            # Sums of all years
+            sx = X.sum(1)
+            sxx = np.einsum('cni,cnj->cij', X, X)
+            sxy = np.einsum('cni,n->ci', X, ys)
+            # Sums of each fold (c x n x ...) by removing the left-out year
+            fx = sx[:,None,:] - X
+            fxx = sxx[:,None,:,:] - X[:,:,:,None]*X[:,:,None,:]
+            fxy = sxy[:,None,:] - X*ys[None,:,None]
+            fy = ys.sum() - ys
+            fyy = ys.dot(ys) - ys**2
+            # Means and sample STDEVs of each fold
+            mx = fx/m
+            my = fy/m
+            cxx = (fxx - m*mx[:,:,:,None]*mx[:,:,None,:])/(m-1)
+            cxy = (fxy - m*mx*my[None,:,None])/(m-1)
+            sdx = np.sqrt(np.diagonal(cxx, axis1=2, axis2=3))
+            sdy = np.sqrt((fyy - m*my**2)/(m-1))
+            # Correlations of each fold
+            rxx = cxx/(sdx[:,:,:,None]*sdx[:,:,None,:])
+            rxy = cxy/(sdx*sdy[None,:,None])
+            # Regression coefficients of normalized data
+            if npc == nPred:
+                beta = np.linalg.solve(rxx, rxy[...,None])[...,0]
+            else:
+                w, v = np.linalg.eigh(rxx)
+                v = v[...,-npc:]
+                beta = np.einsum('cnij,cnj->cni', v, np.einsum('cnji,cnj->cni', v, rxy)/w[...,-npc:])
+            # Prediction of the left-out years
+            xv = (X - mx)/sdx
+            yPred = my + sdy*(xv*beta).sum(2)
+            mse[c0:c0+chunk] = np.mean((ys - yPred)**2, axis=1)
+
+        return mse
+
+    def _SearchLead(self, xCand, order, yTran, npc, budget=None):
+        '''
+        Returns optimal lead months of predictors by branch-and-bound search.
+
+        Lead months are assigned predictor by predictor in order of the
+        ranks (e.g., absolute lag-correlations), so that promising
+        combinations are evaluated first. A branch is pruned when the
+        in-sample MSE of the least-squares fit on the assigned lead months and
+        all lead months of unassigned predictors cannot beat the incumbent
+        LOOCV MSE. Lead months of the last predictor are evaluated by LOOCV
+        at once without bounds. The bound is exact for LR, as LOOCV MSE is
+        never lower than the in-sample MSE, but not for PCR, where the search
+        is a heuristic which may miss the optimal combination.
+
+        Parameters
+        ----------
+        xCand: list of 2d ndarrays
+            n x l_k arrays of k predictors at their l_k lead months
+        order: list of 1d ndarrays
+            indices of lead months of k predictors in order of evaluation
+        yTran: 1d ndarray
+            n records of predictand in the training period
+        npc: int
+            number of principal components (npc = k means LR)
+        budget: int
+            maximum number of combinations to be evaluated by LOOCV (default is
+            None); the least-squares bounds are not counted against the budget.
+            The first combination in order is always evaluated.
+
+        Returns
+        -------
+        optmIdx: 1d ndarray
+            k indices of optimal lead months
+        nEval: int
+            number of combinations evaluated by LOOCV
+        nBound: int
+            number of least-squares bounds solved
+        '''
+        yTran = np.asarray(yTran, dtype=float)
+        n = len(yTran)
+        nPred = len(xCand)
+        xCand = [np.asarray(x[:n], dtype=float) - np.asarray(x[:n], dtype=float).mean(0) for x in xCand]
+        yc = yTran - yTran.mean()
+        best = {'mse': np.inf, 'idx': None, 'nEval': 0, 'nBound': 0}
+
+        def bound(idx):
+            # In-sample MSE with all lead months of unassigned predictors
+            X = np.hstack([xCand[ip][:,[il]] for ip, il in enumerate(idx)] + xCand[len(idx):])
+            if X.shape[1] >= n-1:
+                return 0
+            best['nBound'] += 1
+            coef = np.linalg.lstsq(X, yc, rcond=None)[0]
+            return np.mean((yc - X.dot(coef))**2)
+
+        def spent():
+            return (budget is not None) and (best['nEval'] >= budget)
+
+        def branch(idx):
+            if spent():
+                return
+            depth = len(idx)
+            if depth < nPred-1:
+                for il in order[depth]:
+                    if spent():
+                        return
+                    if bound(idx + [il]) < best['mse']:
+                        branch(idx + [il])
+                return
+            # Evaluate LOOCV of all lead months of the last predictor at once
+            cand = list(order[depth])
+            if budget is not None:
+                cand = cand[:budget - best['nEval']]
+            if len(cand) == 0:
+                return
+            combIdx = np.array([idx + [il] for il in cand])
+            mse = self._LOOCV(xCand, combIdx, yTran, npc)
+            best['nEval'] += len(cand)
+            if mse.min() < best['mse']:
+                best['mse'] = mse.min()
+                best['idx'] = combIdx[np.argmin(mse)]
+
+        branch([])
+        if best['idx'] is None:
+            # No combination is evaluated (e.g., NaN bounds); the first in order
+            best['idx'] = np.array([order[ip][0] for ip in range(nPred)])
+            best['mse'] = self._LOOCV(xCand, best['idx'][None,:], yTran, npc)[0]
+            best['nEval'] += 1
+        return best['idx'], best['nEval'], best['nBound']
+
     def _LeaveBlockOut(self, n, bl):
         """Leave-Block-out
         Parameters:
@@ -600,7 +765,7 @@ class SSPRED:
             for test_index in self._iter_test_masks():
                 train_index = ind[np.logical_not(test_index)]
                 test_index = ind[test_index]
-                train_index = train_index[~np.in1d(train_index, 
+                train_index = train_index[~np.isin(train_index, 
                            np.arange(test_index-(bl-1)/2,test_index+(bl-1)/2+1))]
                 yield train_index, test_index
         # Create test_fold
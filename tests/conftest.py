@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Modules of the repository are imported from its root directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,31 @@
+import json
+import os
+
+import pytest
+
+from benchmarks.run import SCENARIOS, CompareBaseline, RunScenario
+
+
+@pytest.mark.parametrize('name', list(SCENARIOS.keys()))
+def test_scenario_runs(name):
+    result = RunScenario(name, size='small', repeat=1)
+    # Scenarios are skipped only if optional dependencies are not installed
+    assert result['status'] in ('ok', 'skipped'), result.get('message')
+    if result['status'] == 'ok':
+        assert result['time'] > 0
+        assert result['items'] > 0
+
+
+def test_compare_falls_back_to_reference_baseline():
+    filn = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        'benchmarks', 'baseline_small.json')
+    with open(filn) as f:
+        base = json.load(f)
+    assert 'code' in base
+    pcyf = base['results']['pcyf']
+    report = {'results': {'pcyf_batch': dict(pcyf, throughput=2*pcyf['throughput']),
+                          'pcyf': dict(pcyf, throughput=0.5*pcyf['throughput'])}}
+    comp = CompareBaseline(report, base)
+    assert comp['pcyf_batch']['reference'] == 'pcyf'
+    assert comp['pcyf_batch']['speedup'] == 2 and not comp['pcyf_batch']['regression']
+    assert comp['pcyf']['speedup'] == 0.5 and comp['pcyf']['regression']
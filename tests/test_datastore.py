@@ -0,0 +1,54 @@
+import warnings
+
+import numpy as np
+
+from benchmarks import synthetic
+from benchmarks.run import _PredOfDistrict
+from datastore import CreateDataStore, DataStore
+from pcyf import PCYF, PCYFBatch
+
+
+def _Store(tmp_path, ndist=3, nyear=20, ids=None):
+    crop, pred = synthetic.YieldPanel(ndist, nyear)
+    if ids is not None:
+        crop.columns = ids
+        pred = {v: df.set_axis(ids, axis=1) for v, df in pred.items()}
+    return crop, pred, CreateDataStore(str(tmp_path / 'store'), crop, pred)
+
+
+def test_views_are_zero_copy(tmp_path):
+    crop, pred, store = _Store(tmp_path)
+    store = DataStore(str(tmp_path / 'store'))
+    pid = crop.columns[1]
+    assert isinstance(store.crop_array, np.memmap)
+    assert np.shares_memory(store.crop(pid).to_numpy(), store.crop_array)
+    assert np.shares_memory(store.pred(pid).to_numpy(), store.pred_array)
+    assert np.shares_memory(store.variable('prcp').to_numpy(), store.pred_array)
+    assert np.shares_memory(store.crop_panel().to_numpy(), store.crop_array)
+    np.testing.assert_array_equal(store.crop(pid).values, crop[pid].values)
+    np.testing.assert_array_equal(store.pred(pid)['smos'].values, pred['smos'][pid].values)
+
+
+def test_integer_district_ids(tmp_path):
+    crop, pred, store = _Store(tmp_path, ids=[101, 102, 103])
+    store = DataStore(str(tmp_path / 'store'))
+    assert store.districts.tolist() == [101, 102, 103]
+    np.testing.assert_array_equal(store.crop(102).values, crop[102].values)
+    np.testing.assert_array_equal(store.pred(103)['etos'].values, pred['etos'][103].values)
+
+
+def test_pcyf_from_store_matches_frames(tmp_path):
+    crop, pred, store = _Store(tmp_path)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for pid in crop.columns:
+            a = PCYF(store.crop(pid), store.pred(pid), 2, [4, 3, 2, 1], pid=pid).outbox
+            b = PCYF(crop[pid], _PredOfDistrict(pred, pid), 2, [4, 3, 2, 1], pid=pid).outbox
+            for key in ['m04', 'm03', 'm02', 'm01']:
+                np.testing.assert_allclose(a[key]['yTestHat'], b[key]['yTestHat'], rtol=1e-12)
+                np.testing.assert_allclose(a[key]['msess'], b[key]['msess'], rtol=1e-12)
+        a = PCYFBatch(store.crop_panel(), store.pred_frame(), 2, [4, 3, 2, 1]).outbox
+        b = PCYFBatch(crop, pred, 2, [4, 3, 2, 1]).outbox
+    # Summation order of the batched sums depends on the memory layout
+    np.testing.assert_allclose(a['yTestHat'], b['yTestHat'], rtol=1e-12)
+    np.testing.assert_allclose(a['msess'], b['msess'], rtol=1e-12)
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from scipy import signal
+
+from detrend import Detrend2D, DetrendCache, DetrendSeries
+
+
+def _Arrays(seed=0):
+    rng = np.random.default_rng(seed)
+    arr = rng.normal(size=(30, 12)) + 0.1*np.arange(30)[:,None]
+    arr[[3, 7], 2] = np.nan                             # Missing values
+    arr[[3, 7], 5] = np.nan                             # Same pattern as column 2
+    arr[:10, 8] = np.nan
+    arr[:, 11] = np.nan                                 # All missing
+    return arr
+
+
+def test_detrend_matches_scipy_on_valid_values():
+    arr = _Arrays()
+    res = Detrend2D(arr)
+    for k in range(arr.shape[1]):
+        valid = ~np.isnan(arr[:,k])
+        assert np.array_equal(np.isnan(res[:,k]), ~valid)
+        if valid.any():
+            np.testing.assert_allclose(res[valid,k], signal.detrend(arr[valid,k]), atol=1e-12)
+    sr = pd.Series(arr[:,8], index=pd.period_range('1990', periods=30, freq='Y'), name='x')
+    out = DetrendSeries(sr)
+    assert out.name == 'x' and out.index.equals(sr.index)
+    np.testing.assert_array_equal(out.values, res[:,8])
+
+
+def test_cache_hits_match_recompute():
+    arr = _Arrays(1)
+    cache = DetrendCache(maxsize=20)
+    first = cache.detrend(arr)
+    again = cache.detrend(arr[:,::-1])
+    assert cache.misses == arr.shape[1] and cache.hits == arr.shape[1]
+    np.testing.assert_array_equal(first, Detrend2D(arr))
+    np.testing.assert_array_equal(again, first[:,::-1])
+    np.testing.assert_array_equal(cache.detrend(arr[:,4]), first[:,4])
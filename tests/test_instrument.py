@@ -0,0 +1,57 @@
+import contextlib
+import io
+import json
+import warnings
+
+import numpy as np
+
+from benchmarks import synthetic
+from benchmarks.run import _PredOfDistrict
+from instrument import CollectProfiles, MergeProfiles, SaveTrace
+from pcyf import PCYF
+from sspred import SSPRED
+
+
+def test_instrumented_pcyf_gives_the_same_outbox(tmp_path):
+    crop, pred = synthetic.YieldPanel(1, 20)
+    pid = crop.columns[0]
+    dfPred = _PredOfDistrict(pred, pid)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        plain = PCYF(crop[pid], dfPred, 2, [4, 3, 2, 1], pid=pid).outbox
+        timed = PCYF(crop[pid], dfPred, 2, [4, 3, 2, 1], pid=pid, instrument=True).outbox
+    assert 'profile' not in plain
+    prof = timed.pop('profile')
+    for key in ['m04', 'm03', 'm02', 'm01']:
+        np.testing.assert_array_equal(timed[key]['yTestHat'], plain[key]['yTestHat'])
+        assert timed[key]['msess'] == plain[key]['msess']
+    # One fold and one fit per test year and lead
+    nt = len(plain['m01']['yTest'])
+    assert prof['counters']['folds'] == prof['counters']['fits'] == 4*nt
+    assert set(prof['stages']) == {'lag_sums', 'correlation', 'scaling', 'regression', 'scoring'}
+    assert prof['stages']['scoring']['calls'] == 4
+    np.testing.assert_allclose(prof['total'], sum(s['time'] for s in prof['stages'].values()))
+
+    filn = str(tmp_path / 'trace.json')
+    SaveTrace(filn, [{'profile': prof}, {'m01': {'profile': prof}}])
+    with open(filn) as f:
+        events = json.load(f)['traceEvents']
+    assert len(events) == 2*sum(s['calls'] for s in prof['stages'].values())
+
+
+def test_instrumented_sspred_counts_evaluations():
+    dfFlow, dfPred, leadMat = synthetic.FlowRecords(1, 30)
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore')
+        plain = SSPRED(dfFlow[1], dfPred, leadMat, 1).outbox
+        timed = SSPRED(dfFlow[1], dfPred, leadMat, 1, instrument=True).outbox
+    prof = timed['profile']
+    boxes = [timed['m%02d' % m] for m in range(1, 13)]
+    assert prof['counters']['combinations'] == sum(box.get('nEval', 0) for box in boxes)
+    for m, box in enumerate(boxes, 1):
+        ref = plain['m%02d' % m]
+        assert box['status'] == ref['status']
+        if 'yTestHat' in ref:
+            np.testing.assert_array_equal(box['yTestHat'], ref['yTestHat'])
+    merged = MergeProfiles(CollectProfiles([timed, timed]))
+    assert merged['counters']['combinations'] == 2*prof['counters']['combinations']
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+
+import memo
+
+
+def test_put_lists_directory_only_over_limit(tmp_path, monkeypatch):
+    listdir = os.listdir
+    calls = []
+
+    def counting(path):
+        calls.append(path)
+        return listdir(path)
+
+    monkeypatch.setattr(memo.os, 'listdir', counting)
+    cache = memo.ForecastCache(str(tmp_path), maxsize_mb=1)
+    outbox = {'yTestHat': np.zeros(10000)}              # about 80 kB pickled
+    for k in range(10):
+        cache.put('key%d' % k, outbox)
+    assert len(calls) == 1
+    sizes = [os.path.getsize(str(tmp_path / name)) for name in listdir(str(tmp_path))]
+    assert cache.size == sum(sizes)
+
+    # Over the limit: the least recently used entries are evicted
+    os.utime(str(tmp_path / 'key0.pkl'), (0, 0))
+    for k in range(10, 20):
+        cache.put('key%d' % k, outbox)
+    assert cache.get('key0') is None
+    assert cache.get('key19') is not None
+    sizes = [os.path.getsize(str(tmp_path / name)) for name in listdir(str(tmp_path))]
+    assert cache.size == sum(sizes) <= cache.maxsize
+    assert len(calls) < 5
+
+
+def test_invalidate_and_clear_update_size(tmp_path):
+    cache = memo.ForecastCache(str(tmp_path))
+    cache.put('a', {'x': 1})
+    cache.put('b', {'x': 2})
+    cache.invalidate('a')
+    cache.invalidate('missing')
+    assert cache.size == os.path.getsize(str(tmp_path / 'b.pkl'))
+    cache.clear()
+    assert cache.size == 0
+    assert memo.ForecastCache(str(tmp_path)).size == 0
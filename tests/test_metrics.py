@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import metrics as mt
+
+
+def test_threshold_cache_is_bounded_lru():
+    rng = np.random.default_rng(0)
+    clms = [rng.normal(size=(4, 20)) for _ in range(4)]
+    cache = mt.ThresholdCache(maxsize=3)
+    for k, clm in enumerate(clms[:3]):
+        cache.thresholds(clm, [33.3, 66.7], k)
+    cache.thresholds(clms[0], [33.3, 66.7], 0)          # Most recently used
+    cache.thresholds(clms[3], [33.3, 66.7], 3)
+    assert len(cache.cache) == 3
+    assert [key[0] for key in cache.cache] == [2, 0, 3]
+    np.testing.assert_array_equal(cache.thresholds(clms[1], [33.3, 66.7], 1),
+                                  mt.matlab_percentile_2d(clms[1], [33.3, 66.7]))
+
+
+def test_threshold_cache_caller_key_skips_fingerprint(monkeypatch):
+    rng = np.random.default_rng(1)
+    clm = rng.normal(size=(5, 15))
+    obs, sim = rng.normal(size=(2, 5, 10))
+
+    def fail(*args):
+        raise AssertionError('fingerprint computed')
+
+    cache = mt.ThresholdCache()
+    monkeypatch.setattr(mt.hashlib, 'sha1', fail)
+    a = mt.makeMultiContTableBatch(obs, sim, clm=clm, cache=cache, key='clm')
+    b = mt.makeMultiContTableBatch(obs, sim, clm=clm, cache=cache, key='clm')
+    np.testing.assert_array_equal(a, mt.makeMultiContTableBatch(obs, sim, clm=clm))
+    np.testing.assert_array_equal(a, b)
+    assert len(cache.cache) == 1
+    with pytest.raises(AssertionError):
+        cache.thresholds(clm, [50], None)
+
+
+def test_batch_tables_and_scores_match_per_table():
+    rng = np.random.default_rng(2)
+    obs, sim = rng.normal(size=(2, 6, 12))
+    clm = rng.normal(size=(6, 20))
+    clm[2, 15:] = np.nan                                # Shorter climatology
+    obs[4, 3] = np.nan                                  # Missing record
+    table = mt.makeMultiContTableBatch(obs, sim, clm=clm)
+    binary = mt.makeMultiContTableBatch(obs, sim, clm=clm, thrsd=0.5)
+    batch = mt.MulticlassContingencyTableBatch(table, n_classes=3)
+    gss, hss, pss = batch.gerrity_skill_score(), batch.heidke_skill_score(), batch.peirce_skill_score()
+    for k in range(obs.shape[0]):
+        valid = ~np.isnan(obs[k])
+        c = clm[k][~np.isnan(clm[k])]
+        ref = mt.makeMultiContTable(obs[k][valid], sim[k][valid], clm=c)
+        np.testing.assert_array_equal(table[k], ref)
+        np.testing.assert_array_equal(binary[k], mt.makeBinaryContTable(obs[k][valid], sim[k][valid], clm=c))
+        mct = mt.MulticlassContingencyTable(ref, n_classes=3)
+        np.testing.assert_allclose(gss[k], mct.gerrity_skill_score(), rtol=1e-12)
+        np.testing.assert_allclose(hss[k], mct.heidke_skill_score(), rtol=1e-12)
+        np.testing.assert_allclose(pss[k], mct.peirce_skill_score(), rtol=1e-12)
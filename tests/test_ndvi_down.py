@@ -0,0 +1,124 @@
+import os
+import re
+import hashlib
+import threading
+import functools
+import http.server
+
+import pytest
+
+pytest.importorskip('bs4')
+import ndvi_down
+
+
+class _Handler(http.server.SimpleHTTPRequestHandler):
+    '''
+    Directory listings of http.server (no ETag or Last-Modified) and files with
+    ETag and Range/If-Range.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._Serve(head=True)
+
+    def do_GET(self):
+        self._Serve(head=False)
+
+    def _Serve(self, head):
+        self.server.requests.append((self.command, self.path, self.headers.get('Range')))
+        filn = self.translate_path(self.path)
+        if not os.path.isfile(filn):
+            return super().do_HEAD() if head else super().do_GET()
+        with open(filn, 'rb') as f:
+            data = f.read()
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        start = 0
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if (match is not None) and (self.headers.get('If-Range') in (None, etag)):
+            start = int(match.group(1))
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(data)-1, len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(data) - start))
+        self.end_headers()
+        if not head:
+            self.wfile.write(data[start:])
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / 'remote'
+    (root / '2001').mkdir(parents=True)
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                            functools.partial(_Handler, directory=str(root)))
+    httpd.requests = []
+    httpd.root = root
+    httpd.url = 'http://127.0.0.1:%d/' % httpd.server_address[1]
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _Etag(data):
+    return '"%s"' % hashlib.md5(data).hexdigest()
+
+
+def test_resume_part(server, tmp_path):
+    data = os.urandom(100000)
+    (server.root / '2001' / 'AVHRR_a.nc').write_bytes(data)
+    filn = str(tmp_path / 'AVHRR_a.nc')
+    with open(filn + '.part', 'wb') as f:
+        f.write(data[:40000])
+    with open(filn + '.part.validator', 'w') as f:
+        f.write(_Etag(data))
+    ndvi_down.DownloadFile(server.url + '2001/AVHRR_a.nc', filn, size=len(data), backoff=0)
+    with open(filn, 'rb') as f:
+        assert f.read() == data
+    assert server.requests == [('GET', '/2001/AVHRR_a.nc', 'bytes=40000-')]
+    assert not os.path.exists(filn + '.part') and not os.path.exists(filn + '.part.validator')
+
+
+def test_resume_part_of_replaced_file(server, tmp_path):
+    old, new = os.urandom(100000), os.urandom(100000)
+    (server.root / '2001' / 'AVHRR_a.nc').write_bytes(new)
+    filn = str(tmp_path / 'AVHRR_a.nc')
+    with open(filn + '.part', 'wb') as f:
+        f.write(old[:40000])
+    with open(filn + '.part.validator', 'w') as f:
+        f.write(_Etag(old))
+    ndvi_down.DownloadFile(server.url + '2001/AVHRR_a.nc', filn, size=len(new), backoff=0)
+    with open(filn, 'rb') as f:
+        assert f.read() == new
+
+
+def test_size_mismatch(server, tmp_path):
+    data = os.urandom(1000)
+    (server.root / '2001' / 'AVHRR_a.nc').write_bytes(data)
+    filn = str(tmp_path / 'AVHRR_a.nc')
+    with pytest.raises(IOError, match='Size mismatch'):
+        ndvi_down.DownloadFile(server.url + '2001/AVHRR_a.nc', filn, size=len(data)+1,
+                               retries=0, backoff=0)
+    assert os.listdir(str(tmp_path)) == ['remote']
+
+
+def test_repeat_sync_downloads_nothing(server, tmp_path):
+    for name in ['AVHRR_a.nc', 'AVHRR_b.nc']:
+        (server.root / '2001' / name).write_bytes(os.urandom(5000))
+    source = {'url': server.url, 'prefix': 'AVHRR', 'path': str(tmp_path / 'local')}
+    assert ndvi_down.SyncProduct(source, [2001], nworkers=2, showLog=False) == (0, 2, 0)
+    # Listings of http.server have no validators, but the names are unchanged
+    del server.requests[:]
+    assert ndvi_down.SyncProduct(source, [2001], nworkers=2, showLog=False) == (2, 0, 0)
+    assert server.requests == [('GET', '/2001/', None)]
+    # Only a new file is checked and downloaded
+    (server.root / '2001' / 'AVHRR_c.nc').write_bytes(os.urandom(5000))
+    del server.requests[:]
+    assert ndvi_down.SyncProduct(source, [2001], nworkers=2, showLog=False) == (2, 1, 0)
+    assert sorted(server.requests) == [('GET', '/2001/', None), ('GET', '/2001/AVHRR_c.nc', None),
+                                       ('HEAD', '/2001/AVHRR_c.nc', None)]
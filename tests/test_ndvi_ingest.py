@@ -0,0 +1,82 @@
+import os
+import warnings
+
+import numpy as np
+import pytest
+
+netCDF4 = pytest.importorskip('netCDF4')
+from ndvi_ingest import MonthlyComposite, DateFromFilename
+
+LAT = np.arange(10.0, -10.0, -1.0) - 0.5
+LON = np.arange(30.0, 50.0, 1.0) + 0.5
+EXTENT = [35.0, 42.0, -3.0, 4.0]
+
+
+def _WriteDaily(path, date, data):
+    filn = os.path.join(str(path), 'AVHRR-Land_v005_AVH13C1_NOAA-07_%s_c20170610041337.nc' % date)
+    with netCDF4.Dataset(filn, 'w') as nc:
+        nc.createDimension('time', 1)
+        nc.createDimension('latitude', len(LAT))
+        nc.createDimension('longitude', len(LON))
+        nc.createVariable('latitude', 'f4', ('latitude',))[:] = LAT
+        nc.createVariable('longitude', 'f4', ('longitude',))[:] = LON
+        var = nc.createVariable('NDVI', 'i2', ('time', 'latitude', 'longitude'), fill_value=-9999)
+        var.scale_factor = 0.0001
+        var[0] = np.ma.masked_invalid(data)
+    return filn
+
+
+def _Daily(tmp_path, ndays=10, seed=0):
+    rng = np.random.default_rng(seed)
+    raw = tmp_path / 'raw'
+    raw.mkdir()
+    files, data = [], []
+    for day in range(1, ndays+1):
+        arr = np.round(rng.uniform(-0.1, 0.9, (len(LAT), len(LON))), 4)
+        arr[rng.random(arr.shape) < 0.3] = np.nan            # Clouds
+        files.append(_WriteDaily(raw, '198107%02d' % day, arr))
+        data.append(arr)
+    rows = (LAT >= EXTENT[2]) & (LAT <= EXTENT[3])
+    cols = (LON >= EXTENT[0]) & (LON <= EXTENT[1])
+    data = np.stack(data)
+    return files, data, data[:, rows][:, :, cols]
+
+
+def test_composites_match_numpy(tmp_path):
+    files, _, data = _Daily(tmp_path)
+    comp = MonthlyComposite(str(tmp_path / 'comp'), EXTENT)
+    for filn in files:
+        assert str(comp.add(filn)) == '1981-07'
+    # Raw files are removed after they are accumulated
+    assert os.listdir(str(tmp_path / 'raw')) == []
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')                     # All-NaN cells
+        mean, vmax = np.nanmean(data, axis=0), np.nanmax(data, axis=0)
+    np.testing.assert_allclose(comp.composite('1981-07'), mean, rtol=1e-6)
+    np.testing.assert_allclose(comp.composite('1981-07', 'max'), vmax, rtol=1e-6)
+    np.testing.assert_array_equal(comp.composite('1981-07', 'count'), np.isfinite(data).sum(0))
+    tim, lat, lon, stack = comp.stack()
+    assert [str(t) for t in tim] == ['1981-07']
+    assert stack.shape == (1,) + data.shape[1:]
+
+
+def test_resume_after_restart(tmp_path):
+    files, full, data = _Daily(tmp_path)
+    comp = MonthlyComposite(str(tmp_path / 'comp'), EXTENT)
+    for filn in files[:6]:
+        comp.add(filn)
+    # Restart: accumulated files are skipped (and removed) without double counting
+    comp = MonthlyComposite(str(tmp_path / 'comp'), EXTENT)
+    assert comp.months == {}
+    assert len(comp.ingested) == 6
+    again = _WriteDaily(tmp_path / 'raw', '19810703', full[2])
+    assert comp.add(again) is None
+    assert not os.path.exists(again)
+    for filn in files[6:]:
+        comp.add(filn, remove=False)
+    assert all(os.path.exists(filn) for filn in files[6:])
+    np.testing.assert_array_equal(comp.composite('1981-07', 'count'), np.isfinite(data).sum(0))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        np.testing.assert_allclose(comp.composite('1981-07'), np.nanmean(data, axis=0), rtol=1e-6)
+    assert DateFromFilename(files[-1]).day == 10
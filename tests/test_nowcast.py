@@ -0,0 +1,95 @@
+import json
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks import synthetic
+from benchmarks.run import _PredOfDistrict
+from pcyf import PCYF, PCYFNowcast
+
+
+def _Panel():
+    crop, pred = synthetic.YieldPanel(1, 20)
+    pid = crop.columns[0]
+    dfCrop = crop[pid].dropna()
+    dfCrop = dfCrop[dfCrop.index.month == 2]
+    return dfCrop, _PredOfDistrict(pred, pid), pid
+
+
+def _Months(target):
+    # Months of predictors in the season of a target
+    target = pd.Period(target, freq='M')
+    return [target - k for k in range(11, 0, -1)]
+
+
+def _Values(dfPred, month):
+    row = dfPred.loc[month]
+    return {v: row[v] for v in ['prcp', 'smos', 'etos']}
+
+
+def _Feed(nc, dfPred, months):
+    for month in months:
+        nc.update(month, _Values(dfPred, month))
+
+
+def test_nowcast_matches_pcyf_refit_across_seasons():
+    dfCrop, dfPred, pid = _Panel()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        outbox = PCYF(dfCrop, dfPred, 2, [4, 3, 2, 1], pid=pid).outbox
+        nc = PCYFNowcast(dfCrop.iloc[:-2], dfPred, 2, [4, 3, 2, 1], pid=pid)
+    # Forecasts of the last two records are those of the last folds of PCYF
+    for k in [-2, -1]:
+        _Feed(nc, dfPred, _Months(dfCrop.index[k]))
+        assert sorted(nc.forecast) == ['m01', 'm02', 'm03', 'm04']
+        for key, fc in nc.forecast.items():
+            assert fc['target'] == pd.Period(dfCrop.index[k], freq='M')
+            np.testing.assert_allclose(fc['yHat'], outbox[key]['yTestHat'][k, 0], rtol=1e-10)
+        if k == -2:
+            nc.add_record(dfCrop.iloc[k])
+            assert nc.forecast == {}
+            # Restored in the middle of the next season
+            nc = PCYFNowcast.from_state(json.loads(json.dumps(nc.to_state())))
+
+
+def test_update_after_target_requires_record():
+    dfCrop, dfPred, pid = _Panel()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        nc = PCYFNowcast(dfCrop.iloc[:-1], dfPred, 2, [4, 3, 2, 1], pid=pid)
+    target = pd.Period(dfCrop.index[-1], freq='M')
+    with pytest.raises(ValueError, match='add_record'):
+        nc.update(target, _Values(dfPred, target))
+    # A missing record moves to the next season without update
+    nc.add_record(np.nan)
+    assert nc.target == nc._MonthNumber(target + 12)
+    assert nc.update(target, _Values(dfPred, target)) == {}
+
+
+def test_restored_state_continues_updates():
+    dfCrop, dfPred, pid = _Panel()
+    months = _Months(dfCrop.index[-1])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        full = PCYFNowcast(dfCrop.iloc[:-1], dfPred, 2, [4, 3, 2, 1], pid=pid)
+        part = PCYFNowcast(dfCrop.iloc[:-1], dfPred, 2, [4, 3, 2, 1], pid=pid)
+    # Stop the partial nowcast before the last two months and restore it from JSON
+    _Feed(full, dfPred, months[:-2])
+    _Feed(part, dfPred, months[:-2])
+    restored = PCYFNowcast.from_state(json.loads(json.dumps(part.to_state())))
+    assert restored.target == full.target
+    assert restored.values == full.values
+    for lead, fit in full.fitted.items():
+        np.testing.assert_allclose(restored.fitted[lead]['sxx'], fit['sxx'])
+        assert restored.fitted[lead]['combs'] == fit['combs']
+    for month in months[-2:]:
+        a = restored.update(month, _Values(dfPred, month))
+        b = full.update(month, _Values(dfPred, month))
+        assert a.keys() == b.keys()
+        for key in b:
+            assert a[key]['target'] == b[key]['target']
+            np.testing.assert_allclose(a[key]['yHat'], b[key]['yHat'], rtol=1e-12)
+    assert sorted(restored.forecast) == ['m01', 'm02', 'm03', 'm04']
+    assert restored.to_state() == full.to_state()
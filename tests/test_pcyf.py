@@ -0,0 +1,87 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.offsets import MonthEnd
+from scipy import stats
+
+from benchmarks import synthetic
+from benchmarks.run import _PredOfDistrict
+from pcyf import PCYF, PCYFBatch
+
+
+def test_corr_matches_pearsonr_per_column():
+    rng = np.random.default_rng(0)
+    y = rng.normal(size=20)
+    x = rng.normal(size=(20, 15)) + 0.3*y[:,None]*np.arange(15)/15
+    x[:,3] = 2.0                                        # Constant column
+    corr, sign = PCYF.__new__(PCYF)._Corr2D1D(x, y)
+    for k in range(x.shape[1]):
+        if k == 3:
+            assert np.isnan(corr[k]) and np.isnan(sign[k])
+            continue
+        r, p = stats.pearsonr(x[:,k], y)
+        np.testing.assert_allclose(corr[k], r, rtol=1e-12)
+        np.testing.assert_allclose(sign[k], p, rtol=1e-9)
+
+
+def test_lag_sums_match_label_lookup():
+    rng = np.random.default_rng(1)
+    idx = pd.date_range('1990-01-31', periods=240, freq=MonthEnd())
+    sr = pd.Series(rng.normal(size=len(idx)), index=idx)
+    time = idx[(idx.month == 2) & (idx.year > 1990)]
+    lead = [4, 3, 2, 1]
+    model = PCYF.__new__(PCYF)
+    data_sum, combs = model._AllCombLeadMonth(sr, time, lead)
+    # Summations of label lookups of every combination (as of the per-fold rebuild)
+    expect = np.array([sum(sr[time - MonthEnd(m)].values for m in comb)
+                       for comb in model._AllCombinations(lead)]).T
+    np.testing.assert_allclose(data_sum, expect, rtol=1e-12)
+    assert combs[0] == [10] and combs[-1] == [10, 11, 12, 1]
+    # PeriodIndex gives the same sums
+    psum, _ = model._AllCombLeadMonth(sr.to_period('M'), time.to_period('M'), lead)
+    np.testing.assert_array_equal(psum, data_sum)
+
+
+def test_incremental_matches_default_walk_forward():
+    crop, pred = synthetic.YieldPanel(3, 25)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for pid in crop.columns:
+            dfPred = _PredOfDistrict(pred, pid)
+            a = PCYF(crop[pid], dfPred, 2, [4, 3, 2, 1], pid=pid, incremental=True).outbox
+            b = PCYF(crop[pid], dfPred, 2, [4, 3, 2, 1], pid=pid).outbox
+            for key in ['m04', 'm03', 'm02', 'm01']:
+                np.testing.assert_allclose(a[key]['yTestHat'], b[key]['yTestHat'], rtol=1e-9)
+                np.testing.assert_allclose(a[key]['msess'], b[key]['msess'], rtol=1e-9)
+                assert a[key]['gss'] == b[key]['gss']
+                # Coefficients of the last fold (standardized)
+                np.testing.assert_allclose(np.ravel(a[key]['coef']), np.ravel(b[key]['regr'].coef_),
+                                           rtol=1e-8)
+
+
+def test_batch_matches_per_district_with_missing_years():
+    crop, pred = synthetic.YieldPanel(4, 25)
+    pids = crop.columns
+    crop.loc[crop.index[[4, 30]], pids[1]] = np.nan     # Missing years of a district
+    crop.loc[crop.index[:20], pids[2]] = np.nan         # Shorter records
+    crop.loc[:, pids[3]] = np.nan                       # No records (STATUS_CODE 110)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        batch = PCYFBatch(crop, pred, 2, [4, 3, 2, 1])
+        time = batch.outbox['time']
+        for d, pid in enumerate(pids):
+            box = PCYF(crop[pid], _PredOfDistrict(pred, pid), 2, [4, 3, 2, 1], pid=pid).outbox
+            assert batch.outbox['status'][pid] == box['status']
+            if box['status'] != 0:
+                assert np.isnan(batch.outbox['yTestHat'][:,d]).all()
+                continue
+            for i, lead in enumerate([4, 3, 2, 1]):
+                mbox = box['m%02d' % lead]
+                itest = time.get_indexer(mbox['yTest'].index)
+                np.testing.assert_allclose(batch.outbox['yTestHat'][itest,d,i], mbox['yTestHat'][:,0],
+                                           rtol=1e-9)
+                np.testing.assert_allclose(batch.msess.loc[pid, 'mse%02d' % lead], mbox['msess'],
+                                           rtol=1e-9)
+                np.testing.assert_allclose(batch.gss.loc[pid, 'gss%02d' % lead], mbox['gss'],
+                                           rtol=1e-9)
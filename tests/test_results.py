@@ -0,0 +1,95 @@
+import io
+import contextlib
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks import synthetic
+from benchmarks.run import _PredOfDistrict
+from results import ResultStore, LoadResultStore
+from pcyf import PCYF
+from sspred import SSPRED
+
+
+def _AssertStoresEqual(a, b):
+    for name in ['skill', 'series']:
+        for field in getattr(a, name).dtype.names:
+            np.testing.assert_array_equal(getattr(a, name)[field], getattr(b, name)[field])
+    np.testing.assert_array_equal(a.coef, b.coef)
+    np.testing.assert_array_equal(a.xlead, b.xlead)
+
+
+def test_pcyf_store_without_outbox():
+    crop, pred = synthetic.YieldPanel(2, 20)
+    years = np.unique(crop.index.year)
+    direct = ResultStore(crop.columns, [4, 3, 2, 1], years)
+    written = ResultStore(crop.columns, [4, 3, 2, 1], years)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for pid in crop.columns:
+            dfPred = _PredOfDistrict(pred, pid)
+            box = PCYF(crop[pid], dfPred, 2, [4, 3, 2, 1], pid=pid, store=direct)
+            assert set(box.outbox.keys()) == {'pid', 'status'}
+            written.write(pid, PCYF(crop[pid], dfPred, 2, [4, 3, 2, 1], pid=pid).outbox)
+    _AssertStoresEqual(direct, written)
+
+
+def test_sspred_store_without_outbox():
+    dfFlow, dfPred, leadMat = synthetic.FlowRecords(1, 30)
+    years = np.unique(dfFlow.index.year)
+    direct = ResultStore([1], range(1, 13), years, model='SSPRED')
+    written = ResultStore([1], range(1, 13), years, model='SSPRED')
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore')
+        box = SSPRED(dfFlow[1], dfPred, leadMat, 1, store=direct)
+        written.write(1, SSPRED(dfFlow[1], dfPred, leadMat, 1).outbox)
+    assert not any(key.startswith('m') for key in box.outbox)
+    _AssertStoresEqual(direct, written)
+
+
+def test_years_outside_store_raise():
+    crop, pred = synthetic.YieldPanel(1, 20)
+    pid = crop.columns[0]
+    store = ResultStore([pid], [4, 3, 2, 1], np.unique(crop.index.year)[:-2])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        outbox = PCYF(crop[pid], _PredOfDistrict(pred, pid), 2, [4, 3, 2, 1], pid=pid).outbox
+    with pytest.raises(KeyError):
+        store.write(pid, outbox)
+    other = ResultStore([pid], [4, 3, 2, 1], np.unique(crop.index.year))
+    other.write(pid, outbox)
+    with pytest.raises(KeyError):
+        store.update(other)
+
+
+def test_save_load_keeps_integer_pids(tmp_path):
+    crop, pred = synthetic.YieldPanel(2, 20)
+    years = np.unique(crop.index.year)
+    store = ResultStore([101, 102], [4, 3, 2, 1], years)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for pid, col in zip([101, 102], crop.columns):
+            store.write(pid, PCYF(crop[col], _PredOfDistrict(pred, col), 2, [4, 3, 2, 1], pid=pid).outbox)
+    filn = str(tmp_path / 'store.npz')
+    store.save(filn)
+    loaded = LoadResultStore(filn)
+    assert loaded.pids.tolist() == [101, 102]
+    pd.testing.assert_frame_equal(loaded.forecast(101, 4), store.forecast(101, 4))
+    _AssertStoresEqual(loaded, store)
+
+    names = ResultStore(['SO2001', 'SO2002'], [4], years)
+    names.save(filn)
+    assert LoadResultStore(filn).pids.tolist() == ['SO2001', 'SO2002']
+
+
+def test_more_predictors_than_store_raise():
+    crop, pred = synthetic.YieldPanel(1, 20)
+    pid = crop.columns[0]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        outbox = PCYF(crop[pid], _PredOfDistrict(pred, pid), 2, [4, 3, 2, 1], pid=pid).outbox
+    store = ResultStore([pid], [4, 3, 2, 1], np.unique(crop.index.year), npred=2)
+    with pytest.raises(ValueError, match='npred=2'):
+        store.write(pid, outbox)
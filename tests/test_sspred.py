@@ -0,0 +1,82 @@
+import contextlib
+import io
+import warnings
+from itertools import product
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import StandardScaler
+
+import sspred
+from benchmarks import synthetic
+from sspred import SSPRED
+
+
+def _Run(**kwargs):
+    dfFlow, dfPred, leadMat = synthetic.FlowRecords(1, 30)
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore')
+        return SSPRED(dfFlow[1], dfPred, leadMat, 1, targMonth=5, **kwargs).outbox['m05']
+
+
+def test_small_space_is_searched_exhaustively():
+    full = _Run()
+    bnb = _Run(search='bnb')
+    assert full['nComb'] < sspred.BNB_MIN_COMB
+    assert bnb['search'] == full['search'] == 'exhaustive'
+    assert bnb['nBound'] == 0 and bnb['nEval'] == bnb['nComb']
+    assert bnb['xLeadOptm'] == full['xLeadOptm']
+
+
+def test_pcr_branch_and_bound_is_labelled_heuristic(monkeypatch):
+    monkeypatch.setattr(sspred, 'BNB_MIN_COMB', 0)
+    bnb = _Run(search='bnb')
+    assert len(bnb['xLeadOptm']) > 1
+    assert bnb['search'] == 'bnb_heuristic'
+    assert 0 < bnb['nBound'] < bnb['nComb']
+
+
+def test_branch_and_bound_is_exact_for_lr():
+    rng = np.random.default_rng(1)
+    ss = SSPRED.__new__(SSPRED)
+    for _ in range(5):
+        xCand = [rng.normal(size=(25, 6)) + rng.normal(size=(25, 1)) for _ in range(3)]
+        y = xCand[0][:,1] + 0.5*xCand[1][:,4] + rng.normal(size=25)
+        order = [rng.permutation(6) for _ in range(3)]
+        combIdx = np.array(list(product(range(6), repeat=3)))
+        mse = ss._LOOCV(xCand, combIdx, y, 3)
+        optmIdx, nEval, nBound = ss._SearchLead(xCand, order, y, 3)
+        assert tuple(optmIdx) == tuple(combIdx[np.argmin(mse)])
+        assert nEval <= len(combIdx)
+
+
+def _RefitLOOCV(ss, x, y, npc):
+    # Refits StandardScaler (sample STDEV) and LR or _PCR for every left-out year
+    yPred = np.zeros(len(y))
+    for ip in range(len(y)):
+        keep = np.arange(len(y)) != ip
+        scale_x = StandardScaler().fit(x[keep])
+        scale_x.scale_ = np.std(x[keep], axis=0, ddof=1)
+        scale_y = StandardScaler().fit(y[keep,None])
+        scale_y.scale_ = np.std(y[keep], axis=0, ddof=1)
+        xTemp, yTemp = scale_x.transform(x[keep]), scale_y.transform(y[keep,None])
+        if npc == x.shape[1]:
+            regr = LinearRegression().fit(xTemp, yTemp)
+        else:
+            regr = ss._PCR(xTemp, yTemp, npc)
+        yHat = regr.predict(scale_x.transform(x[ip:ip+1]))
+        yPred[ip] = scale_y.inverse_transform(np.reshape(yHat, (-1, 1))).item()
+    return np.mean((y - yPred)**2)
+
+
+def test_closed_form_loocv_matches_refits():
+    rng = np.random.default_rng(2)
+    ss = SSPRED.__new__(SSPRED)
+    y = rng.normal(size=18)
+    for nPred, npc in [(1, 1), (3, 2), (3, 3)]:
+        xCand = [rng.normal(size=(18, 4)) + 0.5*y[:,None] for _ in range(nPred)]
+        combIdx = np.array(list(product(range(4), repeat=nPred)))[::5]
+        mse = ss._LOOCV(xCand, combIdx, y, npc, chunk=3)
+        for c, idx in enumerate(combIdx):
+            x = np.column_stack([xCand[k][:,il] for k, il in enumerate(idx)])
+            np.testing.assert_allclose(mse[c], _RefitLOOCV(ss, x, y, npc), rtol=1e-9)
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+shp = pytest.importorskip('shapefile')
+gpd = pytest.importorskip('geopandas')
+tools = pytest.importorskip('tools')
+
+
+def test_grid_box_shapefile_round_trip(tmp_path):
+    filn = str(tmp_path / 'grid.shp')
+    extent, dx, dy, sub_extent = [40.0, 44.0, -2.0, 1.0], 0.5, 0.5, [41.2, 42.6, -1.3, 0.2]
+    tools.CreateGridBox_subextent(filn, extent, dx, dy, sub_extent, set_print=False)
+    ids, bounds = tools.GridBoxArray(extent, dx, dy, sub_extent)
+
+    r = shp.Reader(filn)
+    assert r.shapeType == shp.POLYGON
+    assert [f[0] for f in r.fields[1:]] == ['ID']
+    assert [int(rec[0]) for rec in r.records()] == ids.tolist()
+    for s, (minx, miny, maxx, maxy) in zip(r.shapes(), bounds):
+        # Clockwise ring from the top-left vertex
+        assert s.points == [(minx, maxy), (maxx, maxy), (maxx, miny), (minx, miny), (minx, maxy)]
+        np.testing.assert_allclose(s.bbox, [minx, miny, maxx, maxy])
+    r.close()
+
+    grid = gpd.read_file(filn)
+    assert grid.crs.to_epsg() == 4326
+    np.testing.assert_allclose(grid.total_bounds, [41.0, -1.5, 43.0, 0.5])
+    np.testing.assert_allclose([g.area for g in grid.geometry], dx*dy)
+
+
+def test_create_grid_box_ids(tmp_path):
+    filn = str(tmp_path / 'grid_full.shp')
+    tools.CreateGridBox(filn, [0.0, 3.0, 0.0, 2.0], 1.0, 1.0, set_print=False)
+    grid = gpd.read_file(filn)
+    assert grid['ID'].astype(int).tolist() == list(range(6))
+    # Row-major from the top-left
+    np.testing.assert_allclose(grid.geometry[4].bounds, [1.0, 0.0, 2.0, 1.0])
+
+
+def test_bulk_writer_matches_pyshp(tmp_path):
+    extent, dx, dy, sub_extent = [40.0, 50.0, -2.0, 8.0], 0.05, 0.05, [41.03, 43.2, 0.1, 1.77]
+    ids, bounds = tools.GridBoxArray(extent, dx, dy, sub_extent)
+    tools._WritePolygonShapefile(str(tmp_path / 'bulk.shp'), ids, bounds)
+    w = shp.Writer(str(tmp_path / 'loop.shp'), shp.POLYGON)
+    w.field("ID")
+    for id, (minx, miny, maxx, maxy) in zip(ids.tolist(), bounds.tolist()):
+        w.poly([[[minx, maxy], [maxx, maxy], [maxx, miny], [minx, miny], [minx, maxy]]])
+        w.record(id)
+    w.close()
+    for ext in ['shp', 'shx', 'dbf']:
+        bulk = (tmp_path / ('bulk.%s' % ext)).read_bytes()
+        loop = (tmp_path / ('loop.%s' % ext)).read_bytes()
+        assert bulk == loop, ext
+
+
+@pytest.mark.filterwarnings('ignore:Geometry is in a geographic CRS')
+def test_intersect_grid_matches_overlay():
+    from benchmarks import synthetic
+    extent, dx, dy, sub_extent = synthetic.GridSpec(ncol=40, nrow=40, dx=0.25, dy=0.25)
+    adm = synthetic.AdminPolygons(npoly=12, sub_extent=sub_extent)
+    grid = tools.GridBoxPolygons(extent, dx, dy, sub_extent)
+    ref = gpd.overlay(adm, grid, how='intersection', keep_geom_type=True)
+    out = tools.IntersectGrid(adm, extent, dx, dy, set_print=False)
+    area = [df.assign(area=df.geometry.area).groupby(['FNID', 'ID'])['area'].sum()
+            for df in [ref, out]]
+    area = [a[a > 1e-12] for a in area]                 # Cells touching at edges
+    assert sorted(area[0].index) == sorted(area[1].index)
+    np.testing.assert_allclose(area[1].reindex(area[0].index).values, area[0].values, rtol=1e-9)
+    # Areas of polygons are fully covered by the cells
+    np.testing.assert_allclose(out.dissolve('FNID').area.reindex(adm.FNID).values, adm.area.values,
+                               rtol=1e-9)
+
+
+def test_save_hdf_profiles_round_trip(tmp_path):
+    tables = pytest.importorskip('tables')
+    import pandas as pd
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(50, 4)), columns=list('abcd'),
+                      index=pd.period_range('2000-01', periods=50, freq='M').to_timestamp())
+    with tools._BloscThreads(3):
+        with pd.HDFStore(str(tmp_path / 'threads.hdf'), mode='w') as store:
+            assert store._handle.params['MAX_BLOSC_THREADS'] == 3
+    default = tables.parameters.MAX_BLOSC_THREADS
+    for profile, (complib, complevel) in tools.HDF_PROFILES.items():
+        filn = str(tmp_path / ('%s.hdf' % profile))
+        tools.save_hdf(filn, df, set_print=False, profile=profile, nthreads=2)
+        pd.testing.assert_frame_equal(pd.read_hdf(filn, 'df'), df)
+        with tables.open_file(filn) as h5:
+            leaves = list(h5.walk_nodes('/', 'Leaf'))
+            assert all(leaf.filters.complib == complib for leaf in leaves)
+            assert all(leaf.filters.complevel == complevel for leaf in leaves)
+    # Thread count of blosc is restored after the writes
+    assert tables.parameters.MAX_BLOSC_THREADS == default
+
+    filn = str(tmp_path / 'table.hdf')
+    tools.save_hdf(filn, df, set_print=False, profile='fast', format='table')
+    pd.testing.assert_frame_equal(pd.read_hdf(filn, 'df', where='index >= "2003-01-01"'),
+                                  df[df.index >= '2003-01-01'])
+    frames = {'x%d' % k: df*k for k in range(3)}
+    tools.save_hdf_batch(filn, frames, set_print=False, profile='balanced', nthreads=2)
+    with pd.HDFStore(filn, mode='r') as store:
+        assert sorted(store.keys()) == ['/df', '/x0', '/x1', '/x2']
+        for key, frame in frames.items():
+            pd.testing.assert_frame_equal(store[key], frame)
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from zonal import AreaWeightMatrix, SubextentWindow, ZonalMean, ZonalMeanStream, ReadNetCDFChunks
+
+
+def _Weights():
+    # 4 x 4 base grid; A in the left half, B in the right column, C across the middle
+    table = pd.DataFrame({'ID': [0, 1, 4, 5, 3, 7, 9, 10],
+                          'FNID': ['A', 'A', 'A', 'A', 'B', 'B', 'C', 'C'],
+                          'area_km2': [1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 3.0]})
+    return AreaWeightMatrix(table, 16, zones=['A', 'B', 'C'])
+
+
+def test_zonal_mean_stream_window_renormalized():
+    W, zones = _Weights()
+    data = np.arange(16, dtype=float).reshape(1, 4, 4)
+    window = SubextentWindow([0, 4, 0, 4], 1, 1, [0, 2, 0, 4])
+    chunks = [(pd.period_range('2000-01', periods=1, freq='M'), data[:, :, window['col']])]
+    mean = ZonalMeanStream(chunks, W, zones, window=window)
+    assert mean['A'].iloc[0] == pytest.approx(np.mean([0, 1, 4, 5]))
+    # Only cell 9 of C is in the window
+    assert mean['C'].iloc[0] == pytest.approx(9.0)
+    # B is outside the window
+    assert np.isnan(mean['B'].iloc[0])
+
+
+def test_zonal_mean_full_grid():
+    W, zones = _Weights()
+    data = np.arange(16, dtype=float).reshape(1, -1)
+    mean = ZonalMean(data, W)
+    np.testing.assert_allclose(mean[0], [2.5, 5.0, (9 + 3*10)/4])
+
+
+def test_read_netcdf_chunks_daily(tmp_path):
+    netCDF4 = pytest.importorskip('netCDF4')
+    filn = str(tmp_path / 'daily.nc')
+    with netCDF4.Dataset(filn, 'w') as nc:
+        nc.createDimension('time', 40)
+        nc.createDimension('lat', 2)
+        nc.createDimension('lon', 3)
+        tim = nc.createVariable('time', 'f8', ('time',))
+        tim.units = 'days since 2001-01-01'
+        tim[:] = np.arange(40)
+        var = nc.createVariable('ndvi', 'f4', ('time', 'lat', 'lon'))
+        var[:] = np.ones([40, 2, 3])
+    tim = pd.PeriodIndex(np.concatenate([t for t, _ in ReadNetCDFChunks(filn, 'ndvi', chunk=16)]))
+    assert tim.is_unique
+    assert tim.freqstr == 'D'
+    assert str(tim[-1]) == '2001-02-09'
+
+
+def test_cached_weights_match_recompute(tmp_path, monkeypatch):
+    pytest.importorskip('geopandas')
+    tools = pytest.importorskip('tools')
+    from benchmarks import synthetic
+    from zonal import CachedAreaWeights
+    extent, dx, dy, sub_extent = synthetic.GridSpec(ncol=20, nrow=20, dx=0.5, dy=0.5)
+    filn = str(tmp_path / 'adm' / 'adm.shp')
+    synthetic.AdminPolygons(npoly=8, sub_extent=sub_extent, filn=filn)
+    cache_dir = str(tmp_path / 'weights')
+    intersect = tools.IntersectGrid
+    calls = []
+
+    def counting(*args, **kwargs):
+        calls.append(args[0])
+        return intersect(*args, **kwargs)
+
+    monkeypatch.setattr(tools, 'IntersectGrid', counting)
+    kwargs = dict(cache_dir=cache_dir, set_print=False)
+    W, zones = CachedAreaWeights(filn, extent, dx, dy, **kwargs)
+    W1, zones1 = CachedAreaWeights(filn, extent, dx, dy, **kwargs)
+    assert len(calls) == 1
+    W2, zones2 = CachedAreaWeights(filn, extent, dx, dy, rebuild=True, **kwargs)
+    assert len(calls) == 2
+    for Wk, zk in [(W1, zones1), (W2, zones2)]:
+        assert list(zk) == list(zones)
+        assert (Wk != W).nnz == 0
+    # Modified boundaries are not served from the cache
+    synthetic.AdminPolygons(npoly=8, sub_extent=sub_extent, seed=1, filn=filn)
+    W3, _ = CachedAreaWeights(filn, extent, dx, dy, **kwargs)
+    assert len(calls) == 3
+    assert (W3 != W).nnz > 0
@@ -1,4 +1,7 @@
 import os
+import time
+import struct
+from contextlib import contextmanager
 import numpy as np
 import pandas as pd
 import geopandas as gpd
@@ -57,6 +60,193 @@ def IntersectShapefiles(refSHP, admSHP, outSHP, set_print=True):
 
     
     
+def IntersectGrid(admSHP, extent, dx, dy, outSHP=None, epsg=None, set_print=True):
+    '''Intersects a regular grid with administrative polygons
+
+    Since the reference layer is a regular grid, candidate cells of each polygon
+    are computed arithmetically from its bounds. Cells fully inside the polygon
+    (prepared-geometry contains test) are kept without clipping, and only
+    boundary cells are clipped. Geometry operations are vectorized per polygon.
+
+    Parameters
+    ----------
+    admSHP: str or GeoDataFrame
+        administrative polygons (e.g., './data/shapefile/SO_admin2_1990_revised.shp')
+    extent: list
+        [minx,maxx,miny,maxy] of the grid
+    dx: value
+        degree of x
+    dy: value
+        degree of y
+    outSHP: str
+        filename of the intersected shapefile (optional)
+    epsg: int
+        projected coordinate system to calculate "area_km2" (e.g., 20538)
+
+    Returns
+    -------
+    grid_dist: GeoDataFrame
+        intersected polygons with attributes of admSHP and "ID" of grid cells
+        (global row-major IDs of the grid as CreateGridBox_subextent)
+    '''
+    import shapely
+    adm = gpd.read_file(admSHP) if isinstance(admSHP, str) else admSHP
+    width = int(np.round((extent[1] - extent[0])/dx))
+    height = int(np.round((extent[3] - extent[2])/dy))
+    props, ids, geoms = [], [], []
+    for k, geom in enumerate(adm.geometry.values):
+        if geom is None or geom.is_empty:
+            continue
+        # Candidate cells from the bounds of the polygon
+        minx, miny, maxx, maxy = geom.bounds
+        c0 = max(int(np.floor((minx - extent[0])/dx)), 0)
+        c1 = min(int(np.ceil((maxx - extent[0])/dx)), width)
+        r0 = max(int(np.floor((extent[3] - maxy)/dy)), 0)
+        r1 = min(int(np.ceil((extent[3] - miny)/dy)), height)
+        if (c1 <= c0) or (r1 <= r0):
+            continue
+        row, col = np.meshgrid(np.arange(r0, r1), np.arange(c0, c1), indexing='ij')
+        row, col = row.ravel(), col.ravel()
+        boxes = shapely.box(extent[0] + dx*col, extent[3] - dy*(row+1),
+                            extent[0] + dx*(col+1), extent[3] - dy*row, ccw=False)
+        # Interior cells are kept as they are and boundary cells are clipped
+        shapely.prepare(geom)
+        inside = shapely.contains(geom, boxes)
+        touch = ~inside & shapely.intersects(geom, boxes)
+        pieces = boxes.copy()
+        pieces[touch] = shapely.intersection(boxes[touch], geom)
+        keep = inside | (touch & (shapely.area(pieces) > 0))
+        ids.append(row[keep]*width + col[keep])
+        geoms.append(pieces[keep])
+        props.append(np.full(keep.sum(), k))
+    props = np.concatenate(props) if len(props) > 0 else np.array([], dtype=int)
+    grid_dist = gpd.GeoDataFrame(adm.drop(columns='geometry').iloc[props].reset_index(drop=True),
+                                 geometry=np.concatenate(geoms) if len(geoms) > 0 else [],
+                                 crs=adm.crs)
+    grid_dist['ID'] = np.concatenate(ids) if len(ids) > 0 else np.array([], dtype=int)
+    if epsg is not None:
+        # Caculate areas of all split polygons
+        grid_dist['area_km2'] = grid_dist.geometry.to_crs(epsg=epsg).area / 10**6
+    if outSHP is not None:
+        grid_dist.to_file(outSHP)
+        if set_print:
+            print('%s is saved.' % outSHP)
+    return grid_dist
+
+
+def GridBoxArray(extent, dx, dy, sub_extent=None):
+    '''Returns IDs and bounds of all grid cells with NumPy broadcasting
+    
+    Parameters
+    ----------
+    extent: list
+        [minx,maxx,miny,maxy]
+    dx: value
+        degree of x
+    dy: value
+        degree of y
+    sub_extent: list
+        [minx,maxx,miny,maxy] of the sub-extent (optional). The sub-extent is
+        snapped to the grid of extent, and IDs of the cells are global IDs
+        (row-major) of the grid of extent.
+
+    Returns
+    -------
+    ids: 1d ndarray
+        n IDs of grid cells (row-major from the top-left)
+    bounds: 2d ndarray
+        n x 4 array of [minx,miny,maxx,maxy] of grid cells
+    '''
+    if sub_extent is None:
+        minx,maxx,miny,maxy = extent
+        nx = int(math.ceil(abs(maxx - minx)/dx))
+        ny = int(math.ceil(abs(maxy - miny)/dy))
+        id0, width = 0, nx
+    else:
+        # Size of extent
+        width = np.round((extent[1] - extent[0])/dx)
+        # Adjust sub_extent with base grid extent
+        minx = extent[0] + np.floor((sub_extent[0] - extent[0])/dx)*dx
+        maxx = extent[0] + np.ceil((sub_extent[1] - extent[0])/dx)*dx
+        maxy = extent[3] - np.floor((extent[3] - sub_extent[3])/dy)*dy
+        miny = extent[3] - np.ceil((extent[3] - sub_extent[2])/dy)*dy
+        # Index of sub_extent
+        left = np.floor((minx - extent[0])/dx)
+        top = np.floor((extent[3] - maxy)/dy)
+        nx = int(math.ceil(abs(maxx - minx)/dx))
+        ny = int(math.ceil(abs(maxy - miny)/dy))
+        id0 = int(top*width+left)     # Initial ID
+        width = int(width)
+    # Vertices of all grid cells
+    i = np.arange(ny)[:,None]
+    j = np.arange(nx)[None,:]
+    x0 = np.minimum(minx+dx*j, maxx)
+    x1 = np.minimum(minx+dx*(j+1), maxx)
+    y0 = np.maximum(maxy-dy*i, miny)
+    y1 = np.maximum(maxy-dy*(i+1), miny)
+    ids = (id0 + i*width + j).ravel()
+    bounds = np.stack(np.broadcast_arrays(x0, y1, x1, y0), axis=2).reshape([-1,4])
+    return ids, bounds
+
+
+def GridBoxPolygons(extent, dx, dy, sub_extent=None):
+    '''Returns GeoDataFrame of grid cells without touching disk
+    
+    See GridBoxArray for parameters.
+    '''
+    import shapely
+    ids, bounds = GridBoxArray(extent, dx, dy, sub_extent)
+    geom = shapely.box(bounds[:,0], bounds[:,1], bounds[:,2], bounds[:,3], ccw=False)
+    return gpd.GeoDataFrame({'ID': ids}, geometry=geom, crs='EPSG:4326')
+
+
+def _WritePolygonShapefile(shp_out, ids, bounds):
+    '''Writes rectangles to a polygon shapefile (.shp, .shx, .dbf) in bulk
+    
+    The files are byte-for-byte identical to those written by
+    shapefile.Writer.poly() and record() per grid cell (clockwise rings from
+    the top-left vertex) with an "ID" field of the default type (C, 50).
+    '''
+    filename, _ = os.path.splitext(shp_out)
+    n = len(ids)
+    # Shapes: record header (big-endian) and polygon content (little-endian)
+    rec = np.zeros(n, dtype=[('num','>i4'), ('len','>i4'), ('type','<i4'), ('box','<f8',4),
+                             ('nparts','<i4'), ('npoints','<i4'), ('parts','<i4'), ('pts','<f8',(5,2))])
+    rec['num'] = np.arange(1, n+1)
+    rec['len'] = (rec.itemsize - 8)//2
+    rec['type'] = shp.POLYGON
+    rec['box'] = bounds
+    rec['nparts'] = 1
+    rec['npoints'] = 5
+    minx, miny, maxx, maxy = bounds.T
+    rec['pts'][:,:,0] = np.stack([minx, maxx, maxx, minx, minx], axis=1)
+    rec['pts'][:,:,1] = np.stack([maxy, maxy, miny, miny, maxy], axis=1)
+    # Index
+    idx = np.zeros(n, dtype=[('offset','>i4'), ('len','>i4')])
+    idx['offset'] = (100 + np.arange(n)*rec.itemsize)//2
+    idx['len'] = rec['len']
+    # File headers
+    bbox = [minx.min(), miny.min(), maxx.max(), maxy.max()] if n > 0 else [0,0,0,0]
+    def header(length):
+        return (struct.pack('>6iI', 9994, 0, 0, 0, 0, 0, length//2) +
+                struct.pack('<2i4d4d', 1000, shp.POLYGON, *bbox, 0, 0, 0, 0))
+    with open('%s.shp' % filename, 'wb') as f:
+        f.write(header(100 + rec.nbytes))
+        f.write(rec.tobytes())
+    with open('%s.shx' % filename, 'wb') as f:
+        f.write(header(100 + idx.nbytes))
+        f.write(idx.tobytes())
+    # Attributes
+    size = 50
+    year, month, day = time.localtime()[:3]
+    with open('%s.dbf' % filename, 'wb') as f:
+        f.write(struct.pack('<4BIHH20x', 3, year-1900, month, day, n, 32+33, size+1))
+        f.write(struct.pack('<11sc4xBB14x', b'ID', b'C', size, 0))
+        f.write(b'\r')
+        dbf = np.char.ljust(np.char.add(' ', ids.astype(str)).astype('S%d' % (size+1)), size+1)
+        f.write(dbf.tobytes())
+
+
 def CreateGridBox_subextent(shp_out, extent, dx, dy, sub_extent, set_print=True):
     '''Create grid with degrees of extent, dx, dy of the target box
     
@@ -76,47 +266,11 @@ def CreateGridBox_subextent(shp_out, extent, dx, dy, sub_extent, set_print=True)
     
     Source: https://gis.stackexchange.com/a/81120/29546
     Revised by Donghoon Lee @ Sep-24-2020
+    Vertices of all grid cells are computed at once and written in bulk.
     '''
     
-    # Size of extent
-    width = np.round((extent[1] - extent[0])/dx)
-    height = np.round((extent[3] - extent[2])/dy)
-    
-    # Adjust sub_extent with base grid extent
-    minx = extent[0] + np.floor((sub_extent[0] - extent[0])/dx)*dx
-    maxx = extent[0] + np.ceil((sub_extent[1] - extent[0])/dx)*dx
-    maxy = extent[3] - np.floor((extent[3] - sub_extent[3])/dy)*dy
-    miny = extent[3] - np.ceil((extent[3] - sub_extent[2])/dy)*dy
-    sub_extent = [minx, maxx, miny, maxy]
-    
-    # Index of sub_extent
-    left = np.floor((sub_extent[0] - extent[0])/dx)
-    right = np.floor((sub_extent[1] - extent[0])/dx)
-    top = np.floor((extent[3] - sub_extent[3])/dy)
-    bottom = np.floor((extent[3] - sub_extent[2])/dy)
-    
-    # # Create vertices per each grid
-    nx = int(math.ceil(abs(maxx - minx)/dx))
-    ny = int(math.ceil(abs(maxy - miny)/dy))
-    w = shp.Writer(shp_out, shp.POLYGON)
-    w.autoBalance = 1
-    w.field("ID")
-    id=int(top*width+left)  # Initial ID
-    for i in range(ny):
-        for j in range(nx):
-            vertices = []
-            parts = []
-            vertices.append([min(minx+dx*j,maxx),max(maxy-dy*i,miny)])
-            vertices.append([min(minx+dx*(j+1),maxx),max(maxy-dy*i,miny)])
-            vertices.append([min(minx+dx*(j+1),maxx),max(maxy-dy*(i+1),miny)])
-            vertices.append([min(minx+dx*j,maxx),max(maxy-dy*(i+1),miny)])
-            parts.append(vertices)
-            w.poly(parts)
-            w.record(id)
-            id+=1
-        id+=int(width-nx)
-    w.close()
-    
+    ids, bounds = GridBoxArray(extent, dx, dy, sub_extent)
+    _WritePolygonShapefile(shp_out, ids, bounds)
     
     # Save a projection file (filename.prj)
     filename, _ = os.path.splitext(shp_out)
@@ -147,27 +301,10 @@ def CreateGridBox(shp_out, extent, dx, dy, set_print=True):
     
     Source: https://gis.stackexchange.com/a/81120/29546
     Revised by Donghoon Lee @ Aug-10-2019
+    Vertices of all grid cells are computed at once and written in bulk.
     '''
-    minx,maxx,miny,maxy = extent
-    nx = int(math.ceil(abs(maxx - minx)/dx))
-    ny = int(math.ceil(abs(maxy - miny)/dy))
-    w = shp.Writer(shp_out, shp.POLYGON)
-    w.autoBalance = 1
-    w.field("ID")
-    id=0
-    for i in range(ny):
-        for j in range(nx):
-            vertices = []
-            parts = []
-            vertices.append([min(minx+dx*j,maxx),max(maxy-dy*i,miny)])
-            vertices.append([min(minx+dx*(j+1),maxx),max(maxy-dy*i,miny)])
-            vertices.append([min(minx+dx*(j+1),maxx),max(maxy-dy*(i+1),miny)])
-            vertices.append([min(minx+dx*j,maxx),max(maxy-dy*(i+1),miny)])
-            parts.append(vertices)
-            w.poly(parts)
-            w.record(id)
-            id+=1
-    w.close()
+    ids, bounds = GridBoxArray(extent, dx, dy)
+    _WritePolygonShapefile(shp_out, ids, bounds)
     
     # Save a projection file (filename.prj)
     filename, _ = os.path.splitext(shp_out)
@@ -179,10 +316,88 @@ def CreateGridBox(shp_out, extent, dx, dy, set_print=True):
         print('%s is saved.' % shp_out)
 
     
-def save_hdf(filn, df, set_print=True):
-    df.to_hdf(filn, key='df', complib='blosc:zstd', complevel=9)
+# Compression profiles of save_hdf (complib, complevel)
+HDF_PROFILES = {'fast': ('blosc:lz4', 1),
+                'balanced': ('blosc:zstd', 5),
+                'archive': ('blosc:zstd', 9)}
+
+
+@contextmanager
+def _BloscThreads(nthreads):
+    '''Sets the number of blosc threads of PyTables and restores the previous number
+
+    PyTables applies MAX_BLOSC_THREADS of its parameters whenever a file is
+    opened, so the parameter is set as well as the current number.
+    '''
+    if nthreads is None:
+        yield
+        return
+    import tables
+    default = tables.parameters.MAX_BLOSC_THREADS
+    tables.parameters.MAX_BLOSC_THREADS = nthreads
+    previous = tables.set_blosc_max_threads(nthreads)
+    try:
+        yield
+    finally:
+        tables.parameters.MAX_BLOSC_THREADS = default
+        tables.set_blosc_max_threads(previous)
+
+
+def save_hdf(filn, df, set_print=True, profile='archive', nthreads=None, format='fixed', key='df'):
+    '''Saves DataFrame to HDF with a compression profile
+
+    Parameters
+    ----------
+    filn: str
+        filename of HDF
+    df: DataFrame or Series
+        data to be saved
+    profile: str
+        'fast' (blosc:lz4 1), 'balanced' (blosc:zstd 5), or 'archive' (blosc:zstd 9; default)
+    nthreads: int
+        number of blosc threads during the write (default is the setting of PyTables)
+    format: str
+        'fixed' (default) or 'table' (appendable and queryable)
+    key: str
+        key of HDF (default is 'df')
+    '''
+    complib, complevel = HDF_PROFILES[profile]
+    with _BloscThreads(nthreads):
+        df.to_hdf(filn, key=key, complib=complib, complevel=complevel, format=format)
     if set_print:
         print('%s is saved.' % filn)
+
+
+def save_hdf_batch(filn, frames, set_print=True, profile='archive', nthreads=None, format='fixed',
+                   mode='a'):
+    '''Saves many DataFrames to one HDF with separate keys
+
+    The file is opened once for all frames. HDF5 serializes writes to a file,
+    so the frames are written in turn and the compression of each frame is
+    parallelized with blosc threads (nthreads).
+
+    Parameters
+    ----------
+    filn: str
+        filename of HDF
+    frames: dict
+        {key: DataFrame} to be saved
+    profile: str
+        compression profile (see save_hdf)
+    nthreads: int
+        number of blosc threads
+    format: str
+        'fixed' (default) or 'table'
+    mode: str
+        'a' to add/replace keys of an existing file (default) or 'w' to overwrite the file
+    '''
+    complib, complevel = HDF_PROFILES[profile]
+    with _BloscThreads(nthreads):
+        with pd.HDFStore(filn, mode=mode, complib=complib, complevel=complevel) as store:
+            for key, df in frames.items():
+                store.put(key, df, format=format)
+    if set_print:
+        print('%s is saved (%d keys).' % (filn, len(frames)))
         
         
 # Colarmap and Colorbar controller
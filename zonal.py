@@ -0,0 +1,450 @@
+"""
+This script presents zonal statistics of gridded earth observation (EO) data
+in administrative units with a sparse area-weight matrix.
+
+The intersected grid-district polygons (e.g., output of tools.IntersectShapefiles
+with areas of the split polygons) are assembled once into a (cells x districts)
+scipy.sparse matrix of normalized area weights, which is applied to whole
+time-series of gridded data in a single sparse product. Large EO stacks
+(NetCDF, .npy, GeoTIFF) can be streamed in chunks of time steps restricted to
+the sub-extent window of the districts. Area-weight tables are cached on disk
+with a key of the grid specification and the content of the boundary files,
+so that the GIS work is done only when the grid or the boundaries change.
+
+File name: zonal.py
+Date revised: 10/18/2026
+"""
+__version__ = "1.0"
+__author__ = "Donghoon Lee"
+__maintainer__ = "Donghoon Lee"
+__email__ = "dlee@geog.ucsb.edu"
+
+
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+# Version of the cached weight tables (increase if IntersectGrid changes)
+WEIGHT_CACHE_VERSION = 1
+
+
+def AreaWeightMatrix(grid, ncell, zones=None, id_col='ID', zone_col='FNID', area_col='area_km2'):
+    '''Returns normalized area-weight matrix of grid cells in districts
+
+    Parameters
+    ----------
+    grid: DataFrame, GeoDataFrame, or str
+        intersected grid-district polygons with grid ID, district ID, and area
+        columns (or the filename of the shapefile)
+    ncell: int
+        number of grid cells of the flattened data (e.g., nlat*nlon)
+    zones: list
+        district IDs in the order of columns (default is sorted unique IDs)
+    id_col: str
+        column of grid cell IDs (row-major index of the flattened data)
+    zone_col: str
+        column of district IDs
+    area_col: str
+        column of areas of the intersected polygons
+
+    Returns
+    -------
+    W: scipy.sparse.csr_matrix
+        ncell x nzone matrix of area weights (each column sums to 1)
+    zones: ndarray
+        district IDs of the columns
+    '''
+    if isinstance(grid, str):
+        import geopandas as gpd
+        grid = gpd.read_file(grid)
+    if zones is None:
+        zones = np.sort(grid[zone_col].unique())
+    zones = np.asarray(zones)
+    izone = pd.Index(zones).get_indexer(grid[zone_col])
+    keep = izone >= 0
+    cell = grid[id_col].values.astype(int)[keep]
+    area = grid[area_col].values.astype(float)[keep]
+    izone = izone[keep]
+    # Duplicated pairs (e.g., multi-part polygons) are summed
+    W = sparse.coo_matrix((area, (cell, izone)), shape=(ncell, len(zones))).tocsr()
+    # Normalization by the area of each district
+    total = np.asarray(W.sum(0)).ravel()
+    total[total == 0] = 1
+    W = W.dot(sparse.diags(1/total)).tocsr()
+    return W, zones
+
+
+def SaveWeights(filn, W, zones):
+    '''Saves area-weight matrix and district IDs (.npz)
+    '''
+    W = W.tocsr()
+    np.savez(filn, data=W.data, indices=W.indices, indptr=W.indptr,
+             shape=np.array(W.shape), zones=np.asarray(zones))
+
+
+def LoadWeights(filn):
+    '''Loads area-weight matrix and district IDs saved by SaveWeights
+    '''
+    with np.load(filn, allow_pickle=True) as f:
+        W = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+        zones = f['zones']
+    return W, zones
+
+
+def BoundaryHash(filn):
+    '''Returns SHA-1 hash of the content of a shapefile and its sidecar files
+    (.shp, .shx, .dbf, .prj, and .cpg)
+    '''
+    sha = hashlib.sha1()
+    base = os.path.splitext(filn)[0]
+    for ext in ['.shp', '.shx', '.dbf', '.prj', '.cpg']:
+        if not os.path.exists(base + ext):
+            continue
+        sha.update(ext.encode())
+        with open(base + ext, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                sha.update(block)
+    return sha.hexdigest()
+
+
+def WeightCacheKey(admSHP, extent, dx, dy, epsg, zone_col='FNID'):
+    '''Returns the key of the area-weight table of a grid and boundaries
+    '''
+    spec = {'extent': [float(v) for v in extent], 'dx': float(dx), 'dy': float(dy),
+            'boundary': BoundaryHash(admSHP), 'epsg': epsg, 'zone_col': zone_col,
+            'version': WEIGHT_CACHE_VERSION}
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+def CachedAreaWeights(admSHP, extent, dx, dy, epsg=20538, zone_col='FNID',
+                      cache_dir='./data/weights', rebuild=False, set_print=True):
+    '''Returns area-weight matrix of a grid and boundaries using the disk cache
+
+    The intersection of the grid and the boundaries (tools.IntersectGrid) is
+    computed only if the table of the same grid extent, resolution, boundary
+    files, and projection is not found in cache_dir. Modified boundary files
+    have a different key, so the outdated tables are never reused.
+
+    Parameters
+    ----------
+    admSHP: str
+        filename of the administrative boundaries (e.g., './data/shapefile/SO_admin2_1990_revised.shp')
+    extent: list
+        [minx,maxx,miny,maxy] of the grid
+    dx: value
+        degree of x
+    dy: value
+        degree of y
+    epsg: int
+        projected coordinate system to calculate areas (default is 20538)
+    zone_col: str
+        column of district IDs
+    cache_dir: str
+        directory of the cached tables
+    rebuild: bool
+        True to recompute and overwrite the cached table
+
+    Returns
+    -------
+    W: scipy.sparse.csr_matrix
+        ncell x nzone matrix of area weights of the whole grid
+    zones: ndarray
+        district IDs of the columns
+    '''
+    width = int(np.round((extent[1] - extent[0])/dx))
+    height = int(np.round((extent[3] - extent[2])/dy))
+    key = WeightCacheKey(admSHP, extent, dx, dy, epsg, zone_col)
+    filn = os.path.join(cache_dir, 'weights_%s.npz' % key)
+    if os.path.exists(filn) and not rebuild:
+        with np.load(filn, allow_pickle=True) as f:
+            cell, izone, area, zones = f['cell'], f['izone'], f['area'], f['zones']
+        if set_print:
+            print('%s is loaded.' % filn)
+    else:
+        from tools import IntersectGrid
+        grid = IntersectGrid(admSHP, extent, dx, dy, epsg=epsg)
+        zones = np.sort(grid[zone_col].unique())
+        izone = pd.Index(zones).get_indexer(grid[zone_col]).astype(np.int32)
+        cell = grid['ID'].values.astype(np.int64)
+        area = grid['area_km2'].values.astype(float)
+        # Atomic write of the table
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(filn + '.part', 'wb') as f:
+            np.savez(f, cell=cell, izone=izone, area=area, zones=zones,
+                     shape=np.array([height, width]))
+        os.replace(filn + '.part', filn)
+        if set_print:
+            print('%s is saved.' % filn)
+    table = pd.DataFrame({'ID': cell, zone_col: zones[izone], 'area_km2': area})
+    return AreaWeightMatrix(table, width*height, zones=zones, zone_col=zone_col)
+
+
+def ZonalMean(data, W, zones=None, index=None, nodata=None):
+    '''Returns area-weighted averages of gridded data in districts
+
+    Missing values (NaN or nodata) are excluded and the weights of the valid
+    grid cells are renormalized at each time step. Weights are also
+    renormalized when W covers only part of a district (e.g., rows of a
+    window). Districts without any valid grid cell are NaN.
+
+    Parameters
+    ----------
+    data: ndarray
+        t x ncell array of gridded data (or t x nlat x nlon)
+    W: scipy.sparse matrix
+        ncell x nzone matrix of area weights (see AreaWeightMatrix)
+    zones: list
+        district IDs (returns DataFrame if zones or index is given)
+    index: Index
+        t time steps of the data
+    nodata: value or list
+        values to be considered as missing in addition to NaN
+
+    Returns
+    -------
+    mean: ndarray or DataFrame
+        t x nzone area-weighted averages
+    '''
+    data = np.asarray(data)
+    data = data.reshape([data.shape[0], -1])
+    # Only grid cells within districts are used
+    W = W.tocsr()
+    used = np.where(np.diff(W.indptr) > 0)[0]
+    data = data[:,used].astype(float)
+    WT = W[used].T.tocsr()
+    valid = ~np.isnan(data)
+    if nodata is not None:
+        valid &= ~np.isin(data, nodata)
+    if valid.all():
+        num = WT.dot(data.T).T
+        den = np.asarray(WT.sum(1)).ravel()[None,:]
+    else:
+        # Renormalization with the weights of valid grid cells
+        num = WT.dot(np.where(valid, data, 0).T).T
+        den = WT.dot(valid.T.astype(float)).T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(den > 0, num/den, np.nan)
+    if (zones is not None) or (index is not None):
+        mean = pd.DataFrame(mean, index=index, columns=zones)
+    return mean
+
+
+def SubextentWindow(extent, dx, dy, sub_extent):
+    '''Returns the window of sub_extent in the base grid
+
+    The window is defined in the same way as tools.CreateGridBox_subextent,
+    so that global IDs of the grid cells in the window are consistent with
+    the IDs of the grid shapefile.
+
+    Parameters
+    ----------
+    extent: list
+        [minx,maxx,miny,maxy] of the base grid
+    dx: value
+        degree of x
+    dy: value
+        degree of y
+    sub_extent: list
+        [minx,maxx,miny,maxy] of the target area
+
+    Returns
+    -------
+    window: dict
+        'row' and 'col' slices of the window, 'width' and 'height' of the base
+        grid, and 'ids' of the grid cells in the window (row-major)
+    '''
+    # Size of extent
+    width = int(np.round((extent[1] - extent[0])/dx))
+    height = int(np.round((extent[3] - extent[2])/dy))
+    # Adjust sub_extent with base grid extent
+    minx = extent[0] + np.floor((sub_extent[0] - extent[0])/dx)*dx
+    maxx = extent[0] + np.ceil((sub_extent[1] - extent[0])/dx)*dx
+    maxy = extent[3] - np.floor((extent[3] - sub_extent[3])/dy)*dy
+    miny = extent[3] - np.ceil((extent[3] - sub_extent[2])/dy)*dy
+    # Index of sub_extent
+    left = int(np.floor((minx - extent[0])/dx))
+    top = int(np.floor((extent[3] - maxy)/dy))
+    nx = int(np.ceil(abs(maxx - minx)/dx))
+    ny = int(np.ceil(abs(maxy - miny)/dy))
+    rows, cols = np.arange(top, top+ny), np.arange(left, left+nx)
+    ids = (rows[:,None]*width + cols[None,:]).ravel()
+    return {'row': slice(top, top+ny), 'col': slice(left, left+nx),
+            'width': width, 'height': height, 'ids': ids}
+
+
+def ReadNetCDFChunks(filn, varname, window=None, chunk=12, flip=False, timename='time', freq=None):
+    '''Reads a NetCDF variable (time x lat x lon) in chunks of time steps
+
+    Only the window of the grid is read from the file.
+
+    Parameters
+    ----------
+    filn: str
+        filename of NetCDF
+    varname: str
+        name of the variable
+    window: dict
+        window of the grid (see SubextentWindow)
+    chunk: int
+        number of time steps per chunk
+    flip: bool
+        True if latitudes of the file are in ascending order (the grid is
+        flipped upside-down in the file)
+    timename: str
+        name of the time variable
+    freq: str
+        frequency of the time steps ('M' or 'D'); default is inferred ('M' if
+        no two time steps are in the same month, otherwise 'D')
+
+    Yields
+    ------
+    tim: PeriodIndex
+        monthly or daily time steps of the chunk
+    data: ndarray
+        t x ny x nx array (missing values are NaN)
+    '''
+    from netCDF4 import Dataset, num2date
+    with Dataset(filn, 'r') as nc:
+        var = nc.variables[varname]
+        ntim, nlat = var.shape[0], var.shape[1]
+        row = slice(0, nlat) if window is None else window['row']
+        col = slice(0, var.shape[2]) if window is None else window['col']
+        if flip:
+            row = slice(nlat - row.stop, nlat - row.start)
+        tim = nc.variables[timename]
+        tim = num2date(tim[:], tim.units, getattr(tim, 'calendar', 'standard'))
+        tim = pd.to_datetime(['%04d-%02d-%02d' % (t.year, t.month, t.day) for t in tim],
+                             format='%Y-%m-%d')
+        if freq is None:
+            freq = 'M' if tim.to_period('M').is_unique else 'D'
+        tim = tim.to_period(freq)
+        for t0 in range(0, ntim, chunk):
+            data = np.ma.filled(var[t0:t0+chunk, row, col].astype(float), np.nan)
+            if flip:
+                data = data[:,::-1,:]
+            yield tim[t0:t0+chunk], data
+
+
+def ReadNpyChunks(filn, index, window=None, chunk=12):
+    '''Reads a memory-mapped .npy array (time x lat x lon) in chunks of time steps
+
+    *compressed archives (.npz) cannot be memory-mapped; save the array once
+    with np.save to stream it.
+
+    Parameters
+    ----------
+    filn: str
+        filename of .npy
+    index: Index
+        time steps of the array
+    window: dict
+        window of the grid (see SubextentWindow)
+    chunk: int
+        number of time steps per chunk
+
+    Yields
+    ------
+    tim: Index
+        time steps of the chunk
+    data: ndarray
+        t x ny x nx array
+    '''
+    arr = np.load(filn, mmap_mode='r')
+    row = slice(None) if window is None else window['row']
+    col = slice(None) if window is None else window['col']
+    for t0 in range(0, arr.shape[0], chunk):
+        yield index[t0:t0+chunk], np.array(arr[t0:t0+chunk, row, col], dtype=float)
+
+
+def ReadGeoTIFFChunks(files, index, window=None, chunk=12, band=1):
+    '''Reads a stack of GeoTIFF files (one file per time step) in chunks
+
+    Only the window of the grid is read from each file.
+
+    Parameters
+    ----------
+    files: list
+        filenames of GeoTIFF in the order of time steps
+    index: Index
+        time steps of the files
+    window: dict
+        window of the grid (see SubextentWindow)
+    chunk: int
+        number of time steps per chunk
+    band: int
+        band to be read
+
+    Yields
+    ------
+    tim: Index
+        time steps of the chunk
+    data: ndarray
+        t x ny x nx array (nodata values are NaN)
+    '''
+    import rasterio
+    from rasterio.windows import Window
+    for t0 in range(0, len(files), chunk):
+        data = []
+        for filn in files[t0:t0+chunk]:
+            with rasterio.open(filn) as src:
+                win = None
+                if window is not None:
+                    win = Window(window['col'].start, window['row'].start,
+                                 window['col'].stop - window['col'].start,
+                                 window['row'].stop - window['row'].start)
+                temp = src.read(band, window=win, masked=True).astype(float)
+                data.append(np.ma.filled(temp, np.nan))
+        yield index[t0:t0+chunk], np.stack(data)
+
+
+def ZonalMeanStream(chunks, W, zones, window=None, out=None, key='df', nodata=None, scale=None):
+    '''Returns area-weighted averages of chunks of gridded data in districts
+
+    Peak memory is bounded by the size of a chunk. If "out" is given, the
+    averages of each chunk are appended to the HDF table incrementally.
+
+    Parameters
+    ----------
+    chunks: iterator
+        (time steps, t x ny x nx data) chunks (e.g., ReadNetCDFChunks)
+    W: scipy.sparse matrix
+        ncell x nzone matrix of area weights of the base grid (see AreaWeightMatrix)
+    zones: list
+        district IDs
+    window: dict
+        window of the chunks in the base grid (see SubextentWindow); weights
+        of districts cut by the window are renormalized by their weights in
+        the window, and districts outside the window are NaN
+    out: str
+        filename of HDF to which averages are appended (optional)
+    key: str
+        key of HDF table
+    nodata: value or list
+        values to be considered as missing in addition to NaN
+    scale: value
+        scale factor multiplied to the averages (e.g., 1/10000 for NDVI)
+
+    Returns
+    -------
+    mean: DataFrame
+        area-weighted averages (None if "out" is given)
+    '''
+    W = W.tocsr()
+    if window is not None:
+        W = W[window['ids']]
+    result = []
+    for tim, data in chunks:
+        mean = ZonalMean(data, W, zones=zones, index=tim, nodata=nodata)
+        if scale is not None:
+            mean = mean*scale
+        if out is not None:
+            mean.to_hdf(out, key=key, format='table', append=True)
+        else:
+            result.append(mean)
+    if out is not None:
+        return None
+    return pd.concat(result)